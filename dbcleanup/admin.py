@@ -4,7 +4,7 @@ from django.db.models import query
 from django.template.defaultfilters import filesizeformat
 from django.utils.html import format_html
 
-from . import models, utils
+from . import models, snapshots, stats, utils
 
 
 def human_size(attribute, column_title=None):
@@ -14,6 +14,9 @@ def human_size(attribute, column_title=None):
 
     def _get_it(obj):
         val = getattr(obj, attribute)
+        if val is None:
+            # unknown (ie: not available in this DB engine), not empty
+            return None
         return format_html(
             '<span data-toggle="tooltip" data-placement="bottom" title={}>{}</span>',
             val,
@@ -25,67 +28,118 @@ def human_size(attribute, column_title=None):
     return _get_it
 
 
+def annotation(attribute, column_title):
+    # for columns that are not fields in every DB engine model (annotated in the manager instead)
+    def _get_it(obj):
+        return getattr(obj, attribute, None)
+
+    _get_it.short_description = column_title
+    _get_it.admin_order_field = attribute
+    return _get_it
+
+
+def growth(obj):
+    if obj.growth is None:
+        return None
+    return format_html(
+        '<span data-toggle="tooltip" data-placement="bottom" title={}>{}/day</span>',
+        round(obj.growth),
+        filesizeformat(obj.growth),
+    )
+
+
+growth.short_description = 'growth'
+growth.admin_order_field = 'growth'
+
+
 class TableAppFilter(SimpleListFilter):
     title = 'App'
     parameter_name = 'app_label'
 
+    def __init__(self, request, params, model, model_admin):
+        # name of the table (see TableAdmin.table_field)
+        self.table_field = model_admin.table_field
+        super().__init__(request, params, model, model_admin)
+
     def lookups(self, request, model_admin):
-        unique_labels = {x._meta.app_label for x in utils.model_tables().values()}
-        return [(x, x) for x in unique_labels]
+        return [(x, x) for x in sorted(utils.model_table_index().app_tables)]
 
     def queryset(self, request, queryset):
         val = self.value()
         if val is None:
             return None
-        app_tables = [k for k, v in utils.model_tables().items() if v._meta.app_label == val]
-        return queryset.filter(name__in=app_tables)
+        return queryset.filter(**{f'{self.table_field}__in': utils.model_table_index().app_tables.get(val, ())})
 
 
-class TableModelFilter(SimpleListFilter):
+class TableModelFilter(TableAppFilter):
     title = 'Model'
     parameter_name = 'label'
 
     def lookups(self, request, model_admin):
-        unique_labels = {x._meta.label for x in utils.model_tables().values()}
-        return [(x, x) for x in unique_labels]
+        return [(x, x) for x in sorted(utils.model_table_index().label_tables)]
 
     def queryset(self, request, queryset):
         val = self.value()
         if val is None:
             return None
-        app_tables = [k for k, v in utils.model_tables().items() if v._meta.label == val]
-        return queryset.filter(name__in=app_tables)
+        return queryset.filter(**{f'{self.table_field}__in': utils.model_table_index().label_tables.get(val, ())})
 
 
-@admin.register(models.Table)
-class TableAdmin(admin.ModelAdmin):
-    list_display = (
-        'name',
-        'get_app',
-        'get_model',
-        human_size('size', 'size'),
-        'rows',
-        # need to specify custom title because these are not fields in PostgreSQL table model
-        human_size('avg_row_length', 'average row length'),
-        human_size('data_length', 'data length'),
-        human_size('index_length', 'index length'),
-    )
+class UnusedIndexFilter(SimpleListFilter):
+    title = 'Unused'
+    parameter_name = 'unused'
+
+    def lookups(self, request, model_admin):
+        return [('1', 'Yes (but unique)'), ('0', 'No')]
+
+    def queryset(self, request, queryset):
+        val = self.value()
+        if val is None:
+            return None
+        if val == '1':
+            # unique indexes enforce a constraint, even if they are never read
+            return queryset.filter(unused=True, unique=False)
+        return queryset.filter(unused=False)
+
+
+class CatalogAdmin(admin.ModelAdmin):
+    """
+    read-only changelist of catalog data, with the app and model of each table
+    """
+
     search_fields = ('name',)
     list_filter = (TableAppFilter, TableModelFilter)
+    # model field with the table name, to find its app and model
+    table_field = 'name'
 
     def get_ordering(self, request):
         # cannot use class "ordering" attribute as it asserts "size" is not a field...
         return ('-size', 'name')
 
+    def get_changelist_instance(self, request):
+        # app and model of the whole page at once, from the same index
+        cl = super().get_changelist_instance(request)
+        tables = utils.model_table_index().tables
+        for obj in cl.result_list:
+            obj.table_model = tables.get(getattr(obj, self.table_field))
+        return cl
+
+    def _table_model(self, obj):
+        if hasattr(obj, 'table_model'):
+            return obj.table_model
+        return utils.model_tables().get(getattr(obj, self.table_field))
+
     def get_app(self, obj):
-        if obj.name in utils.model_tables():
-            return utils.model_tables()[obj.name]._meta.app_label
+        model = self._table_model(obj)
+        if model is not None:
+            return model._meta.app_label
 
     get_app.short_description = 'App'
 
     def get_model(self, obj):
-        if obj.name in utils.model_tables():
-            return utils.model_tables()[obj.name]._meta.verbose_name
+        model = self._table_model(obj)
+        if model is not None:
+            return model._meta.verbose_name
 
     get_model.short_description = 'Model'
 
@@ -97,3 +151,109 @@ class TableAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(models.Table)
+class TableAdmin(CatalogAdmin):
+    """
+    tables served from the cached statistics (`models.TableStats`, refreshed when older than the TTL), as computing
+    the size of every table on each load is not cheap
+    """
+
+    list_display = (
+        'name',
+        'get_app',
+        'get_model',
+        human_size('size', 'size'),
+        # not a field in SQLite table model either
+        annotation('rows', 'rows'),
+        # need to specify custom title because these are not fields in PostgreSQL table model
+        human_size('avg_row_length', 'average row length'),
+        human_size('data_length', 'data length'),
+        human_size('index_length', 'index length'),
+        growth,
+        # estimated, see the table models
+        human_size('free', 'free space'),
+        human_size('index_free', 'index free space'),
+        annotation('refreshed_at', 'refreshed at'),
+    )
+    actions = ('refresh',)
+
+    def get_queryset(self, request):
+        # growth rate from the latest snapshot (see dbcleanup_snapshot command)
+        return models.TableStats.objects.annotate(growth=snapshots.latest_growth())
+
+    def changelist_view(self, request, extra_context=None):
+        # without free space estimates, see the refresh action
+        if stats.is_stale():
+            stats.refresh(free=False, stale_only=True)
+        return super().changelist_view(request, extra_context)
+
+    def refresh(self, request, queryset):
+        self.message_user(request, f'Refreshed statistics of {len(stats.refresh())} tables')
+
+    refresh.short_description = 'Refresh statistics'
+
+
+@admin.register(models.Partition)
+class PartitionAdmin(CatalogAdmin):
+    list_display = (
+        'name',
+        annotation('table', 'table'),
+        'get_app',
+        'get_model',
+        annotation('method', 'method'),
+        annotation('description', 'description'),
+        human_size('size', 'size'),
+        'rows',
+        human_size('data_length', 'data length'),
+        human_size('index_length', 'index length'),
+    )
+    search_fields = ('name', 'table')
+    table_field = 'table'
+
+
+@admin.register(models.Index)
+class IndexAdmin(CatalogAdmin):
+    """
+    indexes with their size and usage (since the statistics were reset, ie: server restart for MySQL), to find the
+    ones that slow down writes for nothing
+    """
+
+    list_display = (
+        'name',
+        'table',
+        'get_app',
+        'get_model',
+        annotation('columns', 'columns'),
+        annotation('type', 'type'),
+        annotation('unique', 'unique'),
+        human_size('size', 'size'),
+        human_size('free', 'free space'),
+        annotation('scans', 'scans'),
+        annotation('reads', 'rows read'),
+    )
+    search_fields = ('name', 'table')
+    list_filter = (UnusedIndexFilter, TableAppFilter, TableModelFilter)
+    table_field = 'table'
+
+
+@admin.register(models.TableSnapshot)
+class TableSnapshotAdmin(admin.ModelAdmin):
+    list_display = (
+        'table',
+        'taken_at',
+        human_size('size', 'size'),
+        'rows',
+        human_size('index_length', 'index length'),
+        growth,
+    )
+    search_fields = ('table',)
+    date_hierarchy = 'taken_at'
+    ordering = ('-taken_at', 'table')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,105 @@
+from contextlib import nullcontext
+
+from django.db import connections, DatabaseError
+
+from . import utils
+
+# tables per ANALYZE TABLE statement (MySQL, PostgreSQL runs one per table so errors do not fail the others)
+BATCH_SIZE = 20
+
+
+def table_stats(using='default', vacuum=False):
+    """
+    Statistics of the tables of the database: `{table: (seconds since they were updated, rows modified since, rows)}`
+    * MySQL: InnoDB persistent statistics
+    * PostgreSQL: `pg_stat_user_tables` - since the last (auto)analyze, or the last (auto)vacuum and dead rows
+      if `vacuum` is set
+    Tables (or values) that are not available, such as without privileges on `mysql.innodb_table_stats`, are missing.
+    """
+    conn = connections[using]
+    if conn.vendor == 'postgresql':
+        last, modified = ('vacuum', 'n_dead_tup') if vacuum else ('analyze', 'n_mod_since_analyze')
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'SELECT relname, EXTRACT(EPOCH FROM NOW() - GREATEST(last_{last}, last_auto{last})), {modified},'
+                " n_live_tup FROM pg_stat_user_tables WHERE schemaname = 'public'"
+            )
+            return {table: (age, modified, rows) for table, age, modified, rows in cursor.fetchall()}
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(
+                'SELECT table_name, TIMESTAMPDIFF(SECOND, last_update, NOW())'
+                ' FROM mysql.innodb_table_stats WHERE database_name = DATABASE()'
+            )
+            ages = dict(cursor.fetchall())
+        except DatabaseError:
+            return {}
+        counters = {}
+        # INNODB_SYS_TABLESTATS before 8.0
+        for view in ('INNODB_TABLESTATS', 'INNODB_SYS_TABLESTATS'):
+            try:
+                cursor.execute(
+                    f"SELECT SUBSTRING_INDEX(name, '/', -1), modified_counter, num_rows"
+                    f" FROM information_schema.{view} WHERE name LIKE CONCAT(DATABASE(), '/%')"
+                )
+            except DatabaseError:
+                continue
+            counters = {name: (modified, rows) for name, modified, rows in cursor.fetchall()}
+            break
+    return {table: (age,) + counters.get(table, (None, None)) for table, age in ages.items()}
+
+
+def fresh_tables(tables, using='default', min_age=None, min_change=None, vacuum=False):
+    """
+    tables (of `tables`) that do not need ANALYZE (or VACUUM): statistics updated less than `min_age` seconds ago
+    or less than `min_change` (a fraction) of their rows modified (or dead, for VACUUM) since then
+    """
+    if min_age is None and min_change is None:
+        return set()
+    stats = table_stats(using, vacuum=vacuum)
+    fresh = set()
+    for table in tables:
+        if table not in stats:
+            continue
+        age, modified, rows = stats[table]
+        if min_age is not None and age is not None and age < min_age:
+            fresh.add(table)
+        elif min_change is not None and modified is not None and modified < min_change * (rows or 0):
+            fresh.add(table)
+    return fresh
+
+
+def analyze_tables(tables, using='default', jobs=1, step=None, report=None, vacuum=False):
+    """
+    ANALYZE `tables` (or VACUUM (ANALYZE) them, for PostgreSQL and `vacuum`), several per statement (BATCH_SIZE,
+    MySQL only) and in up to `jobs` connections concurrently.
+    Each table is reported (`report.item`) with its error, if any, and `step` advances per batch.
+    """
+    conn = connections[using]
+    qn = conn.ops.quote_name
+    batch_size = BATCH_SIZE if conn.vendor == 'mysql' else 1
+    batches = [tables[i : i + batch_size] for i in range(0, len(tables), batch_size)]
+
+    def _analyze(batch):
+        with connections[using].cursor() as cursor:
+            if connections[using].vendor == 'postgresql':
+                # VACUUM cannot run inside a transaction, the connection is in autocommit mode
+                try:
+                    cursor.execute(f'{"VACUUM (ANALYZE)" if vacuum else "ANALYZE"} {qn(batch[0])}')
+                    errors = {}
+                except DatabaseError as e:
+                    errors = {batch[0]: str(e)}
+            else:
+                cursor.execute(f'ANALYZE TABLE {", ".join(qn(t) for t in batch)}')
+                # errors are result rows (Table, Op, Msg_type, Msg_text), not exceptions
+                errors = {row[0].split('.', 1)[-1]: row[3] for row in cursor.fetchall() if row[2].lower() == 'error'}
+        for table in batch:
+            with report.item('analyze', table, database=using) if report is not None else nullcontext({}) as entry:
+                entry['applied'] = table not in errors
+                if table in errors:
+                    entry['error'] = errors[table]
+        if step is not None:
+            step.advance(len(batch))
+
+    utils.run_parallel(batches, using, jobs, _analyze)
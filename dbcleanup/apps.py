@@ -4,6 +4,32 @@ from django.conf import settings
 APP_SETTINGS = {
     # "app.model", "days_of_history_to_keep", "reference_datetime_field"
     'HISTORY_MODELS': None,
+    # delete history in batches of this size (each in its own transaction), None to delete all at once
+    'HISTORY_BATCH_SIZE': None,
+    # database aliases where replication lag is checked (--max-replica-lag):
+    # the primary for PostgreSQL (pg_stat_replication), the replicas for MySQL (SHOW REPLICA STATUS)
+    'REPLICA_DATABASES': ('default',),
+    # token to scrape the metrics view (Authorization: Bearer <token>), otherwise it is only for staff users
+    'METRICS_TOKEN': None,
+    # table size snapshots (dbcleanup_snapshot): growth rate window, (age, interval) downsampling in days, max age
+    'SNAPSHOT_GROWTH_DAYS': 7,
+    'SNAPSHOT_DOWNSAMPLE': ((7, 1), (90, 7)),
+    'SNAPSHOT_MAX_DAYS': 730,
+    # analyze action skips tables with statistics updated less than MIN_AGE seconds ago
+    # or with less than MIN_CHANGE (fraction, ie: 0.1) of their rows modified since then - None to disable
+    'ANALYZE_MIN_AGE': None,
+    'ANALYZE_MIN_CHANGE': None,
+    # PostgreSQL: ANALYZE (or VACUUM (ANALYZE) with --vacuum) the tables history was deleted from, after each model
+    'ANALYZE_AFTER_HISTORY': True,
+    # reclaim action only rebuilds tables with at least MIN_FREE bytes and MIN_RATIO (of their size) free
+    'RECLAIM_MIN_FREE': 64 * 1024 * 1024,
+    'RECLAIM_MIN_RATIO': 0.2,
+    # seconds the table statistics (admin) are cached for
+    'TABLE_STATS_TTL': 300,
+    # tables action: tables of GENTLE_DROP_SIZE bytes or more (None to disable) are emptied GENTLE_DROP_CHUNK rows at a
+    # time (paced by --rate, --sleep and --max-replica-lag) before they are dropped
+    'GENTLE_DROP_SIZE': None,
+    'GENTLE_DROP_CHUNK': 10000,
     # tables that do not map to any model but should not be deleted
     'REQUIRED_TABLES': set(),
 }
@@ -1,18 +1,41 @@
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import StringIO
+
 from django.core.management import CommandError, BaseCommand
+from django.core.management.base import OutputWrapper
 from django.conf import settings
-from django.db import connection, transaction
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, router, transaction
 from django.db.models import ManyToManyField
+from django.db.models.deletion import Collector
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
 
-from dbcleanup import utils, models
+from dbcleanup import analyze, utils, models, partitions, reclaim, orphans
+from dbcleanup.progress import ProgressReporter
+from dbcleanup.report import Report
+from dbcleanup.throttle import Throttle, replica_lag
 
 REQUIRED_TABLES = {'django_migrations'}
 
 
 class Command(BaseCommand):
     help = 'Remove database tables that do not map to any models, such as when a django app is removed/disabled.'
+    # engines supported by the catalog based actions (the others work with any)
+    vendors = {
+        'tables': ('mysql', 'postgresql', 'sqlite'),
+        'analyze': ('mysql', 'postgresql'),
+        'reclaim': ('mysql', 'postgresql'),
+    }
+    throttle = None
+    progress = None
+    report = None
+    databases = (DEFAULT_DB_ALIAS,)
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -23,59 +46,288 @@ class Command(BaseCommand):
             '-j',
             '--just',
             action='append',
-            choices=('tables', 'history', 'analyze', 'migrations'),
-            help='Perform only a subset of actions',
+            choices=('tables', 'history', 'analyze', 'migrations', 'reclaim'),
+            help='Perform only a subset of actions (reclaim only runs when it is listed)',
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            help=(
+                'Database alias to clean (default: default), can be repeated to clean several of them concurrently - '
+                'history follows the database routers, only for the models routed to these'
+            ),
+        )
+        parser.add_argument(
+            '--all-databases',
+            action='store_true',
+            help=(
+                'Clean every database in settings.DATABASES concurrently (the ones with unsupported engines are '
+                'skipped by tables, analyze and reclaim)'
+            ),
         )
         parser.add_argument(
             '--no-fk',
             action='store_true',
-            help='Disable FOREIGNKEY_CHECK when DROPping tables - CAREFUL! use only if you are sure the constraints are not from a table in use (ie: circular dependencies between drop candidates)',
+            help=(
+                'Disable FOREIGNKEY_CHECK when DROPping tables - CAREFUL! use only if you are sure the constraints are'
+                ' not from a table in use (tables referencing each other are already dropped in dependency order, but '
+                'not circular dependencies on MySQL)'
+            ),
+        )
+        parser.add_argument(
+            '--gentle-drop-size',
+            type=int,
+            help=(
+                'Empty tables of this many bytes or more in throttled chunks before dropping them (default: '
+                'settings.DBCLEANUP_GENTLE_DROP_SIZE)'
+            ),
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help=(
+                'Delete history in batches of this many rows, each committed on its own (default: '
+                'settings.DBCLEANUP_HISTORY_BATCH_SIZE)'
+            ),
+        )
+        parser.add_argument(
+            '--max-duration',
+            type=float,
+            help='Stop the history cleanup (at a batch boundary) after this many seconds, next run resumes it',
+        )
+        parser.add_argument(
+            '--max-rows',
+            type=int,
+            help='Stop the history cleanup (at a batch boundary) after deleting this many rows, next run resumes it',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Target rate (rows per second) when deleting history in batches',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            help='Pause this many seconds after each history batch or dropped table',
+        )
+        parser.add_argument(
+            '--max-replica-lag',
+            type=float,
+            help=(
+                'Pause while replication lag is above this many seconds (checked on '
+                'settings.DBCLEANUP_REPLICA_DATABASES)'
+            ),
+        )
+        parser.add_argument(
+            '--partitions',
+            choices=('drop', 'truncate'),
+            help=(
+                'For RANGE partitioned history tables, DROP (or TRUNCATE) the partitions older than the cutoff instead'
+                ' of deleting their rows'
+            ),
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Do not clean history, EXPLAIN the query of each history model instead (to find full table scans)',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help=(
+                'Clean up to this many history models (or ANALYZE this many batches of tables, or rebuild this many '
+                'tables) concurrently, each one with its own database connection'
+            ),
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help=(
+                'PostgreSQL: VACUUM (ANALYZE) instead of ANALYZE, in the analyze action and after history cleanups. '
+                'SQLite: VACUUM the database file after dropping tables'
+            ),
+        )
+        parser.add_argument(
+            '--analyze-all',
+            action='store_true',
+            help=(
+                'ANALYZE every table, even the ones with fresh statistics (see settings.DBCLEANUP_ANALYZE_MIN_AGE and '
+                'DBCLEANUP_ANALYZE_MIN_CHANGE)'
+            ),
+        )
+        parser.add_argument(
+            '--reclaim-max-size',
+            type=int,
+            help=(
+                'Rebuild tables (reclaim action) until their total size reaches this many bytes, as each rebuild '
+                'writes a copy of the table'
+            ),
+        )
+        parser.add_argument(
+            '--progress-format',
+            choices=('text', 'logfmt'),
+            default='text',
+            help=(
+                'Format of the progress lines, written to stderr with --verbosity 2 or higher (logfmt is for log '
+                'shippers)'
+            ),
+        )
+        parser.add_argument(
+            '--format',
+            choices=('text', 'json'),
+            default='text',
+            help='Output format: json replaces the text output with a JSON lines report (see --report-file)',
+        )
+        parser.add_argument(
+            '--report-file',
+            help='Write the JSON lines report of the run to this file as well, as it happens',
         )
 
-    def _clean_tables(self, options):
+    def _vendor_error(self, action, using):
+        """
+        :return: why `action` cannot run on database `using`, None if it can
+        """
+        vendors = self.vendors.get(action)
+        if vendors is None or connections[using].vendor in vendors:
+            return None
+        return f'this is only for {", ".join(vendors[:-1])} and {vendors[-1]}'
+
+    def _check_vendor(self, action, using):
+        error = self._vendor_error(action, using)
+        if error is not None:
+            raise CommandError(error)
+
+    def _clean_tables(self, options, using=DEFAULT_DB_ALIAS):
         """
         Find tables in database that do not map to a model (and drop them)
         :param options:
         :return:
         """
-        if settings.DATABASES['default']['ENGINE'] not in (
-            'django.db.backends.mysql',
-            'django.db.backends.postgresql_psycopg2',
-        ):
-            raise CommandError('this is only for mysql and postgresql')
-        self._handle_tables(options)
+        self._check_vendor('tables', using)
+        self._handle_tables(options, using)
 
-    @staticmethod
-    def _analyze_tables(tables=None):
+    def _analyze_tables(self, options, tables=None, step=None, using=DEFAULT_DB_ALIAS):
         """
         MySQL stores approximate data (table size and row count) in INFORMATION_SCHEMA.
         If it's MyISAM it is only updated after ANALYZE or OPTIMIZE is executed on the table.
         If it's InnoDB and `innodb_stats_persistent` is enabled, it's updated automatically but it does not consider
         schema changes such as new indexes. So even then, ANALYZE needs to be executed after schema changes.
-        This run ANALYZE on all the tables.
-        :param options:
-        :return:
+        PostgreSQL row estimates (`reltuples`) are also only updated by (auto)ANALYZE and (auto)VACUUM, and only
+        VACUUM makes the space of deleted rows reusable.
+        This run ANALYZE (or VACUUM (ANALYZE) with `--vacuum`, PostgreSQL only) on all the tables (but the ones with
+        fresh statistics, see `analyze.fresh_tables`), in batches and `--jobs` connections concurrently.
         """
-        if settings.DATABASES['default']['ENGINE'] not in ('django.db.backends.mysql',):
-            raise CommandError('this is only for mysql')
+        self._check_vendor('analyze', using)
         if tables is None:
             tables_in_use = set(utils.model_tables())
             tables_in_use.update(settings.DBCLEANUP_REQUIRED_TABLES)
             tables_in_use.update(REQUIRED_TABLES)
         else:
             tables_in_use = set(tables)
-        with connection.cursor() as cursor:
-            for table in tables_in_use:
-                cursor.execute(f'ANALYZE TABLE {table}')  # nosec: table comes from settings.py or model tables
 
-    @staticmethod
-    def _delete_intention(model, query, commit=False, allow_cascade=None):
+        fresh = set()
+        if not options['analyze_all']:
+            fresh = analyze.fresh_tables(
+                tables_in_use,
+                using=using,
+                min_age=settings.DBCLEANUP_ANALYZE_MIN_AGE,
+                min_change=settings.DBCLEANUP_ANALYZE_MIN_CHANGE,
+                vacuum=options['vacuum'],
+            )
+        for table in sorted(fresh):
+            with self.report.item('analyze', table, using) as entry:
+                entry['skipped'] = True
+        if options['verbosity'] > 1 and fresh:
+            self.stdout.write(f'Skipped {len(fresh)} tables with fresh statistics\n')
+
+        tables = sorted(tables_in_use - fresh)
+        if step is not None:
+            step.total = len(tables)
+        analyze.analyze_tables(
+            tables, using=using, jobs=options['jobs'], step=step, report=self.report, vacuum=options['vacuum']
+        )
+
+    def _analyze_history(self, model, rows_deleted, options, stdout):
         """
-        TODO allow_cascade...
-        even any deletions start being blocked by this and we want to allow cascade,
-        consider doing it on an entry basis (add bool to each entry in HISTORY_TABLES setting)
-        or an array/set of the allowed cascades (in app.Model format)
+        ANALYZE (or VACUUM (ANALYZE)) the tables history was just deleted from (PostgreSQL only), so their row
+        estimates and (with VACUUM) free space recover without waiting for autovacuum
         """
+        using = router.db_for_write(model)
+        if not settings.DBCLEANUP_ANALYZE_AFTER_HISTORY or connections[using].vendor != 'postgresql':
+            return
+        index = utils.model_table_index()
+        tables = sorted({t for label, rows in rows_deleted.items() if rows for t in index.label_tables.get(label, ())})
+        if not tables:
+            return
+        analyze.analyze_tables(tables, using=using, vacuum=options['vacuum'])
+        if options['verbosity'] > 1:
+            verb = 'vacuumed' if options['vacuum'] else 'analyzed'
+            stdout.write(f'{model._meta.label} cleanup {verb} {", ".join(tables)}\n')
+
+    def _reclaim_tables(self, options, step=None, using=DEFAULT_DB_ALIAS):
+        """
+        Deleted rows leave free space behind that only a rebuild returns to the filesystem: OPTIMIZE TABLE (MySQL)
+        or VACUUM FULL (PostgreSQL), both blocking writes to the table while they copy it.
+        This rebuilds the tables with enough free space (settings.DBCLEANUP_RECLAIM_MIN_FREE and
+        DBCLEANUP_RECLAIM_MIN_RATIO, see `reclaim.free_space`), most free space first, until their total size reaches
+        `--reclaim-max-size`, in `--jobs` connections concurrently.
+        When history is cleaned in the same run, only the tables it deleted rows from are considered.
+        """
+        self._check_vendor('reclaim', using)
+        tables = None
+        if self._opt('history', options) and not options['explain']:
+            index = utils.model_table_index()
+            tables = {
+                t
+                for entry in self.report.items.get('history', [])
+                if entry['applied'] and entry['database'] == using
+                for label, rows in entry.get('models', {}).items()
+                if rows
+                for t in index.label_tables.get(label, ())
+            }
+
+        stats = reclaim.free_space(using)
+        selected = reclaim.candidates(
+            stats,
+            tables,
+            min_free=settings.DBCLEANUP_RECLAIM_MIN_FREE,
+            min_ratio=settings.DBCLEANUP_RECLAIM_MIN_RATIO,
+            max_size=options['reclaim_max_size'],
+        )
+        to_reclaim = []
+        for table, size, free in selected:
+            self.stdout.write(f'- {table} ({free} of {size} bytes free)\n')
+            rebuild = options['force']
+            if not rebuild and options['interactive']:
+                ans = input('Reclaim it? (y/N) ')  # nosec - surface is py3-only, input() is safe
+                rebuild = ans.lower().strip() == 'y'
+            if rebuild:
+                to_reclaim.append(table)
+            else:
+                with self.report.item('reclaim', table, using) as entry:
+                    entry['bytes'] = free
+
+        if step is not None:
+            step.total = len(to_reclaim)
+        results = reclaim.reclaim_tables(
+            to_reclaim,
+            {table: size for table, (size, _) in stats.items()},
+            using=using,
+            jobs=options['jobs'],
+            step=step,
+            report=self.report,
+            throttle=self.throttle,
+        )
+        for table in to_reclaim:
+            reclaimed, error = results[table]
+            if error is None:
+                self.stdout.write(f'Reclaimed {reclaimed} bytes from {table}\n')
+            else:
+                self.stderr.write(f'Failed to reclaim {table}: {error}\n')
+
+    @staticmethod
+    def _allowed_cascades(query, allow_cascade=None):
         # allow cascading to parent models (otherwise children can never be deleted...)
         _allow = {x._meta.label for x in query.model._meta.parents.keys()}
         # allow cascading to M2M intermediary models
@@ -91,106 +343,528 @@ class Command(BaseCommand):
         # append the custom ones, if any
         if allow_cascade:
             _allow.update(allow_cascade)
+        return _allow
 
-        with transaction.atomic():
-            deleted, rows_deleted = query.delete()
-            rows_blocked = {k: v for k, v in rows_deleted.items() if k not in _allow and v > 0}
-            if rows_blocked:
-                raise CascadeException(model, deleted, rows_blocked)
-            transaction.set_rollback(not commit)
-        return deleted, rows_deleted
+    @staticmethod
+    def _next_batch(query, batch_size, last_pk=None):
+        """
+        Next primary key ordered batch of (at most) `batch_size` rows, after `last_pk`.
+        Keyset pagination (pk > last pk seen) keeps every lookup cheap and it does not depend on
+        the previous batches being committed, as the same rows are never selected twice.
+        :return: batch query and its last pk - None if it is the last batch
+        """
+        q = query if last_pk is None else query.filter(pk__gt=last_pk)
+        if not batch_size:
+            return q, None
+        pks = list(q.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        return query.filter(pk__in=pks), pks[-1] if len(pks) == batch_size else None
+
+    @staticmethod
+    def _next_raw_batch(query, batch_size, last_pk=None):
+        """
+        Same as `_next_batch` but only the upper primary key boundary of the batch is fetched,
+        the batch itself is a range (last_pk < pk <= boundary) that can be deleted server-side.
+        """
+        q = query if last_pk is None else query.filter(pk__gt=last_pk)
+        if not batch_size:
+            return q, None
+        boundary = list(q.order_by('pk').values_list('pk', flat=True)[batch_size - 1 : batch_size])
+        if not boundary:
+            # last (partial) batch
+            return q, None
+        return q.filter(pk__lte=boundary[0]), boundary[0]
+
+    @staticmethod
+    def _can_fast_delete(model):
+        """
+        Models without delete signal receivers, cascades (reverse FKs, M2M, generic relations) or parents
+        can be deleted with a plain DELETE ... WHERE, without going through the Collector
+        """
+        return Collector(using=router.db_for_write(model)).can_fast_delete(model)
+
+    @staticmethod
+    def _check_cascade(model, allowed, deleted, rows_deleted):
+        rows_blocked = {k: v for k, v in rows_deleted.items() if k not in allowed and v > 0}
+        if rows_blocked:
+            raise CascadeException(model, deleted, rows_blocked)
+
+    @classmethod
+    def _delete_intention(
+        cls,
+        model,
+        query,
+        commit=False,
+        allow_cascade=None,
+        batch_size=None,
+        fast=False,
+        budget=None,
+        progress=None,
+        throttle=None,
+        step=None,
+    ):
+        """
+        TODO allow_cascade...
+        even any deletions start being blocked by this and we want to allow cascade,
+        consider doing it on an entry basis (add bool to each entry in HISTORY_TABLES setting)
+        or an array/set of the allowed cascades (in app.Model format)
+
+        if `commit` is not set, nothing is deleted: rows are only counted (see `utils.count_delete`).
+
+        if `batch_size` is set, rows are deleted in batches of that size, each one in its own transaction:
+        memory usage and lock time are bounded by it, but batches committed before a blocked one are not reverted
+        (see `_clean_history_intention` preflight, it only happens if cascading rows were added meanwhile).
+        `budget` (if any) is checked before each batch, `progress` (if any) is saved with each batch
+        and `throttle` (if any) paces them. `step` (if any) reports the rows deleted by each batch.
+
+        if `fast` is set (see `_can_fast_delete`), rows are deleted with set-based DELETE statements
+        (one per batch), none of them is fetched.
+        """
+        _allow = cls._allowed_cascades(query, allow_cascade)
+
+        if not commit:
+            deleted, rows_deleted = utils.count_delete(query)
+            # nothing deleted
+            cls._check_cascade(model, _allow, 0, rows_deleted)
+            return deleted, rows_deleted
+
+        next_batch = cls._next_raw_batch if fast else cls._next_batch
+        deleted, rows_deleted = 0, {}
+        last_pk = None
+        while True:
+            size = budget.reserve(batch_size) if budget else batch_size
+            if size == 0:
+                raise LimitReachedException(model, deleted, rows_deleted)
+            _deleted = 0
+            try:
+                batch, last_pk = next_batch(query, size, last_pk)
+                with transaction.atomic(using=query.db):
+                    if fast:
+                        _rows = batch._raw_delete(batch.db)
+                        _rows_deleted = {query.model._meta.label: _rows}
+                    else:
+                        _rows, _rows_deleted = batch.delete()
+                        # with the rows of the previous batches, already committed
+                        cls._check_cascade(model, _allow, deleted, _rows_deleted)
+                _deleted = _rows
+            finally:
+                if budget:
+                    budget.spend(_deleted, reserved=size)
+            # saved once the batch is committed, as HistoryProgress may not live in the same database as `model`:
+            # if interrupted in between, the next run only goes over (already deleted) rows of this batch again
+            if progress is not None:
+                if last_pk is not None:
+                    progress.last_pk = last_pk
+                    progress.save()
+                elif progress.pk:
+                    progress.delete()
+            deleted += _deleted
+            for k, v in _rows_deleted.items():
+                rows_deleted[k] = rows_deleted.get(k, 0) + v
+            if step is not None:
+                step.advance(_deleted)
+            if last_pk is None:
+                return deleted, rows_deleted
+            if throttle and not throttle.wait(_deleted, deadline=budget.deadline if budget else None):
+                # --max-duration reached while waiting for replicas to catch up
+                raise LimitReachedException(model, deleted, rows_deleted)
 
     def _model_tuple(self, model):
         if isinstance(model, str):
             return model.split('.')
         return model
 
-    def _clean_history_intention(self, model, q, options):
+    def _clean_history_intention(self, model, q, options, fast=False, budget=None, progress=None, step=None):
+        """
+        in interactive mode, the preview is only counted (no DML) so each confirmed model is deleted in a single pass
+        """
+        batch_size = options['batch_size'] or settings.DBCLEANUP_HISTORY_BATCH_SIZE
+        kwargs = dict(
+            batch_size=batch_size, fast=fast, budget=budget, progress=progress, throttle=self.throttle, step=step
+        )
         if options['force']:
-            return self._delete_intention(model, q, True)
+            if batch_size and not fast:
+                # batches are committed one by one: check the whole model first so it is skipped before any of them
+                self._delete_intention(model, q)
+            return self._delete_intention(model, q, True, **kwargs)
 
         deleted, rows_deleted = self._delete_intention(model, q)
         if deleted and options['interactive']:
             self.stdout.write(f'{model} cleanup will delete:\n')
-            for k, v in rows_deleted.items():
-                if v:
-                    self.stdout.write(f' - {k}: {v}\n')
+            self._clean_history_print(rows_deleted.items())
             ans = input('Delete? (y/N) ')  # nosec - surface is py3-only, input() is safe
             if ans.lower().strip() == 'y':
-                deleted, rows_deleted = self._delete_intention(model, q, True)
+                if step is not None:
+                    step.total = deleted
+                deleted, rows_deleted = self._delete_intention(model, q, True, **kwargs)
             else:
-                deleted = 0
+                deleted, rows_deleted = 0, {}
         return deleted, rows_deleted
 
-    def _clean_history_print(self, items, err=False):
-        st = self.stderr if err else self.stdout
+    def _clean_history_print(self, items, st=None):
+        st = st or self.stdout
         for k, v in items:
             if v:
                 st.write(f' - {k}: {v}\n')
 
-    def _clean_history(self, options):
-        _exit = 0
-        for model, log_size, field in settings.DBCLEANUP_HISTORY_MODELS:
+    def _history_models(self):
+        """
+        resolve settings.DBCLEANUP_HISTORY_MODELS entries into (content type, days to keep, field),
+        for the models routed to the databases of this run
+        """
+        history_models = []
+        for model, log_size, field in settings.DBCLEANUP_HISTORY_MODELS or ():
             model_tuple = self._model_tuple(model)
             if len(model_tuple) != 2:
                 self.stderr.write(f'{model} is not a valid, it should be a string with app_label.model or a tuple')
                 continue
-
             ct = ContentType.objects.get_by_natural_key(*model_tuple)
-            # normalize model name to match against .delete() return labels (and for capitalized printing!)
-            model = ct.model_class()._meta.label
-            q = ct.get_all_objects_for_this_type(**{f'{field}__lt': timezone.now() - timezone.timedelta(days=log_size)})
+            if router.db_for_write(ct.model_class()) not in self.databases:
+                continue
+            history_models.append((ct, log_size, field))
+        return history_models
+
+    @staticmethod
+    def _history_query(ct, **filters):
+        """
+        rows of `ct` model in the database it is routed to (`get_all_objects_for_this_type` uses the content type one)
+        """
+        model_class = ct.model_class()
+        return model_class._base_manager.using(router.db_for_write(model_class)).filter(**filters)
+
+    def _clean_history_partitions(self, model_class, field, cutoff, options, stdout, step=None):
+        """
+        drop (or truncate) the partitions of model_class table that only hold rows older than cutoff
+        :return: number of rows they had (0 if not `--force`)
+        """
+        rows = 0
+        verb, done = ('truncate', 'truncated') if options['partitions'] == 'truncate' else ('drop', 'dropped')
+        for partition in partitions.expired_partitions(model_class, field, cutoff):
+            if not options['force']:
+                stdout.write(f'{model_class._meta.label} cleanup would {verb} partition {partition.name}\n')
+                continue
+            _rows = partitions.drop_partition(model_class, partition, truncate=verb == 'truncate')
+            rows += _rows
+            stdout.write(
+                f'{model_class._meta.label} cleanup {done} partition {partition.name} ({_rows} rows, estimated)\n'
+            )
+            if step is not None:
+                step.advance(_rows)
+            if self.throttle:
+                self.throttle.wait()
+        return rows
+
+    def _clean_history_model(self, ct, log_size, field, options, fast=False, budget=None, stdout=None, stderr=None):
+        """
+        :return: 1 if the cleanup was aborted as it would cascade, 0 otherwise
+        """
+        stdout = stdout or self.stdout
+        stderr = stderr or self.stderr
+        # normalize model name to match against .delete() return labels (and for capitalized printing!)
+        model = ct.model_class()._meta.label
 
+        # resume a previous run that did not finish, with the same cutoff
+        progress = models.HistoryProgress.objects.filter(model=model).first()
+        if progress is None:
+            progress = models.HistoryProgress(model=model, cutoff=timezone.now() - timezone.timedelta(days=log_size))
+        q = self._history_query(ct, **{f'{field}__lt': progress.cutoff})
+        if progress.pk:
+            if options['verbosity'] > 1:
+                stdout.write(f'{model} cleanup resumed after pk {progress.last_pk} (older than {progress.cutoff})\n')
+            q = q.filter(pk__gt=progress.last_pk)
+
+        step = None
+        if options['force'] or options['interactive']:
+            # planner estimate (cheap but approximate, if the engine has one) for the ETA, interactive runs count
+            total = utils.explain(q, field)['rows'] if self.progress and options['force'] else None
+            step = self.progress.start('history', model, total=total)
+
+        with self.report.item('history', model, q.db) as entry:
+            partition_rows = 0
             try:
-                deleted, rows_deleted = self._clean_history_intention(model, q, options)
+                # only for models without cascades or signals, as dropping partitions bypasses them
+                if options['partitions'] and fast:
+                    partition_rows = self._clean_history_partitions(
+                        ct.model_class(), field, progress.cutoff, options, stdout, step=step
+                    )
+                elif options['partitions']:
+                    stderr.write(
+                        f'{model} partitions are not dropped as it has cascades or delete signals,'
+                        ' its rows are deleted instead\n'
+                    )
+                deleted, rows_deleted = self._clean_history_intention(
+                    model, q, options, fast=fast, budget=budget, progress=progress, step=step
+                )
+                deleted += partition_rows
+                rows_deleted[model] = rows_deleted.get(model, 0) + partition_rows
             except CascadeException as e:
-                _exit = 1
-                self.stderr.write(f'{model} cleanup aborted as it would cascade to:\n')
-                self._clean_history_print(e.args[2].items(), err=True)
-                continue
+                if progress.pk and (options['force'] or options['interactive']):
+                    # the next run starts over, with a new cutoff, instead of resuming with this one
+                    progress.delete()
+                stderr.write(f'{model} cleanup aborted as it would cascade to:\n')
+                self._clean_history_print(e.args[2].items(), stderr)
+                entry['blocked'] = e.args[2]
+                if e.args[1]:
+                    # blocked by rows added after the preflight, previous batches were committed
+                    stderr.write(f'{model} cleanup had already deleted {e.args[1]} rows\n')
+                    entry.update(rows=e.args[1], applied=True)
+                return 1
+            except LimitReachedException as e:
+                if e.args[1] or partition_rows:
+                    e.args[2][model] = e.args[2].get(model, 0) + partition_rows
+                    stdout.write(f'{model} cleanup deleted:\n')
+                    self._clean_history_print(e.args[2].items(), stdout)
+                stdout.write(f'{model} cleanup stopped as run limits were reached, next run will resume it\n')
+                self._analyze_history(ct.model_class(), e.args[2], options, stdout)
+                entry.update(
+                    rows=e.args[1] + partition_rows,
+                    models={k: v for k, v in e.args[2].items() if v},
+                    # not for the models the limits were reached before
+                    applied=bool(e.args[1] or partition_rows),
+                    stopped=True,
+                )
+                return 0
+            finally:
+                if step is not None:
+                    step.finish()
 
             if deleted:
                 if options['force'] or options['interactive']:
-                    self.stdout.write(f'{model} cleanup deleted:\n')
+                    stdout.write(f'{model} cleanup deleted:\n')
                 else:
-                    self.stdout.write(f'{model} cleanup would delete:\n')
-                self._clean_history_print(rows_deleted.items())
-        return _exit
+                    stdout.write(f'{model} cleanup would delete:\n')
+                self._clean_history_print(rows_deleted.items(), stdout)
+                if options['force'] or options['interactive']:
+                    self._analyze_history(ct.model_class(), rows_deleted, options, stdout)
+            entry.update(
+                rows=deleted,
+                models={k: v for k, v in rows_deleted.items() if v},
+                applied=bool(options['force'] or (options['interactive'] and deleted)),
+            )
+            return 0
 
-    def _drop_table(self, table_name, no_fk_check=False):
+    def _clean_history_worker(self, ct, log_size, field, options, fast=False, budget=None):
+        """
+        run `_clean_history_model` in a worker thread: output is buffered (to be collated per model)
+        and the thread database connections are closed when done
+        """
+        stdout, stderr = StringIO(), StringIO()
         try:
-            with connection.cursor() as cursor:
-                if no_fk_check:
-                    cursor.execute(f'SET FOREIGN_KEY_CHECKS=0')
-                cursor.execute(f'DROP TABLE {table_name}')  # nosec - no sqli, not user input
-            self.stdout.write(f'Dropped {table_name}')
-        except Exception as e:
+            _exit = self._clean_history_model(
+                ct, log_size, field, options, fast=fast, budget=budget, stdout=stdout, stderr=stderr
+            )
+        finally:
+            connections.close_all()
+        return _exit, stdout.getvalue(), stderr.getvalue()
+
+    def _explain_history(self, options):
+        """
+        EXPLAIN the cutoff query of each history model and report full table scans and missing indexes
+        :return: 1 if any model has no index on its field, 0 otherwise
+        """
+        _exit = 0
+        for ct, log_size, field in self._history_models():
+            model_class = ct.model_class()
+            model = model_class._meta.label
+            q = self._history_query(ct, **{f'{field}__lt': timezone.now() - timezone.timedelta(days=log_size)})
+            summary = utils.explain(q, field)
+
+            line = f'{model}: {"full scan" if summary["full_scan"] else "index scan"} on {summary["table"]}'
+            if summary['rows'] is not None:
+                line += f', estimated rows: {summary["rows"]}'
+            if summary['cost'] is not None:
+                line += f', cost: {summary["cost"]}'
+            self.stdout.write(f'{line}\n')
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{summary["plan"]}\n')
+
+            if not utils.has_index(model_class, field):
+                _exit = 1
+                self.stderr.write(
+                    f'{model} has no index on {summary["table"]}.{model_class._meta.get_field(field).column}'
+                    ' - every cleanup will scan the whole table\n'
+                )
+        return _exit
+
+    def _clean_history(self, options):
+        if options['explain']:
+            return self._explain_history(options)
+
+        _exit = 0
+        if (options['max_duration'] or options['max_rows']) and not (
+            options['batch_size'] or settings.DBCLEANUP_HISTORY_BATCH_SIZE
+        ):
+            raise CommandError('--max-duration and --max-rows require --batch-size')
+        budget = Budget(options['max_duration'], options['max_rows'])
+        history_models = self._history_models()
+        # detect the models that can skip the Collector once, before deleting anything
+        fast_models = {ct for ct, _, _ in history_models if self._can_fast_delete(ct.model_class())}
+
+        if options['partitions'] and options['interactive']:
+            raise CommandError('--interactive cannot be used with --partitions')
+        if options['jobs'] > 1:
+            if options['interactive']:
+                raise CommandError('--interactive cannot be used with --jobs')
+            with ThreadPoolExecutor(max_workers=options['jobs']) as executor:
+                results = executor.map(
+                    lambda x: self._clean_history_worker(*x, options, fast=x[0] in fast_models, budget=budget),
+                    history_models,
+                )
+                # map() keeps the order, so output is still per model, in settings order
+                for model_exit, out, err in results:
+                    _exit = max(_exit, model_exit)
+                    if out:
+                        self.stdout.write(out, ending='')
+                    if err:
+                        self.stderr.write(err, ending='')
+            return _exit
+
+        for ct, log_size, field in history_models:
+            _exit = max(
+                _exit, self._clean_history_model(ct, log_size, field, options, fast=ct in fast_models, budget=budget)
+            )
+        return _exit
+
+    def _drop_tables(self, tables, no_fk_check=False, using=DEFAULT_DB_ALIAS, step=None, gentle_size=None):
+        """
+        DROP `tables` (`models.Table` rows) in dependency order, several per statement (see `orphans.drop_batches`), so
+        that tables referencing each other are all dropped in one run.
+        Tables of `gentle_size` bytes or more are emptied in chunks first (see `_shrink_table`).
+        :return: how many were dropped
+        """
+        connection = connections[using]
+        by_name = {table.name: table for table in tables}
+        batches = orphans.drop_batches(
+            by_name,
+            orphans.foreign_keys(by_name, using),
+            # no multi-table DROP TABLE in SQLite
+            batch_size=1 if connection.vendor == 'sqlite' else orphans.BATCH_SIZE,
+        )
+        if connection.vendor == 'sqlite':
+            fk_checks = 'PRAGMA foreign_keys = OFF', 'PRAGMA foreign_keys = ON'
+        else:
+            fk_checks = 'SET FOREIGN_KEY_CHECKS=0', 'SET FOREIGN_KEY_CHECKS=1'
+        gentle = set()
+        if gentle_size is not None:
+            gentle = {x for x, table in by_name.items() if (table.size or 0) >= gentle_size}
+        if gentle and connection.vendor not in orphans.SHRINK_VENDORS:
             self.stderr.write(
-                f'Failed to drop {table_name}: {e} - if DB constraints, maybe running again after will work'
+                f'Not shrinking {", ".join(sorted(gentle))}: deleting their rows would not shrink {connection.vendor}'
+                ' table files, dropping them as is'
             )
+            gentle = set()
+        if gentle:
+            # deleting their rows would change (ON DELETE CASCADE / SET NULL) or half empty them (blocked) before
+            # the DROP fails anyway: dropped as is
+            for name, referencing in orphans.referenced_from(gentle, by_name, using).items():
+                self.stderr.write(f'{name} is referenced by {", ".join(sorted(referencing))}, not shrinking it')
+                gentle.discard(name)
+        dropped = 0
+        if no_fk_check:
+            with connection.cursor() as cursor:
+                cursor.execute(fk_checks[0])
+        try:
+            for batch in batches:
+                with ExitStack() as stack:
+                    entries = {x: stack.enter_context(self.report.item('tables', x, using)) for x in batch}
+                    errors = {}
+                    # referencing tables are in previous batches, so their rows can be deleted
+                    for name in batch:
+                        if name in gentle:
+                            errors[name] = self._shrink_table(by_name[name], using)
+                    shrunk = [x for x in batch if errors.get(x) is None]
+                    if shrunk:
+                        errors.update(orphans.drop_tables(shrunk, using))
+                    for name, entry in entries.items():
+                        entry.update(
+                            rows=by_name[name].rows or 0, bytes=by_name[name].size, applied=errors[name] is None
+                        )
+                        if errors[name] is None:
+                            dropped += 1
+                            self.stdout.write(f'Dropped {name}')
+                        else:
+                            entry['error'] = errors[name]
+                            self.stderr.write(f'Failed to drop {name}: {errors[name]}')
+                        if step is not None:
+                            step.advance()
+                if self.throttle:
+                    self.throttle.wait()
         finally:
             if no_fk_check:
                 # reset FK CHECK to 1 in case this connection remains in use (ie: used somewhere else than a command)
                 with connection.cursor() as cursor:
-                    cursor.execute(f'SET FOREIGN_KEY_CHECKS=1')
+                    cursor.execute(fk_checks[1])
+        return dropped
 
-    def _handle_tables(self, options):
+    def _shrink_table(self, table, using=DEFAULT_DB_ALIAS):
+        """
+        DELETE the rows of a big table in throttled chunks (settings.DBCLEANUP_GENTLE_DROP_CHUNK rows, paced by
+        `--rate`, `--sleep` and `--max-replica-lag`), so that dropping it afterwards has (almost) nothing left to purge
+        :return: None if emptied, the error otherwise
+        """
+        chunk_size = settings.DBCLEANUP_GENTLE_DROP_CHUNK
+        self.stdout.write(f'Shrinking {table.name} ({table.size} bytes), {chunk_size} rows at a time')
+        step = self.progress.start('tables', self._item_name(table.name, using), total=table.rows, unit='rows')
+        try:
+            rows = orphans.shrink_table(table.name, using, chunk_size, throttle=self.throttle, step=step)
+        except DatabaseError as e:
+            return str(e)
+        finally:
+            step.finish()
+        self.stdout.write(f'Deleted {rows} rows from {table.name}')
+        return None
+
+    def _handle_tables(self, options, using=DEFAULT_DB_ALIAS):
         tables_in_use = set(utils.model_tables())
         tables_in_use.update(settings.DBCLEANUP_REQUIRED_TABLES)
         tables_in_use.update(REQUIRED_TABLES)
 
-        for table in models.Table.objects.exclude(name__in=tables_in_use):
+        tables = list(models.table_model(using).objects.db_manager(using).exclude(name__in=tables_in_use))
+        step = self.progress.start('tables', self._item_name('tables', using), total=len(tables), unit='tables')
+        to_drop = []
+        for table in tables:
             self.stdout.write(f'- {table.name} ({table.size})\n')
-            if options['force']:
-                self._drop_table(table.name, options['no_fk'])
-            elif options['interactive']:
+            drop = options['force']
+            if not drop and options['interactive']:
                 ans = input('Drop it? (y/N) ')  # nosec - surface is py3-only, input() is safe
-                if ans.lower().strip() == 'y':
-                    self._drop_table(table.name, options['no_fk'])
+                drop = ans.lower().strip() == 'y'
+            if drop:
+                to_drop.append(table)
+            else:
+                with self.report.item('tables', table.name, using) as entry:
+                    entry.update(rows=table.rows or 0, bytes=table.size)
+        # dropped once all of them are known, in dependency order
+        dropped = 0
+        if to_drop:
+            dropped = self._drop_tables(
+                to_drop,
+                options['no_fk'],
+                using,
+                step,
+                gentle_size=options['gentle_drop_size'] or settings.DBCLEANUP_GENTLE_DROP_SIZE,
+            )
+        if options['force'] or options['interactive']:
+            step.finish()
+        if dropped and connections[using].vendor == 'sqlite':
+            self._vacuum_sqlite(options, using)
 
-    def _clean_migrations(self, options):
+    def _vacuum_sqlite(self, options, using=DEFAULT_DB_ALIAS):
+        """
+        SQLite keeps the pages of dropped tables in its freelist: give them back to the filesystem, with
+        `PRAGMA incremental_vacuum` (auto_vacuum=INCREMENTAL databases) or `VACUUM` (`--vacuum`, rewrites the whole
+        file)
+        """
+        released = reclaim.vacuum_sqlite(using, full=options['vacuum'])
+        if released is None:
+            self.stdout.write(
+                'Pages of the dropped tables are kept in the database file,'
+                ' use --vacuum to release them (rewrites the file)\n'
+            )
+        else:
+            self.stdout.write(f'Released {released} bytes to the filesystem\n')
+
+    def _clean_migrations(self, options, using=DEFAULT_DB_ALIAS):
         # list migrations based on showmigrations command
-        loader = MigrationLoader(connection, ignore_no_migrations=False)
+        loader = MigrationLoader(connections[using], ignore_no_migrations=False)
         migrated_apps = {l for l in loader.migrated_apps}
 
         to_delete = {}
@@ -200,38 +874,270 @@ class Command(BaseCommand):
                     to_delete[m[0]] = []
                 to_delete[m[0]].append(v)
 
+        to_drop = {}
         for app, migs in to_delete.items():
             self.stdout.write(f'- {app} ({len(migs)})\n')
-            if options['force']:
-                self._drop_migrations(migs)
-            elif options['interactive']:
+            drop = options['force']
+            if not drop and options['interactive']:
                 ans = input('Drop it? (y/N) ')  # nosec - surface is py3-only, input() is safe
-                if ans.lower().strip() == 'y':
-                    self._drop_migrations(migs)
+                drop = ans.lower().strip() == 'y'
+            if drop:
+                to_drop[app] = migs
+            else:
+                with self.report.item('migrations', app, using) as entry:
+                    entry['rows'] = len(migs)
+        if not to_drop:
+            return
+        # dropped once all of them are known, in a single query
+        with ExitStack() as stack:
+            entries = {x: stack.enter_context(self.report.item('migrations', x, using)) for x in to_drop}
+            error = self._drop_migrations(to_drop, options, using)
+            for app, entry in entries.items():
+                entry.update(rows=len(to_drop[app]) if error is None else 0, applied=error is None)
+                if error is not None:
+                    entry['error'] = error
 
-    def _drop_migrations(self, migs):
-        for mig in migs:
-            try:
-                mig.delete()
-                self.stdout.write(f'Dropped {mig}')
-            except Exception as e:
-                self.stderr.write(f'Failed to drop {mig}: {e}')
+    def _drop_migrations(self, to_drop, options, using=DEFAULT_DB_ALIAS):
+        """
+        DELETE the recorded migrations of the apps in `to_drop` (`{app: migration records}`) with one query, in a
+        transaction - as they are all the migrations recorded for these apps
+        :return: None if dropped, the error otherwise
+        """
+        step = self.progress.start(
+            'migrations',
+            self._item_name('migrations', using),
+            sum(len(x) for x in to_drop.values()),
+            unit='migrations',
+        )
+        try:
+            with transaction.atomic(using=using):
+                MigrationRecorder(connections[using]).migration_qs.filter(app__in=to_drop).delete()
+            for app, migs in to_drop.items():
+                if options['verbosity'] > 1:
+                    for mig in migs:
+                        self.stdout.write(f'Dropped {mig}')
+                self.stdout.write(f'Dropped {len(migs)} migrations of {app}')
+                step.advance(len(migs))
+        except DatabaseError as e:
+            self.stderr.write(f'Failed to drop the migrations of {", ".join(to_drop)}: {e}')
+            return str(e)
+        finally:
+            step.finish()
+        return None
 
     def _opt(self, opt, options):
-        if not options['just'] or opt in options['just']:
-            return True
-        return False
+        if options['just']:
+            return opt in options['just']
+        # table rebuilds block writes, only when explicitly requested
+        return opt != 'reclaim'
 
     def handle(self, *args, **options):
+        self.throttle = Throttle(
+            rate=options['rate'],
+            sleep=options['sleep'],
+            max_lag=options['max_replica_lag'],
+            databases=settings.DBCLEANUP_REPLICA_DATABASES,
+            stderr=self.stderr,
+        )
+        self.progress = ProgressReporter(self.stderr, options['progress_format'], enabled=options['verbosity'] > 1)
+
+        if options['format'] == 'json' and options['interactive']:
+            raise CommandError('--interactive cannot be used with --format json')
+        if options['all_databases']:
+            self.databases = tuple(settings.DATABASES)
+        else:
+            self.databases = tuple(dict.fromkeys(options['database'] or (DEFAULT_DB_ALIAS,)))
+        for using in self.databases:
+            if using not in settings.DATABASES:
+                raise CommandError(f'{using} is not in settings.DATABASES')
+        if len(self.databases) > 1 and options['interactive']:
+            raise CommandError('--interactive cannot be used with several databases')
+        if options['max_replica_lag'] is not None:
+            # before anything is deleted, e.g. without the REPLICATION CLIENT privilege on MySQL
+            for db in settings.DBCLEANUP_REPLICA_DATABASES:
+                try:
+                    replica_lag(db)
+                except DatabaseError as e:
+                    raise CommandError(f'--max-replica-lag cannot be checked on {db}: {e}')
+        streams = []
+        if options['format'] == 'json':
+            # the report replaces the text output
+            streams.append(self.stdout)
+            self.stdout = OutputWrapper(StringIO())
+        report_file = open(options['report_file'], 'w') if options['report_file'] else None
+        if report_file is not None:
+            streams.append(report_file)
+        self.report = Report(streams)
+        self.report.start({k: v for k, v in options.items() if k not in ('stdout', 'stderr')})
+
+        try:
+            self._handle_actions(options)
+        except BaseException as e:
+            self.report.end('error', str(e) or e.__class__.__name__)
+            raise
+        else:
+            self.report.end()
+        finally:
+            if report_file is not None:
+                report_file.close()
+
+    def _save_run(self, action, options):
+        """
+        keep the results of this run of `action` (from the report) for `dbcleanup.metrics`,
+        unless nothing was applied (dry or declined runs)
+        """
+        applied = [x for x in self.report.items.get(action, []) if x['applied']]
+        if not (options['force'] or applied) or (action == 'history' and options['explain']):
+            return
+        summary = self.report.summaries[action]
+        run, _ = models.CleanupRun.objects.update_or_create(
+            action=action,
+            defaults={
+                'duration': summary['duration'],
+                'applied': len(applied),
+                'rows': summary['rows'],
+                'bytes': summary['bytes'],
+                'errors': summary['errors'],
+            },
+        )
+        run.items.all().delete()
+        items = []
+        for entry in applied:
+            if action == 'history':
+                # rows deleted per model, including cascades
+                items.extend(models.CleanupRunItem(run=run, name=k, rows=v) for k, v in entry.get('models', {}).items())
+            else:
+                items.append(
+                    models.CleanupRunItem(
+                        run=run,
+                        name=self._item_name(entry['item'], entry.get('database')),
+                        rows=entry['rows'],
+                        bytes=entry.get('bytes') or 0,
+                    )
+                )
+        models.CleanupRunItem.objects.bulk_create(items)
+
+    def _item_name(self, name, using):
+        # items of several databases are told apart by their alias
+        return name if len(self.databases) == 1 else f'{using}.{name}'
+
+    def _run_databases(self, action, method, options):
+        """
+        run `method` (name of a Command method, called with `using`) on the database of this run or, if there are
+        several, on all of them concurrently, each one with its own connection and its output collated per database.
+        Those with engines that are not supported by the action (see `vendors`) are skipped then.
+        """
+        if len(self.databases) == 1:
+            getattr(self, method)(options, using=self.databases[0])
+            return
+
+        def _worker(using):
+            out, err = StringIO(), StringIO()
+            # same run (report, progress, throttle) but its own output
+            command = copy.copy(self)
+            command.stdout, command.stderr = OutputWrapper(out), OutputWrapper(err)
+            error = None
+            try:
+                getattr(command, method)(options, using=using)
+            except Exception as e:
+                error = e
+            finally:
+                connections.close_all()
+            return out.getvalue(), err.getvalue(), error
+
+        databases = []
+        for using in self.databases:
+            error = self._vendor_error(action, using)
+            if error is not None:
+                self.stderr.write(f'{action} skipped for database {using}, {error}\n')
+            else:
+                databases.append(using)
+        if not databases:
+            return
+        with ThreadPoolExecutor(max_workers=len(databases)) as executor:
+            results = list(executor.map(_worker, databases))
+        errors = []
+        for using, (out, err, error) in zip(databases, results):
+            if out:
+                self.stdout.write(f'Database {using}:\n{out}', ending='')
+            if err:
+                self.stderr.write(err, ending='')
+            if error is not None:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def _analyze(self, options, using=DEFAULT_DB_ALIAS):
+        step = self.progress.start('analyze', self._item_name('tables', using), unit='tables')
+        self._analyze_tables(options, step=step, using=using)
+        step.finish()
+
+    def _reclaim(self, options, using=DEFAULT_DB_ALIAS):
+        step = self.progress.start('reclaim', self._item_name('tables', using), unit='tables')
+        self._reclaim_tables(options, step=step, using=using)
+        step.finish()
+
+    def _handle_actions(self, options):
         if self._opt('tables', options):
-            self._clean_tables(options)
+            with self.report.action('tables'):
+                self._run_databases('tables', '_clean_tables', options)
+            self._save_run('tables', options)
         if self._opt('migrations', options):
-            self._clean_migrations(options)
-        if self._opt('history', options) and self._clean_history(options) != 0:
-            raise CommandError('some errors, please review')
+            with self.report.action('migrations'):
+                self._run_databases('migrations', '_clean_migrations', options)
+            self._save_run('migrations', options)
+        if self._opt('history', options):
+            with self.report.action('history'):
+                _exit = self._clean_history(options)
+            self._save_run('history', options)
+            if _exit != 0:
+                raise CommandError('some errors, please review')
         if self._opt('analyze', options):
-            self._analyze_tables()
+            with self.report.action('analyze'):
+                self._run_databases('analyze', '_analyze', options)
+            self._save_run('analyze', options)
+        if self._opt('reclaim', options):
+            with self.report.action('reclaim'):
+                self._run_databases('reclaim', '_reclaim', options)
+            self._save_run('reclaim', options)
 
 
 class CascadeException(Exception):
     """error thrown when deletion cascades to unallowed models"""
+
+
+class LimitReachedException(Exception):
+    """error thrown when the run limits (Budget) are reached before a deletion is complete"""
+
+
+class Budget:
+    """
+    wall-clock and row limits of a history cleanup run, shared by all the models (and --jobs workers)
+    """
+
+    def __init__(self, max_duration=None, max_rows=None):
+        self.deadline = None if max_duration is None else time.monotonic() + max_duration
+        self.rows_left = max_rows
+        self._lock = threading.Lock()
+
+    def reserve(self, batch_size):
+        """
+        reserve rows for the next batch, so that concurrent workers do not overshoot max_rows together
+        :return: size for the next batch - 0 if any of the limits was reached
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 0
+        if self.rows_left is None or batch_size is None:
+            return batch_size
+        with self._lock:
+            size = min(batch_size, self.rows_left)
+            self.rows_left -= size
+        return size
+
+    def spend(self, rows, reserved=0):
+        """
+        account for the rows a batch actually deleted (cascades included), giving back what it `reserved`
+        """
+        if self.rows_left is not None:
+            with self._lock:
+                self.rows_left = max(self.rows_left + reserved - rows, 0)
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+from django.core.management import BaseCommand
+
+from dbcleanup import metrics
+
+
+class Command(BaseCommand):
+    help = 'Write table sizes and last cleanup results in Prometheus format, for the node_exporter textfile collector.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='File to write (*.prom), stdout if not specified')
+
+    def handle(self, *args, **options):
+        output = metrics.render()
+        if not options['path']:
+            self.stdout.write(output, ending='')
+            return
+        # write and rename, so the collector never reads a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(options['path'])), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(output)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, options['path'])
+        except BaseException:
+            os.remove(tmp)
+            raise
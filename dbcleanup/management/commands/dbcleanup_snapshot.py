@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from dbcleanup import snapshots, stats
+
+
+class Command(BaseCommand):
+    help = 'Record the size of every table (to track growth rates) and downsample the old records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-downsample', action='store_true', help='Only record the snapshot, keep all the old ones'
+        )
+        parser.add_argument(
+            '--table-stats',
+            action='store_true',
+            help='Also refresh the table statistics of the admin, free space estimates included',
+        )
+
+    def handle(self, *args, **options):
+        recorded = snapshots.take_snapshot()
+        self.stdout.write(f'Recorded {len(recorded)} tables\n')
+        if not options['no_downsample']:
+            self.stdout.write(f'Removed {snapshots.downsample()} old snapshots\n')
+        if options['table_stats']:
+            self.stdout.write(f'Refreshed statistics of {len(stats.refresh())} tables\n')
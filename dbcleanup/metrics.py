@@ -0,0 +1,82 @@
+from . import models, utils
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample(name, labels, value):
+    labels = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return f'{name}{{{labels}}} {value}'
+
+
+# name, attribute, help
+TABLE_GAUGES = (
+    ('dbcleanup_table_size_bytes', 'size', 'Total size of the table (data and indexes)'),
+    ('dbcleanup_table_rows', 'rows', 'Estimated number of rows of the table'),
+    ('dbcleanup_table_data_bytes', 'data_length', 'Size of the table data'),
+    ('dbcleanup_table_index_bytes', 'index_length', 'Size of the table indexes'),
+    ('dbcleanup_table_free_bytes', 'free', 'Estimated free space (or bloat) of the table'),
+    ('dbcleanup_table_index_free_bytes', 'index_free', 'Estimated free space (or bloat) of the table indexes'),
+)
+# expensive to estimate (see `models.PGTableManager.with_free`), read from the cached statistics (`models.TableStats`)
+CACHED_GAUGES = {'free', 'index_free'}
+RUN_GAUGES = (
+    ('dbcleanup_last_run_timestamp_seconds', 'Time the last run of the action finished'),
+    ('dbcleanup_last_run_duration_seconds', 'Duration of the last run of the action'),
+    ('dbcleanup_last_run_applied', 'Items (tables, models, apps...) changed by the last run of the action'),
+    ('dbcleanup_last_run_rows', 'Rows reclaimed by the last run of the action'),
+    ('dbcleanup_last_run_bytes', 'Bytes reclaimed by the last run of the action'),
+    ('dbcleanup_last_run_errors', 'Errors in the last run of the action'),
+)
+
+
+def render():
+    """
+    Prometheus text exposition format (also valid OpenMetrics, minus the EOF marker) of:
+    * size and rows of every table (`models.Table`, a single catalog query), labelled with the app and model, and
+      their free space as of the latest statistics refresh
+    * results of the last run of each action (`models.CleanupRun`), and rows deleted per model by the last history run
+    """
+    model_tables = utils.model_tables()
+    samples = {name: [] for name, _, _ in TABLE_GAUGES}
+    cached = {x.name: x for x in models.TableStats.objects.all()}
+    for table in models.Table.objects.all():
+        model = model_tables.get(table.name)
+        labels = {
+            'table': table.name,
+            'app': model._meta.app_label if model else '',
+            'model': model._meta.label if model else '',
+        }
+        for name, attribute, _ in TABLE_GAUGES:
+            value = getattr(cached.get(table.name) if attribute in CACHED_GAUGES else table, attribute, None)
+            if value is not None:
+                samples[name].append(_sample(name, labels, value))
+
+    runs = list(models.CleanupRun.objects.prefetch_related('items'))
+    run_values = (
+        lambda r: r.finished_at.timestamp(),
+        lambda r: r.duration,
+        lambda r: r.applied,
+        lambda r: r.rows,
+        lambda r: r.bytes,
+        lambda r: r.errors,
+    )
+    for (name, _), value in zip(RUN_GAUGES, run_values):
+        samples[name] = [_sample(name, {'action': r.action}, value(r)) for r in runs]
+    samples['dbcleanup_last_run_deleted_rows'] = [
+        _sample('dbcleanup_last_run_deleted_rows', {'model': item.name}, item.rows)
+        for r in runs
+        if r.action == 'history'
+        for item in r.items.all()
+    ]
+
+    helps = {name: text for name, _, text in TABLE_GAUGES}
+    helps.update(RUN_GAUGES)
+    helps['dbcleanup_last_run_deleted_rows'] = 'Rows deleted per model by the last history run'
+    lines = []
+    for name, values in samples.items():
+        lines.append(f'# HELP {name} {helps[name]}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(values)
+    return '\n'.join(lines) + '\n'
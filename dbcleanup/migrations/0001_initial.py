@@ -0,0 +1,124 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='MySQLTable',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        db_column='table_name',
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('schema', models.CharField(db_column='table_schema', max_length=64)),
+                (
+                    'rows',
+                    models.PositiveBigIntegerField(db_column='table_rows', null=True),
+                ),
+                (
+                    'avg_row_length',
+                    models.PositiveBigIntegerField(null=True, verbose_name='Average row length'),
+                ),
+                ('data_length', models.PositiveBigIntegerField(null=True)),
+                (
+                    'max_data_length',
+                    models.PositiveBigIntegerField(null=True, verbose_name='Maximum data length'),
+                ),
+                ('index_length', models.PositiveBigIntegerField(null=True)),
+            ],
+            options={
+                'db_table': 'information_schema`.`TABLES',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NoTable',
+            fields=[
+                (
+                    'name',
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ('rows', models.PositiveBigIntegerField(null=True)),
+                ('size', models.IntegerField(default=0)),
+            ],
+            options={
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PGNameSpace',
+            fields=[
+                ('oid', models.IntegerField(primary_key=True, serialize=False)),
+                ('nspname', models.CharField(max_length=255, null=True)),
+            ],
+            options={
+                'db_table': 'pg_namespace',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PGTable',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        db_column='relname',
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('relkind', models.CharField(max_length=255, null=True)),
+                (
+                    'rows',
+                    models.PositiveBigIntegerField(db_column='reltuples', null=True),
+                ),
+            ],
+            options={
+                'db_table': 'pg_class',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HistoryProgress',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('model', models.CharField(max_length=255, unique=True)),
+                ('cutoff', models.DateTimeField()),
+                ('last_pk', models.CharField(max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'history progress',
+            },
+        ),
+        migrations.CreateModel(
+            name='Table',
+            fields=[],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('dbcleanup.notable',),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MySQLPartition',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        db_column='partition_name',
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('table', models.CharField(db_column='table_name', max_length=64)),
+                ('schema', models.CharField(db_column='table_schema', max_length=64)),
+                (
+                    'method',
+                    models.CharField(db_column='partition_method', max_length=18, null=True),
+                ),
+                (
+                    'expression',
+                    models.TextField(db_column='partition_expression', null=True),
+                ),
+                (
+                    'description',
+                    models.TextField(db_column='partition_description', null=True),
+                ),
+                (
+                    'rows',
+                    models.PositiveBigIntegerField(db_column='table_rows', null=True),
+                ),
+                ('data_length', models.PositiveBigIntegerField(null=True)),
+                ('index_length', models.PositiveBigIntegerField(null=True)),
+            ],
+            options={
+                'db_table': 'information_schema`.`PARTITIONS',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NoPartition',
+            fields=[
+                (
+                    'name',
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ('table', models.CharField(max_length=64)),
+                ('rows', models.PositiveBigIntegerField(null=True)),
+                ('size', models.IntegerField(default=0)),
+            ],
+            options={
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PGPartition',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        db_column='relname',
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('relkind', models.CharField(max_length=255, null=True)),
+                ('relispartition', models.BooleanField(default=False)),
+                (
+                    'rows',
+                    models.PositiveBigIntegerField(db_column='reltuples', null=True),
+                ),
+            ],
+            options={
+                'db_table': 'pg_class',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Partition',
+            fields=[],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('dbcleanup.nopartition',),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0002_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CleanupRun',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('action', models.CharField(max_length=32, unique=True)),
+                ('finished_at', models.DateTimeField(auto_now=True)),
+                ('duration', models.FloatField(default=0)),
+                ('applied', models.PositiveIntegerField(default=0)),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+                ('bytes', models.PositiveBigIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CleanupRunItem',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('name', models.CharField(max_length=255)),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+                ('bytes', models.PositiveBigIntegerField(default=0)),
+                (
+                    'run',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='items',
+                        to='dbcleanup.cleanuprun',
+                    ),
+                ),
+            ],
+        ),
+    ]
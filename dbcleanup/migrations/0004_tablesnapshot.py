@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0003_cleanuprun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableSnapshot',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('table', models.CharField(max_length=64)),
+                ('taken_at', models.DateTimeField()),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('rows', models.PositiveBigIntegerField(null=True)),
+                ('index_length', models.PositiveBigIntegerField(null=True)),
+                ('growth', models.FloatField(help_text='bytes per day', null=True)),
+            ],
+            options={
+                'get_latest_by': 'taken_at',
+                'indexes': [
+                    models.Index(
+                        fields=['table', 'taken_at'],
+                        name='dbcleanup_t_table_f61269_idx',
+                    )
+                ],
+            },
+        ),
+    ]
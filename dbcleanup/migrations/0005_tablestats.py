@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0004_tablesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableStats',
+            fields=[
+                (
+                    'name',
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ('rows', models.PositiveBigIntegerField(null=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                (
+                    'avg_row_length',
+                    models.PositiveBigIntegerField(null=True, verbose_name='Average row length'),
+                ),
+                ('data_length', models.PositiveBigIntegerField(null=True)),
+                ('index_length', models.PositiveBigIntegerField(null=True)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'table statistics',
+                'verbose_name_plural': 'table statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0005_tablestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablestats',
+            name='free',
+            field=models.PositiveBigIntegerField(null=True, verbose_name='free space'),
+        ),
+        migrations.AddField(
+            model_name='tablestats',
+            name='index_free',
+            field=models.PositiveBigIntegerField(null=True, verbose_name='index free space'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0006_tablestats_free'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MySQLIndex',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        db_column='index_name',
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('table', models.CharField(db_column='table_name', max_length=64)),
+                ('schema', models.CharField(db_column='table_schema', max_length=64)),
+                ('seq_in_index', models.PositiveIntegerField()),
+                ('non_unique', models.IntegerField()),
+                ('type', models.CharField(db_column='index_type', max_length=16)),
+            ],
+            options={
+                'db_table': 'information_schema`.`STATISTICS',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NoIndex',
+            fields=[
+                (
+                    'name',
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ('table', models.CharField(max_length=64)),
+                ('size', models.IntegerField(default=0)),
+                ('unique', models.BooleanField(null=True)),
+                ('unused', models.BooleanField(null=True)),
+            ],
+            options={
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PGIndex',
+            fields=[
+                (
+                    'oid',
+                    models.IntegerField(db_column='indexrelid', primary_key=True, serialize=False),
+                ),
+                ('name', models.CharField(db_column='indexrelname', max_length=64)),
+                ('table', models.CharField(db_column='relname', max_length=64)),
+                ('schema', models.CharField(db_column='schemaname', max_length=64)),
+                (
+                    'scans',
+                    models.PositiveBigIntegerField(db_column='idx_scan', null=True),
+                ),
+                (
+                    'reads',
+                    models.PositiveBigIntegerField(db_column='idx_tup_read', null=True),
+                ),
+            ],
+            options={
+                'db_table': 'pg_stat_user_indexes',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Index',
+            fields=[],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('dbcleanup.noindex',),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('dbcleanup', '0007_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SQLiteTable',
+            fields=[
+                (
+                    'name',
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ('type', models.CharField(max_length=16)),
+            ],
+            options={
+                'db_table': 'sqlite_master',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,129 +1,302 @@
-from django.db import models
+from django.db import connections, models, DatabaseError
 from django.db.models.expressions import RawSQL
 from django.conf import settings
 
+# all the (unmanaged) table models are always defined, so that migrations do not depend on the database engine
+# `Table` (below) is a proxy to the one matching the default database
 
-def _choose_model():
-    # would this be cleaner in a
-    if settings.DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
 
-        class TableManager(models.Manager):
-            def get_queryset(self):
-                return (
-                    super()
-                    .get_queryset()
-                    .filter(schema=RawSQL('DATABASE()', []))
-                    .annotate(size=RawSQL('data_length + index_length', []))
-                )
-
-        class MySQLTable(models.Model):
-            objects = TableManager()
-            all_tables = models.Manager()
-
-            # FIXME: no key as this is a mysql view... how to tell django to see CONCAT(name + schema) as primary_key?
-            # just table_name for now though that is definitely not true...
-            name = models.CharField(max_length=64, primary_key=True, db_column='table_name')
-            schema = models.CharField(max_length=64, db_column='table_schema')
-
-            rows = models.PositiveBigIntegerField(null=True, db_column='table_rows')
-            avg_row_length = models.PositiveBigIntegerField(null=True, verbose_name='Average row length')
-            data_length = models.PositiveBigIntegerField(null=True)
-            max_data_length = models.PositiveBigIntegerField(null=True, verbose_name='Maximum data length')
-            index_length = models.PositiveBigIntegerField(null=True)
-
-            class Meta:
-                managed = False
-                db_table = 'information_schema`.`TABLES'
-
-            def __str__(self) -> str:
-                return f'{self.schema}.{self.name}'
+class MySQLTableManager(models.Manager):
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(schema=RawSQL('DATABASE()', []))
+            .annotate(
+                size=RawSQL('data_length + index_length', []),
+            )
+        )
 
-        return MySQLTable
+    def with_free(self):
+        """
+        tables with their estimated free space (`free`, `index_free`), see `PGTableManager.with_free`
+        """
+        return self.get_queryset().annotate(
+            # allocated but unused, for the whole tablespace (data and indexes) with innodb_file_per_table
+            free=RawSQL('data_free', []),
+            index_free=RawSQL('NULL', []),
+        )
 
-    if settings.DATABASES['default']['ENGINE'] in (
-        'django.db.backends.postgresql_psycopg2',
-        'django.db.backends.postgresql',
-    ):
+
+class MySQLTable(models.Model):
+    objects = MySQLTableManager()
+    all_tables = models.Manager()
+
+    # FIXME: no key as this is a mysql view... how to tell django to see CONCAT(name + schema) as primary_key?
+    # just table_name for now though that is definitely not true...
+    name = models.CharField(max_length=64, primary_key=True, db_column='table_name')
+    schema = models.CharField(max_length=64, db_column='table_schema')
+
+    rows = models.PositiveBigIntegerField(null=True, db_column='table_rows')
+    avg_row_length = models.PositiveBigIntegerField(null=True, verbose_name='Average row length')
+    data_length = models.PositiveBigIntegerField(null=True)
+    max_data_length = models.PositiveBigIntegerField(null=True, verbose_name='Maximum data length')
+    index_length = models.PositiveBigIntegerField(null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'information_schema`.`TABLES'
+
+    def __str__(self) -> str:
+        return f'{self.schema}.{self.name}'
+
+
+def _pg_with_partitions(expression):
+    """
+    `expression` (a size function) of a table plus the sum of it for all its partitions (if it is partitioned)
+    """
+    return (
+        f'{expression}(pg_class.oid) + COALESCE(('
+        f'SELECT SUM({expression}(i.inhrelid)) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid'
+        ' WHERE i.inhparent = pg_class.oid AND c.relispartition'
+        '), 0)'
+    )
+
+
+# estimated bloat, from the row estimates of the catalog and the column widths of the planner statistics (`pg_stats`,
+# NULL if the table was never analyzed, as there are no rows to aggregate then): pages used minus pages needed by the
+# rows (tuple header, MAXALIGNed data, line pointer) - it ignores padding between columns and TOAST, so it is only an
+# approximation
+_PG_TABLE_BLOAT = (
+    '(SELECT GREATEST(pg_class.relpages - CEIL(pg_class.reltuples'
+    ' * (24 + CEIL(SUM((1 - s.null_frac) * s.avg_width) / 8) * 8 + 4)'
+    " / (current_setting('block_size')::int - 24)), 0) * current_setting('block_size')::bigint"
+    " FROM pg_stats s WHERE s.schemaname = 'public' AND s.tablename = pg_class.relname AND NOT s.inherited"
+    ' HAVING COUNT(*) > 0)'
+)
+# same for a btree index `ic` (pg_class) of table `tc` (pg_class), `x` being its pg_index row:
+# leaf pages needed by the index tuples at the default fillfactor (90%), plus the meta page
+PG_INDEX_BLOAT = (
+    'GREATEST(ic.relpages - 1 - CEIL(ic.reltuples * (8 + CEIL(COALESCE(('
+    'SELECT SUM((1 - s.null_frac) * s.avg_width) FROM pg_attribute a JOIN pg_stats s'
+    " ON s.schemaname = 'public' AND s.tablename = tc.relname AND s.attname = a.attname AND NOT s.inherited"
+    ' WHERE a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey)'
+    "), 0) / 8) * 8 + 4) / ((current_setting('block_size')::int - 24) * 0.9)), 0)"
+    " * current_setting('block_size')::bigint"
+)
+_PG_INDEXES_BLOAT = (
+    f'(SELECT SUM({PG_INDEX_BLOAT}) FROM pg_index x'
+    ' JOIN pg_class ic ON ic.oid = x.indexrelid JOIN pg_class tc ON tc.oid = x.indrelid'
+    " JOIN pg_am am ON am.oid = ic.relam WHERE x.indrelid = pg_class.oid AND am.amname = 'btree')"
+)
+# pgstattuple (if installed and allowed) measures free space and dead rows instead, from the visibility map
+_PG_TABLE_FREE = (
+    "CASE WHEN pg_class.relkind = 'r' THEN"
+    ' (SELECT approx_free_space + dead_tuple_len FROM pgstattuple_approx(pg_class.oid)) END'
+)
+_pgstattuple = {}
+
+
+def has_pgstattuple(using='default'):
+    """
+    pgstattuple_approx can be executed on the `using` database (checked once)
+    """
+    if using not in _pgstattuple:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT has_function_privilege(oid, 'EXECUTE') FROM pg_proc WHERE proname = 'pgstattuple_approx'"
+            )
+            row = cursor.fetchone()
+        _pgstattuple[using] = bool(row and row[0])
+    return _pgstattuple[using]
+
+
+class PGTableManager(models.Manager):
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .annotate(
+                size=RawSQL(_pg_with_partitions('pg_total_relation_size'), []),
+                # pg_column_size does not seem to be the same...
+                avg_row_length=RawSQL('NULL', []),
+                data_length=RawSQL(_pg_with_partitions('pg_relation_size'), []),
+                # PG equivalent for this...? any use for it anyway?
+                max_data_length=RawSQL('NULL', []),
+                index_length=RawSQL(_pg_with_partitions('pg_indexes_size'), []),
+            )
+            # partitioned tables (with the size of their partitions) but not the partitions themselves
+            .filter(schema__nspname='public', relkind__in=('r', 'p'), relispartition=False)
+        )
+
+    def with_free(self):
         """
-        based on https://wiki.postgresql.org/wiki/Disk_Usage
-
-        ```
-            SELECT c.oid,nspname AS table_schema,relname AS table_name
-                , c.reltuples AS row_estimate
-                , pg_total_relation_size(c.oid) AS total_bytes
-                , pg_indexes_size(c.oid) AS index_bytes
-                , pg_total_relation_size(reltoastrelid) AS toast_bytes
-            FROM pg_class c
-            LEFT JOIN pg_namespace n ON n.oid = c.relnamespace
-            WHERE relkind = 'r' and nspname = 'public';
-        ```
+        tables with their estimated free space (`free`, `index_free`): not part of the default queryset as it is
+        a lot more expensive than the sizes (pgstattuple or pg_stats subqueries per table)
         """
+        return self.get_queryset().annotate(
+            free=RawSQL(_PG_TABLE_FREE if has_pgstattuple(self.db) else _PG_TABLE_BLOAT, []),
+            index_free=RawSQL(_PG_INDEXES_BLOAT, []),
+        )
 
-        class TableManager(models.Manager):
-            def get_queryset(self):
-                return (
-                    super()
-                    .get_queryset()
-                    .annotate(
-                        size=RawSQL('pg_total_relation_size(pg_class.oid)', []),
-                        # pg_column_size does not seem to be the same...
-                        avg_row_length=RawSQL('NULL', []),
-                        data_length=RawSQL('pg_relation_size(pg_class.oid)', []),
-                        # PG equivalent for this...? any use for it anyway?
-                        max_data_length=RawSQL('NULL', []),
-                        index_length=RawSQL('pg_indexes_size(pg_class.oid)', []),
-                    )
-                    .filter(schema__nspname='public', relkind='r')
-                )
-
-        class PGNameSpace(models.Model):
-            oid = models.IntegerField(primary_key=True)
-            nspname = models.CharField(max_length=255, null=True)
-
-            class Meta:
-                managed = False
-                db_table = 'pg_namespace'
-
-            def __str__(self) -> str:
-                return f'{self.schema}.{self.name}'
-
-        class PGTable(models.Model):
-            objects = TableManager()
-            all_tables = models.Manager()
-
-            name = models.CharField(max_length=64, primary_key=True, db_column='relname')
-            schema = models.ForeignKey(PGNameSpace, db_column='relnamespace', on_delete=models.CASCADE)
-            relkind = models.CharField(max_length=255, null=True)
-
-            rows = models.PositiveBigIntegerField(null=True, db_column='reltuples')
-
-            class Meta:
-                managed = False
-                db_table = 'pg_class'
-
-            def __str__(self) -> str:
-                return f'{self.schema}.{self.name}'
 
-        return PGTable
+class PGNameSpace(models.Model):
+    oid = models.IntegerField(primary_key=True)
+    nspname = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'pg_namespace'
+
+    def __str__(self) -> str:
+        return f'{self.schema}.{self.name}'
+
 
-    class TableManager(models.Manager):
-        def get_queryset(self):
-            return super().get_queryset().none()
+class PGTable(models.Model):
+    """
+    based on https://wiki.postgresql.org/wiki/Disk_Usage
+
+    ```
+        SELECT c.oid,nspname AS table_schema,relname AS table_name
+            , c.reltuples AS row_estimate
+            , pg_total_relation_size(c.oid) AS total_bytes
+            , pg_indexes_size(c.oid) AS index_bytes
+            , pg_total_relation_size(reltoastrelid) AS toast_bytes
+        FROM pg_class c
+        LEFT JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE relkind = 'r' and nspname = 'public';
+    ```
+    """
+
+    objects = PGTableManager()
+    all_tables = models.Manager()
+
+    name = models.CharField(max_length=64, primary_key=True, db_column='relname')
+    schema = models.ForeignKey(PGNameSpace, db_column='relnamespace', on_delete=models.CASCADE)
+    relkind = models.CharField(max_length=255, null=True)
+    relispartition = models.BooleanField(default=False)
+
+    rows = models.PositiveBigIntegerField(null=True, db_column='reltuples')
+
+    class Meta:
+        managed = False
+        db_table = 'pg_class'
 
-    class NoTable(models.Model):
+    def __str__(self) -> str:
+        return f'{self.schema}.{self.name}'
+
+
+_dbstat = {}
+
+
+def has_dbstat(using='default'):
+    """
+    the `dbstat` virtual table (SQLITE_ENABLE_DBSTAT_VTAB) is available on the `using` database (checked once)
+    """
+    if using not in _dbstat:
+        with connections[using].cursor() as cursor:
+            try:
+                cursor.execute('SELECT 1 FROM dbstat LIMIT 1')
+                _dbstat[using] = True
+            except DatabaseError:
+                _dbstat[using] = False
+    return _dbstat[using]
+
+
+# pages (dbstat) of the b-trees of the table (with `tbl_name` as its name, as any of its indexes) or its indexes
+_SQLITE_PAGES = 'SELECT {} FROM dbstat WHERE dbstat.name IN (SELECT i.name FROM sqlite_master i WHERE {})'
+_SQLITE_TABLE = 'i.tbl_name = sqlite_master.name'
+_SQLITE_INDEXES = "i.tbl_name = sqlite_master.name AND i.type = 'index'"
+
+
+class SQLiteTableManager(models.Manager):
+    def get_queryset(self):
+        qs = super().get_queryset().filter(type='table').exclude(name__startswith='sqlite_')
+        if not has_dbstat(self.db):
+            return qs.annotate(
+                **{
+                    k: RawSQL('NULL', [])
+                    for k in ('size', 'rows', 'avg_row_length', 'data_length', 'max_data_length', 'index_length')
+                },
+            )
+        # dbstat reads every page of the table, exact (not estimated) but not cheap for big databases
+        return qs.annotate(
+            size=RawSQL(f'({_SQLITE_PAGES.format("SUM(pgsize)", _SQLITE_TABLE)})', []),
+            # cells of the leaf pages of the table b-tree
+            rows=RawSQL(
+                "(SELECT SUM(ncell) FROM dbstat WHERE dbstat.name = sqlite_master.name AND pagetype = 'leaf')", []
+            ),
+            avg_row_length=RawSQL('NULL', []),
+            data_length=RawSQL('(SELECT SUM(pgsize) FROM dbstat WHERE dbstat.name = sqlite_master.name)', []),
+            max_data_length=RawSQL('NULL', []),
+            # tables without (other than rowid) indexes have no index pages
+            index_length=RawSQL(f'({_SQLITE_PAGES.format("COALESCE(SUM(pgsize), 0)", _SQLITE_INDEXES)})', []),
+        )
+
+    def with_free(self):
         """
-        bogus to allow projects to run with unsupported DB engines
-        (but without any functionality from this app)
+        tables with their unused bytes (`free`, `index_free`), see `PGTableManager.with_free`
         """
+        if not has_dbstat(self.db):
+            return self.get_queryset().annotate(free=RawSQL('NULL', []), index_free=RawSQL('NULL', []))
+        return self.get_queryset().annotate(
+            # unused bytes of the pages (free pages are not per table, see `reclaim.vacuum_sqlite`)
+            free=RawSQL(f'({_SQLITE_PAGES.format("SUM(unused)", _SQLITE_TABLE)})', []),
+            index_free=RawSQL(f'({_SQLITE_PAGES.format("COALESCE(SUM(unused), 0)", _SQLITE_INDEXES)})', []),
+        )
 
-        objects = TableManager()
 
-        name = models.CharField(max_length=64, primary_key=True)
-        rows = models.PositiveBigIntegerField(null=True)
-        size = models.IntegerField(default=0)
+class SQLiteTable(models.Model):
+    objects = SQLiteTableManager()
+    all_tables = models.Manager()
 
-        class Meta:
-            managed = False
+    name = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=16)
+
+    class Meta:
+        managed = False
+        db_table = 'sqlite_master'
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class NoTableManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().none()
+
+    def with_free(self):
+        return self.get_queryset()
+
+
+class NoTable(models.Model):
+    """
+    bogus to allow projects to run with unsupported DB engines
+    (but without any functionality from this app)
+    """
+
+    objects = NoTableManager()
+
+    name = models.CharField(max_length=64, primary_key=True)
+    rows = models.PositiveBigIntegerField(null=True)
+    size = models.IntegerField(default=0)
+
+    class Meta:
+        managed = False
+
+
+def _choose_model():
+    if settings.DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+        return MySQLTable
+
+    if settings.DATABASES['default']['ENGINE'] in (
+        'django.db.backends.postgresql_psycopg2',
+        'django.db.backends.postgresql',
+    ):
+        return PGTable
+
+    if settings.DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        return SQLiteTable
 
     return NoTable
 
@@ -131,3 +304,425 @@ def _choose_model():
 class Table(_choose_model()):
     class Meta:
         proxy = True
+
+
+class MySQLPartitionManager(models.Manager):
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            # non-partitioned tables are listed as well, with a NULL partition name
+            .filter(schema=RawSQL('DATABASE()', []), name__isnull=False)
+            .annotate(size=RawSQL('data_length + index_length', []))
+        )
+
+
+class MySQLPartition(models.Model):
+    objects = MySQLPartitionManager()
+
+    # FIXME: same as MySQLTable, partition_name is only unique within the table
+    name = models.CharField(max_length=64, primary_key=True, db_column='partition_name')
+    table = models.CharField(max_length=64, db_column='table_name')
+    schema = models.CharField(max_length=64, db_column='table_schema')
+    method = models.CharField(max_length=18, null=True, db_column='partition_method')
+    expression = models.TextField(null=True, db_column='partition_expression')
+    description = models.TextField(null=True, db_column='partition_description')
+
+    rows = models.PositiveBigIntegerField(null=True, db_column='table_rows')
+    data_length = models.PositiveBigIntegerField(null=True)
+    index_length = models.PositiveBigIntegerField(null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'information_schema`.`PARTITIONS'
+
+    def __str__(self) -> str:
+        return f'{self.table}.{self.name}'
+
+
+class PGPartitionManager(models.Manager):
+    def get_queryset(self):
+        parent = 'SELECT {} FROM pg_inherits i{} WHERE i.inhrelid = pg_class.oid'
+        return (
+            super()
+            .get_queryset()
+            .annotate(
+                table=RawSQL(f"({parent.format('p.relname', ' JOIN pg_class p ON p.oid = i.inhparent')})", []),
+                method=RawSQL(
+                    "(SELECT CASE pt.partstrat WHEN 'r' THEN 'RANGE' WHEN 'l' THEN 'LIST' WHEN 'h' THEN 'HASH' END"
+                    f" FROM pg_partitioned_table pt WHERE pt.partrelid = ({parent.format('i.inhparent', '')}))",
+                    [],
+                ),
+                # partition key (column or expression) only, without the method
+                expression=RawSQL(
+                    f"substring(({parent.format('pg_get_partkeydef(i.inhparent)', '')}) from '\\((.*)\\)')", []
+                ),
+                description=RawSQL('pg_get_expr(pg_class.relpartbound, pg_class.oid)', []),
+                size=RawSQL('pg_total_relation_size(pg_class.oid)', []),
+                data_length=RawSQL('pg_relation_size(pg_class.oid)', []),
+                index_length=RawSQL('pg_indexes_size(pg_class.oid)', []),
+            )
+            .filter(schema__nspname='public', relispartition=True)
+        )
+
+
+class PGPartition(models.Model):
+    objects = PGPartitionManager()
+
+    name = models.CharField(max_length=64, primary_key=True, db_column='relname')
+    schema = models.ForeignKey(PGNameSpace, db_column='relnamespace', on_delete=models.CASCADE)
+    relkind = models.CharField(max_length=255, null=True)
+    relispartition = models.BooleanField(default=False)
+
+    rows = models.PositiveBigIntegerField(null=True, db_column='reltuples')
+
+    class Meta:
+        managed = False
+        db_table = 'pg_class'
+
+    def __str__(self) -> str:
+        return f'{self.table}.{self.name}'
+
+
+class NoPartition(models.Model):
+    """
+    same as NoTable
+    """
+
+    objects = NoTableManager()
+
+    name = models.CharField(max_length=64, primary_key=True)
+    table = models.CharField(max_length=64)
+    rows = models.PositiveBigIntegerField(null=True)
+    size = models.IntegerField(default=0)
+
+    class Meta:
+        managed = False
+
+
+def _choose_partition_model():
+    if settings.DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+        return MySQLPartition
+
+    if settings.DATABASES['default']['ENGINE'] in (
+        'django.db.backends.postgresql_psycopg2',
+        'django.db.backends.postgresql',
+    ):
+        return PGPartition
+
+    return NoPartition
+
+
+class Partition(_choose_partition_model()):
+    class Meta:
+        proxy = True
+
+
+_mysql_readable = {}
+
+
+def mysql_readable(table, using='default'):
+    """
+    `table` can be read on the `using` database - `mysql.*` and `performance_schema` tables need privileges that
+    application users usually do not have (checked once)
+    """
+    if (using, table) not in _mysql_readable:
+        with connections[using].cursor() as cursor:
+            try:
+                cursor.execute(f'SELECT 1 FROM {table} LIMIT 0')
+                readable = True
+            except DatabaseError:
+                readable = False
+        _mysql_readable[using, table] = readable
+    return _mysql_readable[using, table]
+
+
+class MySQLIndexManager(models.Manager):
+    def get_queryset(self):
+        # sizes and usage are NULL without privileges on their tables
+        sizes = mysql_readable('mysql.innodb_index_stats', self.db)
+        usages = mysql_readable('performance_schema.table_io_waits_summary_by_index_usage', self.db)
+        index = (
+            'WHERE {0}.table_schema = STATISTICS.table_schema AND {0}.table_name = STATISTICS.table_name'
+            ' AND {0}.index_name = STATISTICS.index_name'
+        )
+        usage = (
+            'SELECT {} FROM performance_schema.table_io_waits_summary_by_index_usage u'
+            ' WHERE u.object_schema = STATISTICS.table_schema AND u.object_name = STATISTICS.table_name'
+            ' AND u.index_name = STATISTICS.index_name'
+        )
+        return (
+            super()
+            .get_queryset()
+            # one row per column of each index, the first one stands for the index
+            .filter(schema=RawSQL('DATABASE()', []), seq_in_index=1)
+            .annotate(
+                columns=RawSQL(
+                    '(SELECT GROUP_CONCAT(s.column_name ORDER BY s.seq_in_index SEPARATOR \', \')'
+                    f' FROM information_schema.STATISTICS s {index.format("s")})',
+                    [],
+                ),
+                unique=RawSQL('non_unique = 0', []),
+                # persistent statistics, in pages (of every partition)
+                size=RawSQL(
+                    (
+                        (
+                            '(SELECT SUM(stat_value) * @@innodb_page_size FROM mysql.innodb_index_stats'
+                            " WHERE stat_name = 'size' AND database_name = STATISTICS.table_schema"
+                            ' AND (table_name = STATISTICS.table_name'
+                            " OR table_name LIKE CONCAT(STATISTICS.table_name, '#p#%%'))"
+                            ' AND index_name = STATISTICS.index_name)'
+                        )
+                        if sizes
+                        else 'NULL'
+                    ),
+                    [],
+                ),
+                free=RawSQL('NULL', []),
+                # since the server started (NULL without performance_schema), MySQL does not count scans but rows
+                scans=RawSQL('NULL', []),
+                reads=RawSQL(f'({usage.format("u.count_read")})' if usages else 'NULL', []),
+                # same as sys.schema_unused_indexes
+                unused=RawSQL(f'({usage.format("u.count_star = 0")})' if usages else 'NULL', []),
+            )
+        )
+
+
+class MySQLIndex(models.Model):
+    objects = MySQLIndexManager()
+
+    # FIXME: same as MySQLTable, index_name is only unique within the table
+    name = models.CharField(max_length=64, primary_key=True, db_column='index_name')
+    table = models.CharField(max_length=64, db_column='table_name')
+    schema = models.CharField(max_length=64, db_column='table_schema')
+    seq_in_index = models.PositiveIntegerField()
+    non_unique = models.IntegerField()
+    type = models.CharField(max_length=16, db_column='index_type')
+
+    class Meta:
+        managed = False
+        db_table = 'information_schema`.`STATISTICS'
+
+    def __str__(self) -> str:
+        return f'{self.table}.{self.name}'
+
+
+class PGIndexManager(models.Manager):
+    def get_queryset(self):
+        index = 'SELECT {} FROM pg_index x WHERE x.indexrelid = pg_stat_user_indexes.indexrelid'
+        return (
+            super()
+            .get_queryset()
+            .annotate(
+                columns=RawSQL(
+                    # columns (or expressions) of the definition
+                    "substring(pg_get_indexdef(pg_stat_user_indexes.indexrelid) from '\\((.*)\\)')",
+                    [],
+                ),
+                unique=RawSQL(f'({index.format("x.indisunique")})', []),
+                type=RawSQL(
+                    '(SELECT am.amname FROM pg_class ic JOIN pg_am am ON am.oid = ic.relam'
+                    ' WHERE ic.oid = pg_stat_user_indexes.indexrelid)',
+                    [],
+                ),
+                size=RawSQL('pg_relation_size(pg_stat_user_indexes.indexrelid)', []),
+                free=RawSQL(
+                    f'(SELECT {PG_INDEX_BLOAT} FROM pg_index x'
+                    ' JOIN pg_class ic ON ic.oid = x.indexrelid JOIN pg_class tc ON tc.oid = x.indrelid'
+                    " JOIN pg_am am ON am.oid = ic.relam WHERE x.indexrelid = pg_stat_user_indexes.indexrelid"
+                    " AND am.amname = 'btree')",
+                    [],
+                ),
+                unused=RawSQL('idx_scan = 0', []),
+            )
+            .filter(schema='public')
+        )
+
+
+class PGIndex(models.Model):
+    """
+    indexes and their usage since the statistics were last reset
+    """
+
+    objects = PGIndexManager()
+
+    oid = models.IntegerField(primary_key=True, db_column='indexrelid')
+    name = models.CharField(max_length=64, db_column='indexrelname')
+    table = models.CharField(max_length=64, db_column='relname')
+    schema = models.CharField(max_length=64, db_column='schemaname')
+
+    scans = models.PositiveBigIntegerField(null=True, db_column='idx_scan')
+    reads = models.PositiveBigIntegerField(null=True, db_column='idx_tup_read')
+
+    class Meta:
+        managed = False
+        db_table = 'pg_stat_user_indexes'
+
+    def __str__(self) -> str:
+        return f'{self.table}.{self.name}'
+
+
+class NoIndex(models.Model):
+    """
+    same as NoTable
+    """
+
+    objects = NoTableManager()
+
+    name = models.CharField(max_length=64, primary_key=True)
+    table = models.CharField(max_length=64)
+    size = models.IntegerField(default=0)
+    unique = models.BooleanField(null=True)
+    unused = models.BooleanField(null=True)
+
+    class Meta:
+        managed = False
+
+
+def _choose_index_model():
+    if settings.DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+        return MySQLIndex
+
+    if settings.DATABASES['default']['ENGINE'] in (
+        'django.db.backends.postgresql_psycopg2',
+        'django.db.backends.postgresql',
+    ):
+        return PGIndex
+
+    return NoIndex
+
+
+class Index(_choose_index_model()):
+    class Meta:
+        proxy = True
+
+
+def _vendor_model(using, proxy, mysql, postgresql, other, sqlite=None):
+    model = {'mysql': mysql, 'postgresql': postgresql, 'sqlite': sqlite or other}.get(connections[using].vendor, other)
+    # the proxy (registered in the admin) when the engine is the same as the default database one
+    return proxy if issubclass(proxy, model) else model
+
+
+def table_model(using='default'):
+    """
+    table model matching the engine of database `using`: `Table` is the one of the default database, chosen when
+    this module is imported, this one is chosen per connection (for projects with several databases)
+    """
+    return _vendor_model(using, Table, MySQLTable, PGTable, NoTable, SQLiteTable)
+
+
+def partition_model(using='default'):
+    """
+    same as `table_model`, for partitions
+    """
+    return _vendor_model(using, Partition, MySQLPartition, PGPartition, NoPartition)
+
+
+def index_model(using='default'):
+    """
+    same as `table_model`, for indexes
+    """
+    return _vendor_model(using, Index, MySQLIndex, PGIndex, NoIndex)
+
+
+def row_estimate(table):
+    """
+    rows of `table` (a `Table` row) to store, None if unknown: PostgreSQL (14+) `reltuples` is -1 until the table is
+    vacuumed or analyzed
+    """
+    if table.rows is None or table.rows < 0:
+        return None
+    return int(table.rows)
+
+
+class HistoryProgress(models.Model):
+    """
+    Position reached by a batched history cleanup that did not finish (limits reached or interrupted),
+    so that the next run resumes it (with the same cutoff) instead of starting over.
+    """
+
+    model = models.CharField(max_length=255, unique=True)
+    cutoff = models.DateTimeField()
+    last_pk = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'history progress'
+
+    def __str__(self) -> str:
+        return f'{self.model} (< {self.cutoff}, pk > {self.last_pk})'
+
+
+class CleanupRun(models.Model):
+    """
+    Results of the last (non dry) run of each action, exported by `dbcleanup.metrics`
+    """
+
+    action = models.CharField(max_length=32, unique=True)
+    finished_at = models.DateTimeField(auto_now=True)
+    duration = models.FloatField(default=0)
+    applied = models.PositiveIntegerField(default=0)
+    rows = models.PositiveBigIntegerField(default=0)
+    bytes = models.PositiveBigIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.action} ({self.finished_at})'
+
+
+class CleanupRunItem(models.Model):
+    """
+    What a `CleanupRun` reclaimed: dropped tables, deleted rows per model...
+    """
+
+    run = models.ForeignKey(CleanupRun, on_delete=models.CASCADE, related_name='items')
+    name = models.CharField(max_length=255)
+    rows = models.PositiveBigIntegerField(default=0)
+    bytes = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.run.action}: {self.name}'
+
+
+class TableSnapshot(models.Model):
+    """
+    Size of a table at some point in time (see `dbcleanup.snapshots`), with its growth rate since the
+    previous snapshots (bytes per day, over settings.DBCLEANUP_SNAPSHOT_GROWTH_DAYS)
+    """
+
+    table = models.CharField(max_length=64)
+    taken_at = models.DateTimeField()
+    size = models.PositiveBigIntegerField(default=0)
+    rows = models.PositiveBigIntegerField(null=True)
+    index_length = models.PositiveBigIntegerField(null=True)
+    growth = models.FloatField(null=True, help_text='bytes per day')
+
+    class Meta:
+        indexes = [models.Index(fields=['table', 'taken_at'])]
+        get_latest_by = 'taken_at'
+
+    def __str__(self) -> str:
+        return f'{self.table} ({self.taken_at})'
+
+
+class TableStats(models.Model):
+    """
+    Cached copy of `Table` data (see `dbcleanup.stats`), so the admin does not compute every table size on each load
+    """
+
+    name = models.CharField(max_length=64, primary_key=True)
+    rows = models.PositiveBigIntegerField(null=True)
+    size = models.PositiveBigIntegerField(default=0)
+    avg_row_length = models.PositiveBigIntegerField(null=True, verbose_name='Average row length')
+    data_length = models.PositiveBigIntegerField(null=True)
+    index_length = models.PositiveBigIntegerField(null=True)
+    free = models.PositiveBigIntegerField(null=True, verbose_name='free space')
+    index_free = models.PositiveBigIntegerField(null=True, verbose_name='index free space')
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'table statistics'
+        verbose_name_plural = 'table statistics'
+
+    def __str__(self) -> str:
+        return self.name
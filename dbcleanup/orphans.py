@@ -0,0 +1,131 @@
+from django.db import connections, DatabaseError
+
+# tables per DROP TABLE statement (MySQL and PostgreSQL, SQLite drops one table per statement)
+BATCH_SIZE = 20
+
+
+def _references(using='default'):
+    """
+    all the foreign keys of the database, from the catalog (one query): (table, table it references) pairs
+    """
+    conn = connections[using]
+    if conn.vendor == 'postgresql':
+        sql = (
+            'SELECT c.relname, r.relname FROM pg_constraint k JOIN pg_class c ON c.oid = k.conrelid'
+            ' JOIN pg_class r ON r.oid = k.confrelid JOIN pg_namespace n ON n.oid = c.relnamespace'
+            " WHERE k.contype = 'f' AND n.nspname = 'public'"
+        )
+    elif conn.vendor == 'sqlite':
+        sql = (
+            'SELECT m.name, f."table" FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) f'
+            " WHERE m.type = 'table'"
+        )
+    else:
+        sql = (
+            'SELECT table_name, referenced_table_name FROM information_schema.REFERENTIAL_CONSTRAINTS'
+            ' WHERE constraint_schema = DATABASE()'
+        )
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+def foreign_keys(tables, using='default'):
+    """
+    foreign keys between `tables` (see `_references`): `{table: {tables it references}}`
+    """
+    references = {}
+    for table, referenced in _references(using):
+        # self references do not constrain the order
+        if table in tables and referenced in tables and table != referenced:
+            references.setdefault(table, set()).add(referenced)
+    return references
+
+
+def referenced_from(tables, dropped, using='default'):
+    """
+    foreign keys to `tables` from the ones that are not `dropped` (see `_references`): `{table: {tables referencing
+    it}}` - deleting rows of these tables would cascade to (or be blocked by) tables in use
+    """
+    references = {}
+    for table, referenced in _references(using):
+        if referenced in tables and table not in dropped:
+            references.setdefault(referenced, set()).add(table)
+    return references
+
+
+def drop_batches(tables, references, batch_size=BATCH_SIZE):
+    """
+    `tables` in dependency order (see `foreign_keys`), in batches of up to `batch_size`: a table is dropped before
+    (or with) the tables it references. Tables in a reference cycle are all in the last batch.
+    """
+    remaining = set(tables)
+    batches = []
+    while remaining:
+        referenced = {x for table in remaining for x in references.get(table, ()) if x in remaining}
+        level = sorted(remaining - referenced)
+        if not level:
+            # a cycle: dropping them all at once is all that can be done
+            level = sorted(remaining)
+        batches.extend(level[i : i + batch_size] for i in range(0, len(level), batch_size))
+        remaining.difference_update(level)
+    return batches
+
+
+def drop_tables(tables, using='default'):
+    """
+    DROP `tables` with a single statement or, if it fails (ie: one of them is referenced by a table in use), one by one
+    so that only the failing ones are left
+    :return: `{table: None if dropped, the error otherwise}`
+    """
+    qn = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        try:
+            cursor.execute(f'DROP TABLE {", ".join(qn(x) for x in tables)}')  # nosec - no sqli, not user input
+            return {x: None for x in tables}
+        except DatabaseError as e:
+            if len(tables) == 1:
+                return {tables[0]: str(e)}
+    results = {}
+    for table in tables:
+        results.update(drop_tables([table], using))
+    return results
+
+
+# engines where emptying a table makes dropping it cheaper: SQLite moves its pages to the freelist and PostgreSQL
+# VACUUM truncates its (emptied) files. InnoDB never shrinks the .ibd file on DELETE, DROP TABLE would still unlink it
+# whole: it would only spread the buffer pool purge, for more undo, binlog and replica load
+SHRINK_VENDORS = ('postgresql', 'sqlite')
+
+
+def shrink_table(table, using='default', chunk_size=10000, throttle=None, step=None):
+    """
+    DELETE all the rows of `table`, `chunk_size` at a time (each one committed on its own), before dropping it: a big
+    table is emptied at the `throttle` pace instead of in a single long statement (see `SHRINK_VENDORS`).
+    PostgreSQL tables are then vacuumed, so that their files are truncated before the DROP unlinks them
+    :return: rows deleted
+    """
+    conn = connections[using]
+    qn = conn.ops.quote_name(table)
+    if conn.vendor == 'postgresql':
+        sql = f'DELETE FROM {qn} WHERE ctid = ANY(ARRAY(SELECT ctid FROM {qn} LIMIT {chunk_size}))'
+    elif conn.vendor == 'sqlite':
+        sql = f'DELETE FROM {qn} WHERE rowid IN (SELECT rowid FROM {qn} LIMIT {chunk_size})'
+    else:
+        sql = f'DELETE FROM {qn} LIMIT {chunk_size}'
+    deleted = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(sql)  # nosec - no sqli, not user input
+            rows = max(cursor.rowcount, 0)
+            deleted += rows
+            if step is not None:
+                step.advance(rows)
+            if rows < chunk_size:
+                break
+            if throttle:
+                throttle.wait(rows=rows)
+        if conn.vendor == 'postgresql':
+            # cannot run inside a transaction, the connection is in autocommit mode
+            cursor.execute(f'VACUUM {qn}')
+    return deleted
@@ -0,0 +1,72 @@
+import re
+
+from django.db import connections, router, transaction
+
+from . import models
+
+
+def expired_partitions(model, field_name, cutoff):
+    """
+    Partitions of `model` table (RANGE partitioned on `field_name`) that only hold rows older than `cutoff`,
+    ie: their upper bound is not after it.
+    Supports PostgreSQL declarative partitioning (`RANGE (field)`) and MySQL `RANGE COLUMNS(field)` or
+    `RANGE (f(field))`, where `f` is monotonic (such as TO_DAYS or UNIX_TIMESTAMP).
+    The partition holding the cutoff (and DEFAULT / MAXVALUE ones) are never expired.
+    """
+    column = model._meta.get_field(field_name).column
+    conn = connections[router.db_for_write(model)]
+    cutoff = conn.ops.adapt_datetimefield_value(cutoff)
+
+    expired = []
+    with conn.cursor() as cursor:
+        for partition in (
+            models.partition_model(conn.alias).objects.db_manager(conn.alias).filter(table=model._meta.db_table)
+        ):
+            if partition.method != 'RANGE' and partition.method != 'RANGE COLUMNS':
+                continue
+            description = partition.description or ''
+            if conn.vendor == 'postgresql':
+                upper = re.search(r"\bTO \('([^']*)'\)", description)
+                if partition.expression not in (column, f'"{column}"') or upper is None:
+                    continue
+                cursor.execute('SELECT %s::timestamptz <= %s', [upper.group(1), cutoff])
+            elif conn.vendor == 'mysql':
+                if description == 'MAXVALUE':
+                    continue
+                if partition.method == 'RANGE COLUMNS':
+                    if partition.expression != f'`{column}`':
+                        continue
+                    cursor.execute('SELECT CAST(%s AS DATETIME(6)) <= %s', [description.strip("'"), cutoff])
+                else:
+                    if (partition.expression or '').count(f'`{column}`') != 1:
+                        continue
+                    # nosec - partition description and expression come from information_schema
+                    expression = partition.expression.replace(f'`{column}`', '%s')
+                    cursor.execute(f'SELECT {description} <= {expression}', [cutoff])
+            else:
+                continue
+            if cursor.fetchone()[0]:
+                expired.append(partition)
+    return expired
+
+
+def drop_partition(model, partition, truncate=False):
+    """
+    DROP (or TRUNCATE) a partition of `model` table, a metadata operation instead of deleting its rows
+    :return: number of rows it had, as estimated by the catalog (counting them would read the whole partition)
+    """
+    conn = connections[router.db_for_write(model)]
+    qn = conn.ops.quote_name
+    table = qn(model._meta.db_table)
+    name = qn(partition.name)
+
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            if truncate:
+                cursor.execute(f'TRUNCATE TABLE {name}')
+            else:
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+        else:
+            cursor.execute(f'ALTER TABLE {table} {"TRUNCATE" if truncate else "DROP"} PARTITION {name}')
+    return models.row_estimate(partition) or 0
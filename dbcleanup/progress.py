@@ -0,0 +1,97 @@
+import threading
+import time
+from datetime import timedelta
+
+
+def _duration(seconds):
+    return str(timedelta(seconds=int(seconds)))
+
+
+class ProgressReporter:
+    """
+    Incremental progress of long runs: one line each time an item (history model, tables, migrations...) advances
+    and a final one when it is done, with the elapsed time, the rate and the ETA (if its total is known).
+    `fmt` is `text` (for humans) or `logfmt` (key=value pairs, for log shippers):
+    * `testapp.Note: 2000/5000 rows (40%), 350.0 rows/s, elapsed 0:00:05, ETA 0:00:08`
+    * `event=progress action=history item=testapp.Note unit=rows done=2000 total=5000 rate=350.0 elapsed=5.71 eta=8.57`
+    Nothing is written if it is not `enabled` (ie: low verbosity).
+    """
+
+    def __init__(self, stream, fmt='text', enabled=True):
+        self.stream = stream
+        self.fmt = fmt
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return self.enabled
+
+    def start(self, action, item, total=None, unit='rows'):
+        return Step(self, action, item, total, unit)
+
+    def _format(self, step, event):
+        elapsed = time.monotonic() - step.started
+        rate = step.done / elapsed if elapsed > 0 else None
+        eta = None
+        if rate and step.total is not None and step.total >= step.done and event == 'progress':
+            eta = (step.total - step.done) / rate
+
+        if self.fmt == 'logfmt':
+            line = f'event={event} action={step.action} item={step.item} unit={step.unit} done={step.done}'
+            if step.total is not None:
+                line += f' total={step.total}'
+            if rate is not None:
+                line += f' rate={rate:.1f}'
+            line += f' elapsed={elapsed:.2f}'
+            if eta is not None:
+                line += f' eta={eta:.2f}'
+            return line
+
+        if event == 'done':
+            line = f'{step.item}: done, {step.done} {step.unit} in {_duration(elapsed)}'
+            if rate is not None:
+                line += f' ({rate:.1f} {step.unit}/s)'
+            return line
+        line = f'{step.item}: {step.done}'
+        if step.total:
+            line += f'/{step.total} {step.unit} ({min(step.done * 100 // step.total, 100)}%)'
+        else:
+            line += f' {step.unit}'
+        if rate is not None:
+            line += f', {rate:.1f} {step.unit}/s'
+        line += f', elapsed {_duration(elapsed)}'
+        if eta is not None:
+            line += f', ETA {_duration(eta)}'
+        return line
+
+    def _emit(self, step, event):
+        if not self.enabled:
+            return
+        line = self._format(step, event)
+        # one line at a time, even with concurrent (--jobs) items
+        with self._lock:
+            self.stream.write(f'{line}\n')
+
+
+class Step:
+    """
+    progress of a single item, see `ProgressReporter.start` - it can be advanced by several threads (--jobs)
+    """
+
+    def __init__(self, reporter, action, item, total=None, unit='rows'):
+        self.reporter = reporter
+        self.action = action
+        self.item = item
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, count=1):
+        with self._lock:
+            self.done += count
+            self.reporter._emit(self, 'progress')
+
+    def finish(self):
+        self.reporter._emit(self, 'done')
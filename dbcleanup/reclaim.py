@@ -0,0 +1,120 @@
+from contextlib import nullcontext
+
+from django.db import connections, DatabaseError
+
+from . import models, utils
+
+
+def free_space(using='default', tables=None):
+    """
+    Estimated reclaimable space of the tables of the database (only `tables`, if set): `{table: (size, free bytes)}`,
+    from `models.table_model` (one catalog query) - MySQL: `data_free`, PostgreSQL: bloat estimate (or pgstattuple,
+    if available)
+    """
+    query = models.table_model(using).objects.db_manager(using).with_free()
+    if tables is not None:
+        query = query.filter(name__in=tables)
+    return {name: (int(size or 0), int(free or 0)) for name, size, free in query.values_list('name', 'size', 'free')}
+
+
+def candidates(stats, tables=None, min_free=0, min_ratio=0, max_size=None):
+    """
+    tables worth rebuilding (of `tables`, all if None), with at least `min_free` bytes and `min_ratio` of their size
+    free, most free space first - until their total size reaches `max_size` (if set), as rebuilding costs that much
+    :param stats: see `free_space`
+    :return: list of (table, size, free bytes)
+    """
+    selected = []
+    budget = max_size
+    for table, (size, free) in sorted(stats.items(), key=lambda x: (-x[1][1], x[0])):
+        if tables is not None and table not in tables:
+            continue
+        if free <= 0 or free < min_free or free < min_ratio * size:
+            continue
+        if budget is not None:
+            if size > budget:
+                continue
+            budget -= size
+        selected.append((table, size, free))
+    return selected
+
+
+def reclaim_table(table, using='default'):
+    """
+    rebuild `table` to release its free space: `OPTIMIZE TABLE` (MySQL) or `VACUUM FULL` (PostgreSQL).
+    Both block writes to the table (VACUUM FULL reads as well) while they run.
+    :return: None if done, the error otherwise
+    """
+    conn = connections[using]
+    qn = conn.ops.quote_name
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            try:
+                # VACUUM cannot run inside a transaction, the connection is in autocommit mode
+                cursor.execute(f'VACUUM FULL {qn(table)}')
+            except DatabaseError as e:
+                return str(e)
+            return None
+        cursor.execute(f'OPTIMIZE TABLE {qn(table)}')
+        # errors are result rows (Table, Op, Msg_type, Msg_text), not exceptions
+        for row in cursor.fetchall():
+            if row[2].lower() == 'error':
+                return row[3]
+    return None
+
+
+def reclaim_tables(tables, sizes, using='default', jobs=1, step=None, report=None, throttle=None):
+    """
+    rebuild `tables` (see `reclaim_table`) in up to `jobs` connections concurrently.
+    Each table is reported (`report.item`) with the bytes it reclaimed (its size before, from `sizes`, minus after)
+    or its error, `step` advances and `throttle` (if any) paces each one.
+    :return: `{table: (bytes reclaimed, error)}`
+    """
+    results = {}
+
+    def _reclaim(table):
+        with report.item('reclaim', table, database=using) if report is not None else nullcontext({}) as entry:
+            error = reclaim_table(table, using)
+            # OPTIMIZE TABLE (InnoDB) also ANALYZEs the table, so its cached INFORMATION_SCHEMA size is current
+            size = free_space(using, tables=[table]).get(table, (0, 0))[0]
+            reclaimed = max(sizes.get(table, 0) - size, 0) if error is None else 0
+            entry.update(bytes=reclaimed, applied=error is None)
+            if error is not None:
+                entry['error'] = error
+        results[table] = (reclaimed, error)
+        if step is not None:
+            step.advance()
+        if throttle:
+            throttle.wait()
+
+    utils.run_parallel(tables, using, jobs, _reclaim)
+    return results
+
+
+def vacuum_sqlite(using='default', full=False):
+    """
+    release the free pages of a SQLite database file (ie: after dropping tables) to the filesystem:
+    `PRAGMA incremental_vacuum` if the database was created with auto_vacuum=INCREMENTAL, else `VACUUM` if `full`
+    (rebuilds the whole file, needs as much free disk space and locks the database while it runs)
+    :return: bytes released, None if nothing was run
+    """
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        auto_vacuum = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        page_size = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        before = cursor.fetchone()[0]
+        if auto_vacuum == 2:
+            cursor.execute('PRAGMA incremental_vacuum')
+            # pages are released while the (empty) result rows are read
+            cursor.fetchall()
+        elif full:
+            # cannot run inside a transaction, the connection is in autocommit mode
+            cursor.execute('VACUUM')
+        else:
+            return None
+        cursor.execute('PRAGMA freelist_count')
+        after = cursor.fetchone()[0]
+    return (before - after) * page_size
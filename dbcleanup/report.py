@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+
+class Report:
+    """
+    Structured (JSON lines) report of a run, written to `streams` as it happens - a killed run still leaves
+    every line written up to that point. Events:
+    * `start`: time and options of the run
+    * `item`: one per item considered (table, migrations of an app, history model, analyzed or rebuilt table), its
+      `database` alias, `rows` (and `bytes`) it holds or would reclaim, whether the change was `applied`, `blocked`
+      cascades, `error` and `duration`
+    * `action`: totals of an action (`tables`, `migrations`, `history`, `analyze`, `reclaim`): items considered,
+      rows and bytes reclaimed (applied items only), rows blocked by cascades, errors and `duration`
+    * `end`: `status` and `duration` of the whole run
+    Without streams, nothing is written.
+    """
+
+    def __init__(self, streams=()):
+        self.streams = list(streams)
+        self.started = time.monotonic()
+        # entries and totals, per action
+        self.items = {}
+        self.summaries = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.streams)
+
+    def event(self, event, **data):
+        line = json.dumps({'event': event, **data}, default=str)
+        with self._lock:
+            for stream in self.streams:
+                stream.write(f'{line}\n')
+                stream.flush()
+
+    def start(self, options):
+        self.event('start', time=timezone.now().isoformat(), options=options)
+
+    def end(self, status='ok', error=None):
+        data = {'status': status, 'duration': round(time.monotonic() - self.started, 3)}
+        if error is not None:
+            data['error'] = error
+        self.event('end', **data)
+
+    @contextmanager
+    def item(self, action, name, database=None):
+        """
+        time the processing of `name` (in the `database` alias, if set) and report it, the caller fills in the
+        yielded entry
+        """
+        entry = {'action': action, 'item': name, 'rows': 0, 'applied': False}
+        if database is not None:
+            entry['database'] = database
+        started = time.monotonic()
+        try:
+            yield entry
+        except Exception as e:
+            entry['error'] = str(e)
+            raise
+        finally:
+            entry['duration'] = round(time.monotonic() - started, 3)
+            with self._lock:
+                self.items.setdefault(action, []).append(entry)
+            self.event('item', **entry)
+
+    @contextmanager
+    def action(self, action):
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            items = self.items.get(action, [])
+            applied = [x for x in items if x['applied']]
+            data = {
+                'action': action,
+                'items': len(items),
+                'rows': sum(x['rows'] for x in applied),
+                'bytes': sum(x.get('bytes') or 0 for x in applied),
+                'blocked': sum(sum(x.get('blocked', {}).values()) for x in items),
+                'errors': len([x for x in items if x.get('error')]) + (error is not None),
+                'duration': round(time.monotonic() - started, 3),
+            }
+            if error is not None:
+                data['error'] = error
+            self.summaries[action] = data
+            self.event('action', **data)
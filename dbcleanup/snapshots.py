@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import models
+
+DAY = 86400
+
+
+def take_snapshot(now=None):
+    """
+    record size, rows and index length of every table (one catalog query, one bulk insert), with the growth rate
+    since the latest snapshot at least settings.DBCLEANUP_SNAPSHOT_GROWTH_DAYS old (or the oldest one, if none is)
+    :return: the new snapshots
+    """
+    now = now or timezone.now()
+    window_start = now - timezone.timedelta(days=settings.DBCLEANUP_SNAPSHOT_GROWTH_DAYS)
+
+    # reference snapshot per table: the latest one before the window start, otherwise the oldest one after it
+    # (picked by the database, only one row per table is fetched)
+    snapshot = models.TableSnapshot.objects.filter(table=OuterRef('table'))
+    before = snapshot.filter(taken_at__lte=window_start).order_by('-taken_at').values('pk')[:1]
+    after = snapshot.filter(taken_at__gt=window_start).order_by('taken_at').values('pk')[:1]
+    per_table = (
+        models.TableSnapshot.objects.order_by()
+        .values('table')
+        # grouped by table
+        .annotate(latest=Max('taken_at'), reference=Coalesce(Subquery(before), Subquery(after)))
+        .values('reference')
+    )
+    references = {x.table: x for x in models.TableSnapshot.objects.filter(pk__in=per_table)}
+
+    snapshots = []
+    for table in models.Table.objects.all():
+        snapshot = models.TableSnapshot(
+            table=table.name,
+            taken_at=now,
+            size=table.size or 0,
+            rows=models.row_estimate(table),
+            index_length=getattr(table, 'index_length', None),
+        )
+        reference = references.get(table.name)
+        if reference is not None:
+            elapsed = (now - reference.taken_at).total_seconds()
+            if elapsed > 0:
+                snapshot.growth = (snapshot.size - reference.size) * DAY / elapsed
+        snapshots.append(snapshot)
+    return models.TableSnapshot.objects.bulk_create(snapshots)
+
+
+def downsample(now=None):
+    """
+    thin out old snapshots following settings.DBCLEANUP_SNAPSHOT_DOWNSAMPLE, `(age, interval)` pairs (in days):
+    snapshots older than `age` days are kept one per `interval` days (per table, the first one of each interval).
+    Snapshots older than settings.DBCLEANUP_SNAPSHOT_MAX_DAYS are deleted.
+    :return: number of snapshots deleted
+    """
+    now = now or timezone.now()
+    deleted = 0
+    if settings.DBCLEANUP_SNAPSHOT_MAX_DAYS:
+        deleted += models.TableSnapshot.objects.filter(
+            taken_at__lt=now - timezone.timedelta(days=settings.DBCLEANUP_SNAPSHOT_MAX_DAYS)
+        ).delete()[0]
+
+    for age, interval in settings.DBCLEANUP_SNAPSHOT_DOWNSAMPLE:
+        seen = set()
+        extra = []
+        for pk, table, taken_at in (
+            models.TableSnapshot.objects.filter(taken_at__lt=now - timezone.timedelta(days=age))
+            .order_by('table', 'taken_at')
+            .values_list('pk', 'table', 'taken_at')
+        ):
+            bucket = (table, int(taken_at.timestamp() // (interval * DAY)))
+            if bucket in seen:
+                extra.append(pk)
+            else:
+                seen.add(bucket)
+        # chunks, to stay under the query parameters limit of any engine
+        for i in range(0, len(extra), 500):
+            deleted += models.TableSnapshot.objects.filter(pk__in=extra[i : i + 500]).delete()[0]
+    return deleted
+
+
+def latest_growth():
+    """
+    growth rate (bytes per day) of the latest snapshot of the table, to annotate `models.Table` querysets
+    """
+    return Subquery(
+        models.TableSnapshot.objects.filter(table=OuterRef('name')).order_by('-taken_at').values('growth')[:1]
+    )
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import models
+
+
+def is_stale():
+    """
+    `models.TableStats` is empty or older than settings.DBCLEANUP_TABLE_STATS_TTL seconds
+    """
+    refreshed_at = models.TableStats.objects.aggregate(refreshed_at=Max('refreshed_at'))['refreshed_at']
+    return refreshed_at is None or refreshed_at < timezone.now() - timezone.timedelta(
+        seconds=settings.DBCLEANUP_TABLE_STATS_TTL
+    )
+
+
+def refresh(free=True, stale_only=False):
+    """
+    replace `models.TableStats` with the current `models.Table` data (one catalog query).
+    Free space estimates (`Table.objects.with_free`, scans every table on some engines) are only computed if `free`
+    is set, otherwise the previous ones are kept.
+    If `stale_only` is set, nothing is done if the statistics are fresh (ie: refreshed by a concurrent request)
+    :return: the new statistics, None if not refreshed
+    """
+    with transaction.atomic(using=router.db_for_write(models.TableStats)):
+        # concurrent refreshes wait for this one (and then find the statistics fresh)
+        previous = {
+            name: (table_free, index_free)
+            for name, table_free, index_free in models.TableStats.objects.select_for_update().values_list(
+                'name', 'free', 'index_free'
+            )
+        }
+        if stale_only and not is_stale():
+            return None
+        now = timezone.now()
+        stats = []
+        for table in models.Table.objects.with_free() if free else models.Table.objects.all():
+            table_free, index_free = previous.get(table.name, (None, None))
+            stats.append(
+                models.TableStats(
+                    name=table.name,
+                    rows=models.row_estimate(table),
+                    size=table.size or 0,
+                    avg_row_length=getattr(table, 'avg_row_length', None),
+                    data_length=getattr(table, 'data_length', None),
+                    index_length=getattr(table, 'index_length', None),
+                    free=getattr(table, 'free', None) if free else table_free,
+                    index_free=getattr(table, 'index_free', None) if free else index_free,
+                    refreshed_at=now,
+                )
+            )
+        models.TableStats.objects.all().delete()
+        # the first refresh has no rows to lock
+        models.TableStats.objects.bulk_create(stats, ignore_conflicts=True)
+    return stats
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from django.db import connections, DatabaseError
+
+
+def replica_lag(using):
+    """
+    Replication lag (in seconds) as seen from database `using`:
+    * PostgreSQL: highest `replay_lag` of the standbys in `pg_stat_replication` (to be checked on the primary)
+    * MySQL: `Seconds_Behind_Source` from `SHOW REPLICA STATUS` (to be checked on the replica itself)
+    :return: 0 if not replicating or unsupported engine, infinity if MySQL replication is stopped (no lag reported,
+        the replica is not catching up)
+    """
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute('SELECT EXTRACT(EPOCH FROM MAX(replay_lag)) FROM pg_stat_replication')
+            row = cursor.fetchone()
+            return float(row[0] or 0)
+        if conn.vendor == 'mysql':
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+            except DatabaseError:
+                # before 8.0.22
+                cursor.execute('SHOW SLAVE STATUS')
+            row = cursor.fetchone()
+            if row is None:
+                return 0
+            status = dict(zip([c[0] for c in cursor.description], row))
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            return float('inf') if lag is None else float(lag)
+    return 0
+
+
+class Throttle:
+    """
+    Pacing for deletes and drops, shared by all the models (and --jobs workers):
+    * `rate`: target rows per second (deleted by all workers)
+    * `sleep`: minimum pause (in seconds) after each batch or drop
+    * `max_lag`: pause while replication lag (see `replica_lag`) of any of `databases` is above this many seconds,
+      each pause is reported to `stderr` (if any)
+    """
+
+    # longest pause between replication lag checks
+    MAX_BACKOFF = 60
+
+    def __init__(self, rate=None, sleep=None, max_lag=None, databases=('default',), stderr=None):
+        self.rate = rate
+        self.sleep = sleep
+        self.max_lag = max_lag
+        self.databases = databases
+        self.stderr = stderr
+        self._clock = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.rate or self.sleep or self.max_lag is not None)
+
+    def _lag(self):
+        """
+        :return: (database, lag) of the most lagging of `databases` - an error checking it counts as lagging
+        """
+        lags = []
+        for db in self.databases:
+            try:
+                lags.append((replica_lag(db), db))
+            except DatabaseError as e:
+                self._write(f'Cannot check the replication lag of {db}: {e}\n')
+                lags.append((float('inf'), db))
+        lag, db = max(lags)
+        return db, lag
+
+    def _write(self, msg):
+        if self.stderr is not None:
+            self.stderr.write(msg)
+
+    def wait(self, rows=0, deadline=None):
+        """
+        to be called after each batch (or drop), with the number of rows it affected.
+        It stops waiting for replicas to catch up at `deadline` (a `time.monotonic()` value, if any)
+        :return: False if `deadline` was reached while replicas were lagging, True otherwise
+        """
+        delay = self.sleep or 0
+        if self.rate:
+            with self._lock:
+                now = time.monotonic()
+                # do not let idle time (counting, other actions...) build up more than 1s of credit
+                self._clock = max(self._clock, now - 1) + rows / self.rate
+                delay = max(delay, self._clock - now)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.max_lag is not None:
+            backoff = 1
+            db, lag = self._lag()
+            while lag > self.max_lag:
+                pause = backoff
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        return False
+                    pause = min(pause, left)
+                if lag == float('inf'):
+                    self._write(f'Replication of {db} is stopped, pausing {pause:g}s\n')
+                else:
+                    self._write(f'Replication lag of {db} is {lag:g}s (> {self.max_lag:g}s), pausing {pause:g}s\n')
+                time.sleep(pause)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+                db, lag = self._lag()
+        return True
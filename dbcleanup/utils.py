@@ -1,22 +1,233 @@
-from django.db import models
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, models, router
+from django.db.models.deletion import get_candidate_relations_to_delete
 from django.apps import registry
-from functools import lru_cache
 
 
-@lru_cache()
+class ModelTableIndex:
+    """
+    tables of the (managed, concrete) models of the app registry, including their M2M intermediary tables:
+    * `tables`: table name to model
+    * `app_tables`: app label to table names
+    * `label_tables`: model label to table names
+    """
+
+    def __init__(self, app_models):
+        self.app_models = app_models
+        self.tables = {}
+        self.app_tables = {}
+        self.label_tables = {}
+        for m in app_models:
+            if m._meta.proxy or not m._meta.managed:
+                # skip models not managed by django (and proxies, such as our own Table, listed with their parent)
+                continue
+            tables = [m._meta.db_table]
+            tables.extend(
+                f.m2m_db_table()
+                for f in m._meta.get_fields(include_parents=False)
+                if isinstance(f, models.ManyToManyField)
+            )
+            for table in tables:
+                self.tables[table] = m
+                self.app_tables.setdefault(m._meta.app_label, set()).add(table)
+                self.label_tables.setdefault(m._meta.label, set()).add(table)
+
+
+_model_table_index = None
+
+
+def model_table_index():
+    """
+    `ModelTableIndex` of the current app registry state: it is rebuilt only when the registry changes
+    (`get_models()` is cached by the registry until apps are reloaded)
+    """
+    global _model_table_index
+    app_models = registry.apps.get_models()
+    if _model_table_index is None or _model_table_index.app_models is not app_models:
+        _model_table_index = ModelTableIndex(app_models)
+    return _model_table_index
+
+
 def model_tables():
-    from .models import Table
-
-    tables_in_use = {}
-    for m in registry.apps.get_models():
-        if m == Table:
-            # skip ourselves
-            continue
-        if not m._meta.managed:
-            # skip models not managed by django
-            continue
-        tables_in_use[m._meta.db_table] = m
-        for f in m._meta.get_fields(include_parents=False):
-            if isinstance(f, models.ManyToManyField):
-                tables_in_use[f.m2m_db_table()] = m
-    return tables_in_use
+    """
+    table name to model, see `ModelTableIndex.tables`
+    """
+    return model_table_index().tables
+
+
+def _model_tables_cache_clear():
+    global _model_table_index
+    _model_table_index = None
+
+
+# kept for compatibility, the index already follows the app registry state
+model_tables.cache_clear = _model_tables_cache_clear
+
+
+def count_delete(query):
+    """
+    Count the rows that `query.delete()` would delete, without deleting (or even fetching) any of them.
+    It follows the same cascade graph as django `Collector` (related objects, parent models, M2M intermediary
+    models and generic relations) but every step is a COUNT(*) over subqueries.
+    Rows deleted by pre_delete/post_delete receivers are not (and cannot be) accounted for.
+    Relations that PROTECT/RESTRICT the deletion are counted as well, so they show up as blocked cascades.
+
+    :return: same as `QuerySet.delete()` - total rows and rows per model label
+    """
+    using = query.db
+    # querysets (of pks) already counted per model, to count each row only once (and to stop cycles)
+    seen = {}
+    rows_deleted = {}
+
+    def _add(model, count):
+        if count:
+            rows_deleted[model._meta.label] = rows_deleted.get(model._meta.label, 0) + count
+
+    def _collect(qs, collect_related=True):
+        model = qs.model
+        for prev in seen.get(model, ()):
+            qs = qs.exclude(pk__in=prev)
+        count = qs.count()
+        if not count:
+            return
+        seen.setdefault(model, []).append(qs.values('pk'))
+
+        if collect_related:
+            # parent relations are included by get_candidate_relations_to_delete, not collected with the parents
+            for related in get_candidate_relations_to_delete(model._meta):
+                field = related.field
+                on_delete = field.remote_field.on_delete
+                if on_delete == models.DO_NOTHING:
+                    continue
+                sub_qs = related.related_model._base_manager.using(using).filter(**{f'{field.name}__in': qs})
+                if on_delete == models.CASCADE:
+                    _collect(sub_qs)
+                elif on_delete in (models.PROTECT, getattr(models, 'RESTRICT', models.PROTECT)):
+                    _add(sub_qs.model, sub_qs.count())
+                # any other (SET_NULL, SET_DEFAULT, SET(...)) only updates the related rows
+
+            for field in model._meta.private_fields:
+                if hasattr(field, 'bulk_related_objects'):
+                    # generic relation
+                    from django.contrib.contenttypes.models import ContentType
+
+                    ct = ContentType.objects.db_manager(using).get_for_model(
+                        model, for_concrete_model=field.for_concrete_model
+                    )
+                    _collect(
+                        field.remote_field.model._base_manager.using(using).filter(
+                            **{
+                                field.content_type_field_name: ct,
+                                f'{field.object_id_field_name}__in': qs.values('pk'),
+                            }
+                        )
+                    )
+
+        # same order as Collector: dependent rows first, then the model and then its parents
+        _add(model, count)
+
+        for ptr in model._meta.concrete_model._meta.parents.values():
+            if ptr:
+                _collect(
+                    ptr.remote_field.model._base_manager.using(using).filter(pk__in=qs.values(ptr.attname)),
+                    collect_related=False,
+                )
+
+    _collect(query)
+    return sum(rows_deleted.values()), rows_deleted
+
+
+def has_index(model, field_name):
+    """
+    check (in the database, not in the model definition) if `field_name` column is the first column of any index
+    """
+    field = model._meta.get_field(field_name)
+    table = field.model._meta.db_table
+    conn = connections[router.db_for_read(model)]
+    with conn.cursor() as cursor:
+        constraints = conn.introspection.get_constraints(cursor, table)
+    return any(
+        c['columns'] and c['columns'][0] == field.column and (c['index'] or c['unique'] or c['primary_key'])
+        for c in constraints.values()
+    )
+
+
+def _walk_plan(node, key):
+    """yield every dict (nested in dicts and lists) of an EXPLAIN plan that has `key`"""
+    if isinstance(node, dict):
+        if key in node:
+            yield node
+        for v in node.values():
+            yield from _walk_plan(v, key)
+    elif isinstance(node, list):
+        for v in node:
+            yield from _walk_plan(v, key)
+
+
+def explain(query, field_name):
+    """
+    EXPLAIN `query` (filtered by `field_name`) and summarize its plan
+    :return: dict with the table holding the field, `full_scan` (if that table is fully scanned),
+             estimated `rows` and `cost` (None when the engine does not provide them) and the raw `plan`
+    """
+    table = query.model._meta.get_field(field_name).model._meta.db_table
+    conn = connections[query.db]
+    sql, params = query.query.sql_with_params()
+    summary = {'table': table, 'full_scan': False, 'rows': None, 'cost': None}
+
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            summary['cost'] = plan[0]['Plan']['Total Cost']
+            summary['rows'] = plan[0]['Plan']['Plan Rows']
+            summary['full_scan'] = any(
+                node['Node Type'] == 'Seq Scan' and node.get('Relation Name') == table
+                for node in _walk_plan(plan, 'Node Type')
+            )
+        elif conn.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN FORMAT=JSON {sql}', params)
+            plan = json.loads(cursor.fetchone()[0])
+            summary['cost'] = float(plan['query_block']['cost_info']['query_cost'])
+            for node in _walk_plan(plan, 'table_name'):
+                if node['table_name'] == table:
+                    summary['rows'] = node.get('rows_examined_per_scan')
+                    summary['full_scan'] = node.get('access_type') == 'ALL'
+        elif conn.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            summary['full_scan'] = any(re.match(rf'SCAN (TABLE )?{table}\b', detail) for detail in plan)
+        else:
+            plan = None
+    summary['plan'] = plan
+    return summary
+
+
+def run_parallel(items, using, jobs, fn):
+    """
+    call `fn` with each of `items`, split between up to `jobs` threads, each one with its own connection to the
+    `using` database (closed when done) - or in the calling thread if `jobs` is 1.
+    Errors are raised once every thread is done.
+    """
+    if jobs <= 1:
+        for item in items:
+            fn(item)
+        return
+
+    def _worker(worker_items):
+        try:
+            for item in worker_items:
+                fn(item)
+        finally:
+            connections[using].close()
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_worker, items[i::jobs]) for i in range(jobs)]
+    # once all of them are done, so an error does not cancel the other threads
+    for future in futures:
+        future.result()
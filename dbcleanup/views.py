@@ -0,0 +1,21 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics as _metrics
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint (see `dbcleanup.metrics.render`), for staff users or
+    with `Authorization: Bearer <settings.DBCLEANUP_METRICS_TOKEN>`
+    """
+    token = settings.DBCLEANUP_METRICS_TOKEN
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (
+        (token and hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode()))
+        or (request.user.is_authenticated and request.user.is_staff)
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
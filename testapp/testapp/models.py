@@ -19,3 +19,8 @@ class Bread(Food):
 class FoodMonster(models.Model):
     food = models.ForeignKey(Food, on_delete=models.CASCADE)
     daily_quantity = models.IntegerField(default=1)
+
+
+class Log(models.Model):
+    message = models.CharField(max_length=100)
+    time = models.DateTimeField()
@@ -0,0 +1,11 @@
+from types import SimpleNamespace
+
+
+def fake_tables(**sizes):
+    """
+    `models.Table` rows of the given sizes (other columns derived from them), to replace its manager in tests
+    """
+    return [
+        SimpleNamespace(name=k, size=v, rows=v // 10, data_length=v // 2, index_length=v // 2, free=v // 4)
+        for k, v in sizes.items()
+    ]
@@ -18,3 +18,29 @@ class Test(TestCase):
 
         r = self.client.get(reverse('admin:dbcleanup_table_changelist'))
         self.assertEqual(r.status_code, 200)
+
+    def test_changelist_partition(self):
+        self.user.is_staff = True
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        url = reverse('admin:dbcleanup_partition_changelist')
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        for params in ({'app_label': 'testapp'}, {'label': 'testapp.Log'}):
+            r = self.client.get(url, params)
+            self.assertEqual(r.status_code, 200)
+
+    def test_changelist_index(self):
+        self.user.is_staff = True
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        url = reverse('admin:dbcleanup_index_changelist')
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        for params in ({'unused': '1'}, {'unused': '0'}, {'app_label': 'testapp'}, {'label': 'testapp.Log'}):
+            r = self.client.get(url, params)
+            self.assertEqual(r.status_code, 200)
@@ -2,14 +2,19 @@ import unittest
 from unittest import mock
 from io import StringIO
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db import DatabaseError
+from django.utils import timezone
 from django.apps import registry
 from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.urls import reverse
 from django.conf import settings
 
-from dbcleanup import utils, models, admin
+from dbcleanup import analyze, utils, models, admin
+from dbcleanup.progress import ProgressReporter
+from dbcleanup.report import Report
+from testapp.models import Log
 
 
 @unittest.skipUnless(
@@ -31,3 +36,105 @@ class Test(TestCase):
                 {x.split(' ')[1] for x in out.getvalue().splitlines()} - baseline,
                 {'auth_user', 'auth_user_groups', 'auth_user_user_permissions'},
             )
+
+
+class AnalyzeTest(TestCase):
+    @mock.patch('dbcleanup.analyze.table_stats')
+    def test_fresh_tables(self, table_stats):
+        table_stats.return_value = {
+            # seconds since updated, rows modified, rows
+            'recent': (60, 500, 1000),
+            'quiet': (7200, 10, 1000),
+            'busy': (7200, 500, 1000),
+            'unknown_counters': (7200, None, None),
+        }
+        tables = ['recent', 'quiet', 'busy', 'unknown_counters', 'no_stats']
+        self.assertEqual(analyze.fresh_tables(tables), set())
+        table_stats.assert_not_called()
+        self.assertEqual(analyze.fresh_tables(tables, min_age=3600), {'recent'})
+        self.assertEqual(analyze.fresh_tables(tables, min_change=0.1), {'quiet'})
+        self.assertEqual(analyze.fresh_tables(tables, min_age=3600, min_change=0.1), {'recent', 'quiet'})
+
+    @mock.patch('dbcleanup.utils.connections')
+    @mock.patch('dbcleanup.analyze.connections')
+    def test_analyze_tables(self, connections, worker_connections):
+        # not a Mock call count, it is not thread-safe
+        closed = []
+        worker_connections.__getitem__.return_value.close = lambda: closed.append(1)
+        cursor = connections.__getitem__.return_value.cursor.return_value.__enter__.return_value
+        connections.__getitem__.return_value.ops.quote_name = lambda x: f'`{x}`'
+        connections.__getitem__.return_value.vendor = 'mysql'
+        cursor.fetchall.side_effect = lambda: [
+            ('db.t3', 'analyze', 'Error', 'Table \'db.t3\' doesn\'t exist'),
+            ('db.t3', 'analyze', 'status', 'Operation failed'),
+        ]
+        tables = [f't{i}' for i in range(45)]
+        report = Report()
+        step = ProgressReporter(StringIO()).start('analyze', 'tables', total=45, unit='tables')
+        with mock.patch.object(analyze, 'BATCH_SIZE', 20):
+            analyze.analyze_tables(tables, jobs=2, step=step, report=report)
+
+        statements = sorted(c.args[0] for c in cursor.execute.call_args_list)
+        self.assertEqual(len(statements), 3)
+        self.assertIn(f'ANALYZE TABLE {", ".join(f"`t{i}`" for i in range(20))}', statements)
+        self.assertEqual(step.done, 45)
+        # every worker closed its connection
+        self.assertEqual(len(closed), 2)
+
+        entries = {x['item']: x for x in report.items['analyze']}
+        self.assertEqual(len(entries), 45)
+        self.assertFalse(entries['t3']['applied'])
+        self.assertEqual(entries['t3']['error'], 'Table \'db.t3\' doesn\'t exist')
+        self.assertTrue(entries['t4']['applied'])
+
+    @mock.patch('dbcleanup.analyze.connections')
+    def test_analyze_tables_postgresql(self, connections):
+        conn = connections.__getitem__.return_value
+        conn.vendor = 'postgresql'
+        conn.ops.quote_name = lambda x: f'"{x}"'
+        cursor = conn.cursor.return_value.__enter__.return_value
+
+        def execute(sql):
+            if sql.endswith('"missing"'):
+                raise DatabaseError('relation "missing" does not exist')
+
+        cursor.execute.side_effect = execute
+        report = Report()
+        analyze.analyze_tables(['a', 'missing', 'b'], vacuum=True, report=report)
+        # one per table, errors do not stop the others
+        self.assertEqual(
+            [c.args[0] for c in cursor.execute.call_args_list],
+            ['VACUUM (ANALYZE) "a"', 'VACUUM (ANALYZE) "missing"', 'VACUUM (ANALYZE) "b"'],
+        )
+        entries = {x['item']: x for x in report.items['analyze']}
+        self.assertEqual(entries['missing']['error'], 'relation "missing" does not exist')
+        self.assertTrue(entries['b']['applied'])
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    @mock.patch('dbcleanup.analyze.analyze_tables')
+    def test_after_history(self, analyze_tables):
+        for _ in range(2):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        # not for sqlite
+        call_command('dbcleanup', just='history', force=True, stdout=StringIO())
+        analyze_tables.assert_not_called()
+
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        out = StringIO()
+        with mock.patch('dbcleanup.management.commands.dbcleanup.connections') as connections:
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            call_command(
+                'dbcleanup', just='history', force=True, vacuum=True, verbosity=2, stdout=out, stderr=StringIO()
+            )
+            analyze_tables.assert_called_once_with(['testapp_log'], using='default', vacuum=True)
+            self.assertIn('testapp.Log cleanup vacuumed testapp_log\n', out.getvalue())
+
+            # dry runs do not
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+            call_command('dbcleanup', just='history', stdout=StringIO())
+            self.assertEqual(analyze_tables.call_count, 1)
+
+            with override_settings(DBCLEANUP_ANALYZE_AFTER_HISTORY=False):
+                call_command('dbcleanup', just='history', force=True, stdout=StringIO())
+            self.assertEqual(analyze_tables.call_count, 1)
@@ -0,0 +1,76 @@
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from dbcleanup import models
+from dbcleanup.management.commands.dbcleanup import Command
+from testapp.models import Log
+
+
+class OtherRouter:
+    def db_for_write(self, model, **hints):
+        if model is Log:
+            return 'other'
+
+
+class _Connections(dict):
+    def close_all(self):
+        pass
+
+
+class Test(TestCase):
+    def test_vendor_models(self):
+        # same engine as the default database: the proxies (admin)
+        self.assertIs(models.table_model(), models.Table)
+        self.assertIs(models.partition_model(), models.Partition)
+        self.assertIs(models.index_model(), models.Index)
+
+        connections = {'mysql': SimpleNamespace(vendor='mysql'), 'pg': SimpleNamespace(vendor='postgresql')}
+        with mock.patch('dbcleanup.models.connections', connections):
+            self.assertIn(models.table_model('mysql'), (models.MySQLTable, models.Table))
+            self.assertIn(models.index_model('pg'), (models.PGIndex, models.Index))
+            self.assertTrue(issubclass(models.partition_model('pg'), models.PGPartition))
+
+    def test_options(self):
+        with self.assertRaisesMessage(CommandError, 'unknown is not in settings.DATABASES'):
+            call_command('dbcleanup', just='migrations', database=['unknown'])
+        with mock.patch.dict(settings.DATABASES, other=settings.DATABASES['default']):
+            with self.assertRaisesMessage(CommandError, '--interactive cannot be used with several databases'):
+                call_command('dbcleanup', just='migrations', all_databases=True, interactive=True)
+
+    @mock.patch.dict(settings.DATABASES, other=settings.DATABASES['default'])
+    def test_all_databases(self):
+        def clean_tables(command, options, using='default'):
+            with command.report.item('tables', 'old_table', using) as entry:
+                command.stdout.write(f'- old_table ({using})\n')
+                entry['applied'] = True
+
+        connections = _Connections(default=SimpleNamespace(vendor='oracle'), other=SimpleNamespace(vendor='mysql'))
+        out, err = StringIO(), StringIO()
+        with mock.patch('dbcleanup.management.commands.dbcleanup.connections', connections), mock.patch.object(
+            Command, '_clean_tables', clean_tables
+        ):
+            call_command('dbcleanup', just='tables', all_databases=True, force=True, stdout=out, stderr=err)
+        self.assertEqual(out.getvalue(), 'Database other:\n- old_table (other)\n')
+        self.assertEqual(
+            err.getvalue(), 'tables skipped for database default, this is only for mysql, postgresql and sqlite\n'
+        )
+        self.assertEqual(list(models.CleanupRunItem.objects.values_list('name', flat=True)), ['other.old_table'])
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    def test_history_router(self):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        ct = ContentType.objects.get_for_model(Log)
+        with override_settings(DATABASE_ROUTERS=[OtherRouter()]):
+            self.assertEqual(Command._history_query(ct, id__gt=0).db, 'other')
+            # Log is not in the databases of this run
+            out = StringIO()
+            call_command('dbcleanup', just='history', force=True, stdout=out)
+            self.assertEqual(out.getvalue(), '')
+        self.assertEqual(Log.objects.count(), 1)
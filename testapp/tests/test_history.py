@@ -1,10 +1,18 @@
+import unittest
 from io import StringIO
+from unittest import mock
 from django.utils import timezone
-from django.test import TestCase, override_settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.management import call_command, CommandError
+from django.db import connection
+from django.conf import settings
 
 
-from testapp.models import Note, Bread, FoodMonster
+from dbcleanup import partitions, utils
+from dbcleanup.management.commands.dbcleanup import Budget
+from dbcleanup.models import CleanupRun, HistoryProgress, Partition
+from testapp.models import Note, Bread, FoodMonster, Log
 
 
 class Test(TestCase):
@@ -113,3 +121,394 @@ testapp.Bread cleanup would delete:
         self.assertEqual(Bread.objects.count(), 0)
         # note wasn't deleted, only the M2M entry!
         self.assertEqual(Note.objects.count(), 1)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.note', 365, 'time')])
+    def test_delete_batched(self):
+        for _ in range(5):
+            Note.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        Note.objects.create(message='Keep me', time=timezone.now())
+
+        out = StringIO()
+        err = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('dbcleanup', just='history', force=True, batch_size=2, stdout=out, stderr=err)
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Note cleanup deleted:
+ - testapp.Note: 5
+''',
+        )
+        self.assertEqual(Note.objects.count(), 1)
+        # 3 batches: 2 + 2 + 1
+        delete_sql = f'DELETE FROM {connection.ops.quote_name(Note._meta.db_table)}'
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith(delete_sql)]), 3)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[(('testapp', 'bread'), 10, 'last_eaten')])
+    def test_delete_batched_cascade(self):
+        Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=30))
+        bread = Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=20))
+        FoodMonster.objects.create(food=bread)
+
+        out = StringIO()
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('dbcleanup', just='history', force=True, batch_size=1, stdout=out, stderr=err)
+        self.assertEqual(
+            err.getvalue(),
+            '''\
+testapp.Bread cleanup aborted as it would cascade to:
+ - testapp.FoodMonster: 1
+''',
+        )
+        # checked before the first batch: skipped as a whole
+        self.assertEqual(Bread.objects.count(), 2)
+        self.assertEqual(FoodMonster.objects.count(), 1)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[(('testapp', 'bread'), 10, 'last_eaten')])
+    def test_delete_batched_cascade_added(self):
+        Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=30))
+        bread = Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=20))
+        FoodMonster.objects.create(food=bread)
+
+        out = StringIO()
+        err = StringIO()
+        # cascading row added after the preflight
+        with mock.patch('dbcleanup.utils.count_delete', return_value=(2, {'testapp.Bread': 2})):
+            with self.assertRaises(CommandError):
+                call_command('dbcleanup', just='history', force=True, batch_size=1, stdout=out, stderr=err)
+        self.assertEqual(
+            err.getvalue(),
+            '''\
+testapp.Bread cleanup aborted as it would cascade to:
+ - testapp.FoodMonster: 1
+testapp.Bread cleanup had already deleted 2 rows
+''',
+        )
+        # first batch (bread and its food parent) was committed, the one that cascades was not
+        self.assertEqual(list(Bread.objects.all()), [bread])
+        self.assertEqual(FoodMonster.objects.count(), 1)
+        # not resumed with the cutoff of the aborted run
+        self.assertFalse(HistoryProgress.objects.exists())
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[(('testapp', 'bread'), 10, 'last_eaten')])
+    def test_dry_run_no_dml(self):
+        note = Note.objects.create(message='random', time=timezone.now())
+        bread = Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=20))
+        bread.notes.add(note)
+        FoodMonster.objects.create(food=bread)
+
+        out = StringIO()
+        err = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            with self.assertRaises(CommandError):
+                call_command('dbcleanup', just='history', stdout=out, stderr=err)
+        self.assertEqual(
+            err.getvalue(),
+            '''\
+testapp.Bread cleanup aborted as it would cascade to:
+ - testapp.FoodMonster: 1
+''',
+        )
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')], [])
+
+    def test_count_delete(self):
+        notes = [Note.objects.create(message='random', time=timezone.now()) for _ in range(3)]
+        for i in range(4):
+            bread = Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=i))
+            bread.notes.add(*notes[:i])
+            if i % 2:
+                FoodMonster.objects.create(food=bread)
+
+        qs = Bread.objects.filter(last_eaten__lt=timezone.now() - timezone.timedelta(hours=1))
+        counted = utils.count_delete(qs)
+        deleted, rows_deleted = qs.delete()
+        self.assertEqual(counted, (deleted, {k: v for k, v in rows_deleted.items() if v}))
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time'), ('testapp.note', 365, 'time')])
+    def test_delete_fast(self):
+        for _ in range(5):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+            Note.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        Log.objects.create(message='Keep me', time=timezone.now())
+
+        out = StringIO()
+        err = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('dbcleanup', just='history', force=True, batch_size=2, stdout=out, stderr=err)
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log cleanup deleted:
+ - testapp.Log: 5
+testapp.Note cleanup deleted:
+ - testapp.Note: 5
+''',
+        )
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertEqual(Note.objects.count(), 0)
+        log_table = connection.ops.quote_name(Log._meta.db_table)
+        # 3 batches, none of the Log rows fetched
+        self.assertEqual(
+            len([q for q in ctx.captured_queries if q['sql'].startswith(f'DELETE FROM {log_table}')]),
+            3,
+        )
+        log_message = f'{log_table}.{connection.ops.quote_name("message")}'
+        self.assertFalse([q for q in ctx.captured_queries if log_message in q['sql']])
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.note', 365, 'time')])
+    def test_interactive_single_pass(self):
+        Note.objects.create(message='Too old, delete me', time=timezone.now() - timezone.timedelta(days=390))
+        Note.objects.create(message='Keep me', time=timezone.now())
+        delete_sql = f'DELETE FROM {connection.ops.quote_name(Note._meta.db_table)}'
+
+        out = StringIO()
+        with mock.patch('builtins.input', return_value='n'), CaptureQueriesContext(connection) as ctx:
+            call_command('dbcleanup', just='history', interactive=True, stdout=out)
+        self.assertEqual(out.getvalue(), 'testapp.Note cleanup will delete:\n - testapp.Note: 1\n')
+        self.assertEqual(Note.objects.count(), 2)
+        # preview is only counted
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')], [])
+
+        out = StringIO()
+        with mock.patch('builtins.input', return_value='y'), CaptureQueriesContext(connection) as ctx:
+            call_command('dbcleanup', just='history', interactive=True, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Note cleanup will delete:
+ - testapp.Note: 1
+testapp.Note cleanup deleted:
+ - testapp.Note: 1
+''',
+        )
+        self.assertEqual(Note.objects.count(), 1)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith(delete_sql)]), 1)
+
+    def test_jobs_interactive(self):
+        with self.assertRaisesMessage(CommandError, '--interactive cannot be used with --jobs'):
+            call_command('dbcleanup', just='history', interactive=True, jobs=2)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time'), ('testapp.note', 365, 'time')])
+    def test_partitions(self):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        Note.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        # not partitioned (or unsupported engine): regular delete
+        out, err = StringIO(), StringIO()
+        call_command('dbcleanup', just='history', force=True, partitions='drop', stdout=out, stderr=err)
+        # Note has cascades
+        self.assertEqual(
+            err.getvalue(),
+            'testapp.Note partitions are not dropped as it has cascades or delete signals,'
+            ' its rows are deleted instead\n',
+        )
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log cleanup deleted:
+ - testapp.Log: 1
+testapp.Note cleanup deleted:
+ - testapp.Note: 1
+''',
+        )
+
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        Note.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        expired = [Partition(name='p2020'), Partition(name='p2021')]
+        with mock.patch('dbcleanup.partitions.expired_partitions', return_value=expired) as expired_mock:
+            out = StringIO()
+            call_command('dbcleanup', just='history', partitions='truncate', stdout=out, stderr=StringIO())
+            self.assertEqual(
+                out.getvalue(),
+                '''\
+testapp.Log cleanup would truncate partition p2020
+testapp.Log cleanup would truncate partition p2021
+testapp.Log cleanup would delete:
+ - testapp.Log: 1
+testapp.Note cleanup would delete:
+ - testapp.Note: 1
+''',
+            )
+
+            with mock.patch('dbcleanup.partitions.drop_partition', return_value=3) as drop_mock:
+                out = StringIO()
+                call_command('dbcleanup', just='history', force=True, partitions='drop', stdout=out, stderr=StringIO())
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log cleanup dropped partition p2020 (3 rows, estimated)
+testapp.Log cleanup dropped partition p2021 (3 rows, estimated)
+testapp.Log cleanup deleted:
+ - testapp.Log: 7
+testapp.Note cleanup deleted:
+ - testapp.Note: 1
+''',
+        )
+        # only fast models are candidates
+        self.assertEqual([c.args[0] for c in expired_mock.call_args_list], [Log, Log])
+        self.assertEqual([c.args[1] for c in drop_mock.call_args_list], expired)
+        self.assertEqual([c.kwargs for c in drop_mock.call_args_list], [{'truncate': False}] * 2)
+
+    @mock.patch('dbcleanup.partitions.transaction')
+    @mock.patch('dbcleanup.partitions.connections')
+    def test_drop_partition(self, connections, transaction):
+        conn = connections.__getitem__.return_value
+        conn.vendor = 'mysql'
+        conn.ops.quote_name = lambda x: f'`{x}`'
+        cursor = conn.cursor.return_value.__enter__.return_value
+        # the catalog estimate, rows are not counted (full scan of the partition)
+        self.assertEqual(partitions.drop_partition(Log, Partition(name='p2020', rows=42)), 42)
+        cursor.execute.assert_called_once_with('ALTER TABLE `testapp_log` DROP PARTITION `p2020`')
+
+    def test_partitions_interactive(self):
+        with self.assertRaisesMessage(CommandError, '--interactive cannot be used with --partitions'):
+            call_command('dbcleanup', just='history', interactive=True, partitions='drop')
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time'), ('testapp.note', 365, 'time')])
+    def test_limits_resume(self):
+        logs = [
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390)) for _ in range(5)
+        ]
+        Note.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        out = StringIO()
+        call_command('dbcleanup', just='history', force=True, batch_size=2, max_rows=3, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log cleanup deleted:
+ - testapp.Log: 3
+testapp.Log cleanup stopped as run limits were reached, next run will resume it
+testapp.Note cleanup stopped as run limits were reached, next run will resume it
+''',
+        )
+        self.assertEqual(list(Log.objects.all()), logs[3:])
+        progress = HistoryProgress.objects.get()
+        self.assertEqual(progress.model, 'testapp.Log')
+        self.assertEqual(progress.last_pk, str(logs[2].pk))
+        # Note was not started
+        run = CleanupRun.objects.get(action='history')
+        self.assertEqual(run.applied, 1)
+        self.assertEqual(list(run.items.values_list('name', 'rows')), [('testapp.Log', 3)])
+
+        out = StringIO()
+        call_command('dbcleanup', just='history', force=True, batch_size=2, verbosity=2, stdout=out, stderr=StringIO())
+        self.assertEqual(
+            out.getvalue(),
+            f'''\
+testapp.Log cleanup resumed after pk {logs[2].pk} (older than {progress.cutoff})
+testapp.Log cleanup deleted:
+ - testapp.Log: 2
+testapp.Note cleanup deleted:
+ - testapp.Note: 1
+''',
+        )
+        self.assertEqual(Log.objects.count(), 0)
+        self.assertEqual(Note.objects.count(), 0)
+        self.assertFalse(HistoryProgress.objects.exists())
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    def test_limits_duration(self):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        out = StringIO()
+        call_command('dbcleanup', just='history', force=True, batch_size=2, max_duration=0, stdout=out)
+        self.assertEqual(
+            out.getvalue(), 'testapp.Log cleanup stopped as run limits were reached, next run will resume it\n'
+        )
+        self.assertEqual(Log.objects.count(), 1)
+
+        with self.assertRaisesMessage(CommandError, '--max-duration and --max-rows require --batch-size'):
+            call_command('dbcleanup', just='history', force=True, max_duration=10)
+
+    def test_budget(self):
+        budget = Budget(max_rows=5)
+        # rows are reserved, concurrent workers cannot go over max_rows together
+        self.assertEqual(budget.reserve(3), 3)
+        self.assertEqual(budget.reserve(3), 2)
+        self.assertEqual(budget.reserve(3), 0)
+        # unused rows are given back, cascades are accounted for
+        budget.spend(1, reserved=3)
+        self.assertEqual(budget.reserve(3), 2)
+        budget.spend(4, reserved=2)
+        self.assertEqual(budget.reserve(3), 0)
+        self.assertEqual(Budget().reserve(3), 3)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    def test_explain(self):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        out = StringIO()
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('dbcleanup', just='history', explain=True, force=True, stdout=out, stderr=err)
+        # nothing deleted
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertTrue(out.getvalue().startswith('testapp.Log: '))
+        self.assertIn(' on testapp_log', out.getvalue())
+        self.assertEqual(
+            err.getvalue(), 'testapp.Log has no index on testapp_log.time - every cleanup will scan the whole table\n'
+        )
+
+    def test_explain_utils(self):
+        self.assertFalse(utils.has_index(Log, 'time'))
+        self.assertTrue(utils.has_index(Log, 'id'))
+        # field in parent model table
+        self.assertFalse(utils.has_index(Bread, 'last_eaten'))
+
+        summary = utils.explain(Log.objects.filter(time__lt=timezone.now()), 'time')
+        self.assertEqual(summary['table'], 'testapp_log')
+        self.assertTrue(summary['full_scan'])
+        if connection.vendor == 'sqlite':
+            # other engines might still prefer a full scan for such a small table
+            summary = utils.explain(Log.objects.filter(id__lt=10), 'id')
+            self.assertFalse(summary['full_scan'])
+        summary = utils.explain(Bread.objects.filter(last_eaten__lt=timezone.now()), 'last_eaten')
+        self.assertEqual(summary['table'], 'testapp_food')
+
+
+@unittest.skipUnless(
+    settings.DATABASES['default']['ENGINE'] in ('django.db.backends.mysql', 'django.db.backends.postgresql_psycopg2'),
+    "sqlite locks tables for concurrent connections",
+)
+class ParallelTest(TransactionTestCase):
+    # workers use their own connections, so test data must be committed
+    @override_settings(
+        DBCLEANUP_HISTORY_MODELS=[
+            ('testapp.log', 365, 'time'),
+            (('testapp', 'bread'), 10, 'last_eaten'),
+            ('testapp.note', 365, 'time'),
+        ]
+    )
+    def test_jobs(self):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        Note.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        bread = Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=20))
+        FoodMonster.objects.create(food=bread)
+
+        out = StringIO()
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('dbcleanup', just='history', force=True, jobs=3, stdout=out, stderr=err)
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log cleanup deleted:
+ - testapp.Log: 1
+testapp.Note cleanup deleted:
+ - testapp.Note: 1
+''',
+        )
+        self.assertEqual(
+            err.getvalue(),
+            '''\
+testapp.Bread cleanup aborted as it would cascade to:
+ - testapp.FoodMonster: 1
+''',
+        )
+        self.assertEqual(Log.objects.count(), 0)
+        self.assertEqual(Note.objects.count(), 0)
+        self.assertEqual(Bread.objects.count(), 1)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+
+from dbcleanup import metrics, models, utils
+from testapp.models import Log
+
+
+class Test(TestCase):
+    def setUp(self):
+        utils.model_tables.cache_clear()
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_tables(self, objects):
+        objects.all.return_value = [
+            SimpleNamespace(name='testapp_log', size=100, rows=2, data_length=60, index_length=40),
+            SimpleNamespace(name='old"table', size=10, rows=None),
+        ]
+        # free space comes from the cached statistics
+        models.TableStats.objects.create(name='testapp_log', size=90, free=25, refreshed_at=timezone.now())
+        with self.assertNumQueries(2):
+            output = metrics.render()
+        objects.all.assert_called_once_with()
+        self.assertIn('# TYPE dbcleanup_table_size_bytes gauge\n', output)
+        self.assertIn('dbcleanup_table_size_bytes{table="testapp_log",app="testapp",model="testapp.Log"} 100\n', output)
+        self.assertIn('dbcleanup_table_rows{table="testapp_log",app="testapp",model="testapp.Log"} 2\n', output)
+        self.assertIn('dbcleanup_table_index_bytes{table="testapp_log",app="testapp",model="testapp.Log"} 40\n', output)
+        self.assertIn('dbcleanup_table_free_bytes{table="testapp_log",app="testapp",model="testapp.Log"} 25\n', output)
+        self.assertIn('dbcleanup_table_size_bytes{table="old\\"table",app="",model=""} 10\n', output)
+        # unknown values are skipped
+        self.assertNotIn('dbcleanup_table_rows{table="old', output)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    def test_last_run(self):
+        for _ in range(3):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        # dry runs are not recorded
+        call_command('dbcleanup', just='history', stdout=StringIO())
+        self.assertFalse(models.CleanupRun.objects.exists())
+
+        call_command('dbcleanup', just='history', force=True, stdout=StringIO())
+        run = models.CleanupRun.objects.get()
+        self.assertEqual((run.action, run.applied, run.rows, run.errors), ('history', 1, 3, 0))
+
+        output = metrics.render()
+        self.assertIn('dbcleanup_last_run_rows{action="history"} 3\n', output)
+        self.assertIn('dbcleanup_last_run_deleted_rows{model="testapp.Log"} 3\n', output)
+        self.assertIn(
+            f'dbcleanup_last_run_timestamp_seconds{{action="history"}} {run.finished_at.timestamp()}\n', output
+        )
+
+        # replaced by the next run
+        call_command('dbcleanup', just='history', force=True, stdout=StringIO())
+        self.assertEqual(models.CleanupRun.objects.get().rows, 0)
+        self.assertNotIn('dbcleanup_last_run_deleted_rows{', metrics.render())
+
+    @override_settings(DBCLEANUP_METRICS_TOKEN='s3cr3t')
+    def test_view(self):
+        url = reverse('dbcleanup:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        # compare_digest raises TypeError on non-ASCII str
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer sécrét').status_code, 403)
+
+        r = self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cr3t')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE dbcleanup_table_size_bytes gauge', r.content)
+
+        user = get_user_model().objects.create_user('tester', 'tester@test.it', 'tester')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('dbcleanup_metrics', stdout=out)
+        self.assertEqual(out.getvalue(), metrics.render())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dbcleanup.prom')
+            call_command('dbcleanup_metrics', path)
+            with open(path) as f:
+                self.assertEqual(f.read(), metrics.render())
+            # no leftovers
+            self.assertEqual(os.listdir(tmp), ['dbcleanup.prom'])
@@ -1,6 +1,9 @@
 from io import StringIO
+from unittest import mock
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.management import call_command
 from django.db.migrations.recorder import MigrationRecorder
 
@@ -30,3 +33,44 @@ class Test(TestCase):
             self.fail('migration should have been deleted')
         except MigrationRecorder.Migration.DoesNotExist:
             pass
+
+    def test_bulk_delete(self):
+        for app in ('old_app_1', 'old_app_2'):
+            for i in range(3):
+                MigrationRecorder.Migration.objects.create(app=app, name=f'000{i + 1}_auto')
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('dbcleanup', stdout=out, just='migrations', force=True, verbosity=2, stderr=StringIO())
+        self.assertEqual(
+            len(
+                [
+                    x
+                    for x in queries.captured_queries
+                    if x['sql'].startswith('DELETE') and 'django_migrations' in x['sql']
+                ]
+            ),
+            1,
+            'one query for all apps',
+        )
+        lines = out.getvalue().splitlines()
+        self.assertIn('- old_app_1 (3)', lines)
+        self.assertIn('Dropped 3 migrations of old_app_2', lines)
+        self.assertIn('Dropped Migration 0002_auto for old_app_1', lines)
+        self.assertFalse(MigrationRecorder.Migration.objects.filter(app__startswith='old_app_').exists())
+
+        # per migration at higher verbosity only
+        MigrationRecorder.Migration.objects.create(app='old_app_1', name='0001_auto')
+        out = StringIO()
+        call_command('dbcleanup', stdout=out, just='migrations', force=True)
+        self.assertIn('Dropped 1 migrations of old_app_1', out.getvalue())
+        self.assertNotIn('Dropped Migration', out.getvalue())
+
+    @mock.patch('dbcleanup.management.commands.dbcleanup.MigrationRecorder')
+    def test_delete_error(self, recorder):
+        MigrationRecorder.Migration.objects.create(app='old_app_1', name='0001_auto')
+        recorder.return_value.migration_qs.filter.return_value.delete.side_effect = RuntimeError('boom')
+        err = StringIO()
+        with self.assertRaisesMessage(RuntimeError, 'boom'):
+            call_command('dbcleanup', stdout=StringIO(), stderr=err, just='migrations', force=True, verbosity=2)
+        # the progress line is closed
+        self.assertIn('migrations: done, 0 migrations', err.getvalue())
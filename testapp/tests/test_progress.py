@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+
+from dbcleanup.progress import ProgressReporter
+from testapp.models import Log
+
+
+class Test(TestCase):
+    @mock.patch('dbcleanup.progress.time.monotonic', side_effect=[100, 105, 110, 120])
+    def test_text(self, monotonic):
+        out = StringIO()
+        step = ProgressReporter(out).start('history', 'testapp.Log', total=4000)
+        step.advance(1000)
+        step.advance(1000)
+        step.finish()
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log: 1000/4000 rows (25%), 200.0 rows/s, elapsed 0:00:05, ETA 0:00:15
+testapp.Log: 2000/4000 rows (50%), 200.0 rows/s, elapsed 0:00:10, ETA 0:00:10
+testapp.Log: done, 2000 rows in 0:00:20 (100.0 rows/s)
+''',
+        )
+
+    @mock.patch('dbcleanup.progress.time.monotonic', side_effect=[100, 105, 110])
+    def test_logfmt(self, monotonic):
+        out = StringIO()
+        step = ProgressReporter(out, fmt='logfmt').start('tables', 'tables', unit='tables')
+        step.advance()
+        step.finish()
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+event=progress action=tables item=tables unit=tables done=1 rate=0.2 elapsed=5.00
+event=done action=tables item=tables unit=tables done=1 rate=0.1 elapsed=10.00
+''',
+        )
+
+    def test_threads(self):
+        out = StringIO()
+        step = ProgressReporter(out, fmt='logfmt').start('analyze', 'tables', unit='tables')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: step.advance(), range(100)))
+        self.assertEqual(step.done, 100)
+        # one (whole) line per advance, each with its own count
+        done = sorted(int(line.split(' done=')[1].split(' ')[0]) for line in out.getvalue().splitlines())
+        self.assertEqual(done, list(range(1, 101)))
+
+    def test_disabled(self):
+        out = StringIO()
+        reporter = ProgressReporter(out, enabled=False)
+        self.assertFalse(reporter)
+        step = reporter.start('history', 'testapp.Log', total=10)
+        step.advance(5)
+        step.finish()
+        self.assertEqual(out.getvalue(), '')
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    def test_command(self):
+        for _ in range(5):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        err = StringIO()
+        call_command('dbcleanup', just='history', force=True, batch_size=2, stdout=StringIO(), stderr=err)
+        # not with default verbosity
+        self.assertEqual(err.getvalue(), '')
+
+        for _ in range(5):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        err = StringIO()
+        call_command(
+            'dbcleanup',
+            just='history',
+            force=True,
+            batch_size=2,
+            verbosity=2,
+            progress_format='logfmt',
+            stdout=StringIO(),
+            stderr=err,
+        )
+        lines = [dict(x.split('=') for x in line.split()) for line in err.getvalue().splitlines()]
+        self.assertEqual([x['event'] for x in lines], ['progress'] * 3 + ['done'])
+        self.assertEqual([x['done'] for x in lines], ['2', '4', '5', '5'])
+        self.assertEqual({x['item'] for x in lines}, {'testapp.Log'})
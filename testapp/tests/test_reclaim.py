@@ -0,0 +1,172 @@
+import json
+from unittest import mock
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.core.management import call_command, CommandError
+from django.conf import settings
+
+from dbcleanup import reclaim
+from dbcleanup.management.commands.dbcleanup import Command
+from dbcleanup.progress import ProgressReporter
+from dbcleanup.report import Report
+from testapp.models import Log
+
+MB = 1024 * 1024
+
+
+class Test(TestCase):
+    def test_candidates(self):
+        stats = {
+            # size, free
+            'big': (1000 * MB, 300 * MB),
+            'small': (10 * MB, 5 * MB),
+            'sparse': (100 * MB, 90 * MB),
+            'dense': (1000 * MB, 100 * MB),
+            'none': (1 * MB, 0),
+        }
+        self.assertEqual(
+            [x[0] for x in reclaim.candidates(stats)], ['big', 'dense', 'sparse', 'small'], 'most free space first'
+        )
+        self.assertEqual(
+            [x[0] for x in reclaim.candidates(stats, min_free=64 * MB, min_ratio=0.2)], ['big', 'sparse'], 'thresholds'
+        )
+        self.assertEqual([x[0] for x in reclaim.candidates(stats, tables={'small', 'dense'})], ['dense', 'small'])
+        self.assertEqual(
+            reclaim.candidates(stats, min_ratio=0.2, max_size=200 * MB),
+            [('sparse', 100 * MB, 90 * MB), ('small', 10 * MB, 5 * MB)],
+            'tables over the size budget are skipped',
+        )
+
+    def test_free_space(self):
+        # the real table model of the database engine
+        self.assertIn('testapp_log', reclaim.free_space())
+        self.assertEqual(list(reclaim.free_space(tables=['testapp_log'])), ['testapp_log'])
+
+    @mock.patch('dbcleanup.utils.connections')
+    @mock.patch('dbcleanup.reclaim.free_space')
+    @mock.patch('dbcleanup.reclaim.connections')
+    def test_reclaim_tables(self, connections, free_space, worker_connections):
+        # not a Mock call count, it is not thread-safe
+        closed = []
+        worker_connections.__getitem__.return_value.close = lambda: closed.append(1)
+        conn = connections.__getitem__.return_value
+        conn.vendor = 'mysql'
+        conn.ops.quote_name = lambda x: f'`{x}`'
+        cursor = conn.cursor.return_value.__enter__.return_value
+        statements = []
+
+        def execute(sql):
+            statements.append(sql)
+            cursor.fetchall.return_value = (
+                [('db.t1', 'optimize', 'Error', 'Table \'db.t1\' doesn\'t exist')]
+                if sql.endswith('`t1`')
+                else [('db.t0', 'optimize', 'status', 'OK')]
+            )
+
+        cursor.execute.side_effect = execute
+        free_space.return_value = {'t0': (60, 0), 't1': (100, 50), 't2': (30, 0)}
+        report = Report()
+        step = ProgressReporter(StringIO()).start('reclaim', 'tables', total=3, unit='tables')
+        results = reclaim.reclaim_tables(
+            ['t0', 't1', 't2'], {'t0': 100, 't1': 100, 't2': 100}, jobs=2, step=step, report=report
+        )
+
+        self.assertEqual(sorted(statements), ['OPTIMIZE TABLE `t0`', 'OPTIMIZE TABLE `t1`', 'OPTIMIZE TABLE `t2`'])
+        self.assertEqual(results, {'t0': (40, None), 't1': (0, 'Table \'db.t1\' doesn\'t exist'), 't2': (70, None)})
+        self.assertEqual(step.done, 3)
+        # only the rebuilt table is read again
+        self.assertEqual(sorted(x.kwargs['tables'] for x in free_space.call_args_list), [['t0'], ['t1'], ['t2']])
+        # every worker closed its connection
+        self.assertEqual(len(closed), 2)
+        entries = {x['item']: x for x in report.items['reclaim']}
+        self.assertEqual(entries['t0']['bytes'], 40)
+        self.assertTrue(entries['t0']['applied'])
+        self.assertFalse(entries['t1']['applied'])
+
+    @mock.patch('dbcleanup.reclaim.connections')
+    def test_reclaim_table_postgresql(self, connections):
+        conn = connections.__getitem__.return_value
+        conn.vendor = 'postgresql'
+        conn.ops.quote_name = lambda x: f'"{x}"'
+        cursor = conn.cursor.return_value.__enter__.return_value
+        self.assertIsNone(reclaim.reclaim_table('t'))
+        cursor.execute.assert_called_once_with('VACUUM FULL "t"')
+
+    def test_sqlite(self):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            self.skipTest('only sqlite')
+        with self.assertRaisesMessage(CommandError, 'this is only for mysql and postgresql'):
+            call_command('dbcleanup', just='reclaim', stdout=StringIO())
+
+    @mock.patch('dbcleanup.reclaim.connections')
+    def test_vacuum_sqlite(self, connections):
+        cursor = connections.__getitem__.return_value.cursor.return_value.__enter__.return_value
+        # auto_vacuum, page_size, freelist_count before and after
+        cursor.fetchone.side_effect = [(2,), (4096,), (10,), (0,)]
+        self.assertEqual(reclaim.vacuum_sqlite(), 10 * 4096)
+        self.assertIn(mock.call('PRAGMA incremental_vacuum'), cursor.execute.call_args_list)
+
+        cursor.reset_mock()
+        cursor.fetchone.side_effect = [(0,), (4096,), (10,), (2,)]
+        self.assertIsNone(reclaim.vacuum_sqlite(), 'auto_vacuum=NONE, needs a full VACUUM')
+        cursor.fetchone.side_effect = [(0,), (4096,), (10,), (2,)]
+        self.assertEqual(reclaim.vacuum_sqlite(full=True), 8 * 4096)
+        cursor.execute.assert_any_call('VACUUM')
+
+    def test_opt(self):
+        command = Command()
+        # not part of a full run
+        self.assertFalse(command._opt('reclaim', {'just': None}))
+        self.assertTrue(command._opt('analyze', {'just': None}))
+        self.assertTrue(command._opt('reclaim', {'just': ['reclaim']}))
+
+
+@override_settings(
+    DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')],
+    DBCLEANUP_RECLAIM_MIN_FREE=10 * MB,
+    DBCLEANUP_RECLAIM_MIN_RATIO=0.2,
+)
+@mock.patch.dict(Command.vendors, reclaim=('mysql', 'postgresql', 'sqlite'))
+@mock.patch('dbcleanup.reclaim.reclaim_table', return_value=None)
+@mock.patch('dbcleanup.reclaim.free_space')
+class CommandTest(TestCase):
+    def test_dry_run(self, free_space, reclaim_table):
+        free_space.return_value = {'testapp_log': (100 * MB, 50 * MB), 'testapp_note': (100 * MB, 1 * MB)}
+        out = StringIO()
+        call_command('dbcleanup', just='reclaim', stdout=out)
+        self.assertEqual(out.getvalue(), f'- testapp_log ({50 * MB} of {100 * MB} bytes free)\n')
+        reclaim_table.assert_not_called()
+
+    def test_force(self, free_space, reclaim_table):
+        free_space.side_effect = [
+            {'testapp_log': (100 * MB, 50 * MB), 'testapp_food': (300 * MB, 200 * MB)},
+            {'testapp_log': (40 * MB, 0), 'testapp_food': (300 * MB, 200 * MB)},
+        ]
+        out = StringIO()
+        call_command('dbcleanup', just='reclaim', force=True, reclaim_max_size=200 * MB, stdout=out)
+        # testapp_food is over the size budget
+        self.assertEqual(
+            out.getvalue(),
+            f'- testapp_log ({50 * MB} of {100 * MB} bytes free)\nReclaimed {60 * MB} bytes from testapp_log\n',
+        )
+        reclaim_table.assert_called_once_with('testapp_log', 'default')
+        free_space.assert_called_with('default', tables=['testapp_log'])
+
+    def test_after_history(self, free_space, reclaim_table):
+        free_space.return_value = {'testapp_log': (100 * MB, 50 * MB), 'testapp_food': (300 * MB, 200 * MB)}
+        out = StringIO()
+        # nothing deleted, nothing to reclaim
+        call_command('dbcleanup', just=['history', 'reclaim'], force=True, stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        out = StringIO()
+        call_command('dbcleanup', just=['history', 'reclaim'], force=True, format='json', stdout=out)
+        items = [json.loads(x) for x in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(x['item'], x['applied']) for x in items if x.get('action') == 'reclaim' and x['event'] == 'item'],
+            [('testapp_log', True)],
+        )
+        reclaim_table.assert_called_once_with('testapp_log', 'default')
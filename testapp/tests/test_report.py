@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.core.management import call_command, CommandError
+from django.db.migrations.recorder import MigrationRecorder
+
+from dbcleanup.report import Report
+from testapp.models import Bread, FoodMonster, Log
+
+
+def _events(output):
+    return [json.loads(line) for line in output.splitlines()]
+
+
+class Test(TestCase):
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time'), ('testapp.bread', 10, 'last_eaten')])
+    def test_history(self):
+        for _ in range(3):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        bread = Bread.objects.create(last_eaten=timezone.now() - timezone.timedelta(days=20))
+        FoodMonster.objects.create(food=bread)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('dbcleanup', just='history', force=True, format='json', stdout=out, stderr=StringIO())
+        events = _events(out.getvalue())
+        self.assertEqual([x['event'] for x in events], ['start', 'item', 'item', 'action', 'end'])
+        self.assertTrue(events[0]['options']['force'])
+
+        log, bread = events[1], events[2]
+        self.assertEqual(
+            {k: log[k] for k in ('action', 'item', 'rows', 'applied', 'models')},
+            {'action': 'history', 'item': 'testapp.Log', 'rows': 3, 'applied': True, 'models': {'testapp.Log': 3}},
+        )
+        self.assertEqual(bread['blocked'], {'testapp.FoodMonster': 1})
+        self.assertEqual(bread['rows'], 0)
+
+        action = events[3]
+        self.assertEqual(
+            {k: action[k] for k in ('action', 'items', 'rows', 'bytes', 'blocked', 'errors')},
+            {'action': 'history', 'items': 2, 'rows': 3, 'bytes': 0, 'blocked': 1, 'errors': 0},
+        )
+        self.assertEqual(events[4]['status'], 'error')
+        self.assertEqual(events[4]['error'], 'some errors, please review')
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    def test_report_file(self):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        MigrationRecorder.Migration.objects.create(app='random_name_120397129837', name='0001_initial')
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+        call_command('dbcleanup', just=['migrations', 'history'], report_file=path, stdout=out)
+        # text output is kept
+        self.assertIn('testapp.Log cleanup would delete:\n', out.getvalue())
+
+        with open(path) as f:
+            events = _events(f.read())
+        self.assertEqual(events[-1]['status'], 'ok')
+        items = {(x['action'], x['item']): x for x in events if x['event'] == 'item'}
+        self.assertEqual(items['migrations', 'random_name_120397129837']['rows'], 1)
+        self.assertFalse(items['migrations', 'random_name_120397129837']['applied'])
+        self.assertEqual(items['history', 'testapp.Log']['rows'], 1)
+        actions = {x['action']: x for x in events if x['event'] == 'action'}
+        self.assertEqual(set(actions), {'migrations', 'history'})
+        # dry run, nothing reclaimed
+        self.assertEqual(actions['history']['rows'], 0)
+
+    def test_interactive(self):
+        with self.assertRaisesMessage(CommandError, '--interactive cannot be used with --format json'):
+            call_command('dbcleanup', just='history', interactive=True, format='json')
+
+    def test_partial(self):
+        out = StringIO()
+        report = Report([out])
+        with self.assertRaises(KeyboardInterrupt):
+            with report.action('tables'):
+                with report.item('tables', 'old_table') as entry:
+                    entry.update(rows=10, bytes=1024, applied=True)
+                raise KeyboardInterrupt()
+        events = _events(out.getvalue())
+        self.assertEqual([x['event'] for x in events], ['item', 'action'])
+        self.assertEqual(events[1]['rows'], 10)
+        self.assertEqual(events[1]['bytes'], 1024)
+        self.assertFalse(Report())
@@ -0,0 +1,124 @@
+from io import StringIO
+from unittest import mock
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+
+from dbcleanup import snapshots
+from dbcleanup.models import Table, TableSnapshot
+
+from .helpers import fake_tables
+
+
+@override_settings(DBCLEANUP_SNAPSHOT_GROWTH_DAYS=7)
+class Test(TestCase):
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_growth(self, objects):
+        now = timezone.now()
+
+        objects.all.return_value = fake_tables(a=1000, b=500)
+        # references (one query, whatever the number of snapshots) and bulk insert
+        with self.assertNumQueries(2):
+            first = snapshots.take_snapshot(now - timezone.timedelta(days=10))
+        self.assertEqual(
+            [(x.table, x.size, x.rows, x.index_length, x.growth) for x in first],
+            [
+                ('a', 1000, 100, 500, None),
+                ('b', 500, 50, 250, None),
+            ],
+        )
+
+        objects.all.return_value = fake_tables(a=2000, b=400)
+        snapshots.take_snapshot(now - timezone.timedelta(days=6))
+        # growth since the oldest one, as none is 7 days old yet
+        self.assertEqual(TableSnapshot.objects.filter(table='a').latest().growth, 250)
+
+        objects.all.return_value = fake_tables(a=3000, b=400, c=10)
+        latest = {x.table: x for x in snapshots.take_snapshot(now)}
+        # latest one at least 7 days old (10 days ago)
+        self.assertEqual(latest['a'].growth, 200)
+        self.assertEqual(latest['b'].growth, -10)
+        self.assertIsNone(latest['c'].growth)
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_reference(self, objects):
+        now = timezone.now()
+        TableSnapshot.objects.bulk_create(
+            TableSnapshot(table=table, taken_at=now - timezone.timedelta(days=days), size=size)
+            for table, days, size in (('a', 20, 0), ('a', 10, 700), ('a', 3, 900), ('b', 5, 100), ('b', 2, 200))
+        )
+        objects.all.return_value = fake_tables(a=1400, b=600)
+        latest = {x.table: x for x in snapshots.take_snapshot(now)}
+        # latest one at least 7 days old
+        self.assertAlmostEqual(latest['a'].growth, 70)
+        # oldest one, none is 7 days old
+        self.assertAlmostEqual(latest['b'].growth, 100)
+
+    def test_catalog(self):
+        # the real table model of the database engine
+        snapshots.take_snapshot()
+        taken = {x.table: x for x in TableSnapshot.objects.all()}
+        self.assertEqual(set(taken), set(Table.objects.values_list('name', flat=True)))
+        self.assertIn('testapp_log', taken)
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_unknown_rows(self, objects):
+        # PostgreSQL 14+ reltuples of a table never analyzed
+        tables = fake_tables(a=1000)
+        tables[0].rows = -1
+        objects.all.return_value = tables
+        self.assertIsNone(snapshots.take_snapshot()[0].rows)
+        self.assertIsNone(TableSnapshot.objects.get(table='a').rows)
+
+    @override_settings(DBCLEANUP_SNAPSHOT_DOWNSAMPLE=((7, 1), (30, 7)), DBCLEANUP_SNAPSHOT_MAX_DAYS=100)
+    def test_downsample(self):
+        # every 6 hours, for 120 days
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timezone.timedelta(days=120)
+        TableSnapshot.objects.bulk_create(
+            TableSnapshot(table=table, taken_at=start + timezone.timedelta(hours=6 * i), size=i)
+            for i in range(120 * 4)
+            for table in ('a', 'b')
+        )
+        now = start + timezone.timedelta(days=120)
+        deleted = snapshots.downsample(now)
+        self.assertEqual(TableSnapshot.objects.count() + deleted, 120 * 4 * 2)
+
+        taken = list(TableSnapshot.objects.filter(table='a').order_by('taken_at').values_list('taken_at', flat=True))
+        self.assertGreaterEqual(taken[0], now - timezone.timedelta(days=100))
+        # every 6 hours for the last 7 days
+        self.assertEqual(len([x for x in taken if x >= now - timezone.timedelta(days=7)]), 7 * 4)
+        # at most one per day up to 30 days
+        daily = [x for x in taken if now - timezone.timedelta(days=30) <= x < now - timezone.timedelta(days=7)]
+        self.assertEqual(len(daily), len({x.date() for x in daily}))
+        # and one per week after that
+        weekly = [x for x in taken if x < now - timezone.timedelta(days=30)]
+        self.assertLessEqual(len(weekly), 70 // 7 + 2)
+        # idempotent
+        self.assertEqual(snapshots.downsample(now), 0)
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_command(self, objects):
+        objects.all.return_value = fake_tables(a=1000, b=500)
+        out = StringIO()
+        call_command('dbcleanup_snapshot', stdout=out)
+        self.assertEqual(out.getvalue(), 'Recorded 2 tables\nRemoved 0 old snapshots\n')
+        self.assertEqual(TableSnapshot.objects.count(), 2)
+
+    def test_admin(self):
+        user = get_user_model().objects.create_user(
+            'tester', 'tester@test.it', 'tester', is_staff=True, is_superuser=True
+        )
+        self.client.force_login(user)
+        TableSnapshot.objects.create(table='a', taken_at=timezone.now(), size=10, growth=-2048)
+        r = self.client.get(reverse('admin:dbcleanup_tablesnapshot_changelist'))
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, '-2.0\xa0KB/day')
+        # annotated with the growth rate, sortable
+        # (the first column is the action checkbox)
+        r = self.client.get(reverse('admin:dbcleanup_table_changelist'), {'o': '9'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context['cl'].get_ordering_field_columns(), {9: 'asc'})
+        self.assertEqual(r.context['cl'].queryset.query.order_by[0], 'growth')
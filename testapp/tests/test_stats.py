@@ -0,0 +1,119 @@
+from io import StringIO
+from unittest import mock
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.core.management import call_command
+
+from dbcleanup import stats
+from dbcleanup.models import Table, TableStats
+
+from .helpers import fake_tables
+
+
+class Test(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            'tester', 'tester@test.it', 'tester', is_staff=True, is_superuser=True
+        )
+        self.client.force_login(user)
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_refresh(self, objects):
+        objects.with_free.return_value = fake_tables(testapp_log=1000, old_table=500)
+        self.assertTrue(stats.is_stale())
+        stats.refresh()
+        self.assertFalse(stats.is_stale())
+        self.assertEqual(
+            list(
+                TableStats.objects.order_by('-size').values_list(
+                    'name', 'size', 'rows', 'index_length', 'free', 'index_free'
+                )
+            ),
+            [('testapp_log', 1000, 100, 500, 250, None), ('old_table', 500, 50, 250, 125, None)],
+        )
+
+        # replaced, not appended
+        objects.with_free.return_value = fake_tables(testapp_log=2000)
+        stats.refresh()
+        self.assertEqual(list(TableStats.objects.values_list('name', 'size')), [('testapp_log', 2000)])
+
+        with override_settings(DBCLEANUP_TABLE_STATS_TTL=0):
+            self.assertTrue(stats.is_stale())
+
+    def test_catalog(self):
+        # the real table model of the database engine
+        stats.refresh()
+        self.assertEqual(
+            set(TableStats.objects.values_list('name', flat=True)), set(Table.objects.values_list('name', flat=True))
+        )
+        r = self.client.get(reverse('admin:dbcleanup_table_changelist'), {'q': 'testapp_log'})
+        self.assertEqual([x.name for x in r.context['cl'].result_list], ['testapp_log'])
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_unknown_rows(self, objects):
+        # PostgreSQL 14+ reltuples of a table never analyzed
+        tables = fake_tables(a=1000)
+        tables[0].rows = -1
+        objects.with_free.return_value = tables
+        stats.refresh()
+        self.assertIsNone(TableStats.objects.get(name='a').rows)
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_changelist(self, objects):
+        objects.all.return_value = fake_tables(testapp_log=1000, old_table=500)
+        objects.with_free.return_value = fake_tables(testapp_log=3000)
+        url = reverse('admin:dbcleanup_table_changelist')
+
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        # catalog only, free space is not estimated on page loads
+        self.assertEqual(objects.all.call_count, 1)
+        self.assertEqual(objects.with_free.call_count, 0)
+        self.assertEqual([x.name for x in r.context['cl'].result_list], ['testapp_log', 'old_table'])
+        self.assertEqual([x.free for x in r.context['cl'].result_list], [None, None])
+
+        # served from the cache (filters as well) while it is fresh
+        r = self.client.get(url, {'app_label': 'testapp'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(objects.all.call_count, 1)
+        self.assertEqual([x.name for x in r.context['cl'].result_list], ['testapp_log'])
+        r = self.client.get(url, {'label': 'testapp.Log'})
+        self.assertEqual([x.name for x in r.context['cl'].result_list], ['testapp_log'])
+        self.assertContains(r, '<td class="field-get_model">log</td>', html=True)
+
+        # manual refresh, with free space
+        r = self.client.post(url, {'action': 'refresh', '_selected_action': ['testapp_log']}, follow=True)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(objects.with_free.call_count, 1)
+        self.assertEqual([(x.name, x.size) for x in r.context['cl'].result_list], [('testapp_log', 3000)])
+        # estimated free space
+        self.assertContains(r, 'title=750>750\xa0bytes</span>')
+
+        # expired: catalog only, the free space estimates are kept
+        TableStats.objects.update(refreshed_at=timezone.now() - timezone.timedelta(hours=1))
+        r = self.client.get(url)
+        self.assertEqual(objects.all.call_count, 2)
+        self.assertEqual(objects.with_free.call_count, 1)
+        self.assertEqual(
+            [(x.name, x.size, x.free) for x in r.context['cl'].result_list],
+            [('testapp_log', 1000, 750), ('old_table', 500, None)],
+        )
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_refresh_stale_only(self, objects):
+        objects.all.return_value = fake_tables(testapp_log=1000)
+        self.assertEqual(len(stats.refresh(free=False, stale_only=True)), 1)
+        # refreshed meanwhile (ie: by a concurrent request)
+        self.assertIsNone(stats.refresh(free=False, stale_only=True))
+        self.assertEqual(objects.all.call_count, 1)
+
+    @mock.patch('dbcleanup.models.Table.objects')
+    def test_command(self, objects):
+        objects.with_free.return_value = fake_tables(testapp_log=1000)
+        out = StringIO()
+        call_command('dbcleanup_snapshot', table_stats=True, no_downsample=True, stdout=out)
+        self.assertIn('Refreshed statistics of 1 tables\n', out.getvalue())
+        self.assertEqual(TableStats.objects.get().free, 250)
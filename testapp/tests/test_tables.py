@@ -1,20 +1,27 @@
 import unittest
 from unittest import mock
 from io import StringIO
+from types import SimpleNamespace
 
-from django.test import TestCase
+from django.db import connection, DatabaseError
+from django.test import TestCase, override_settings
 from django.apps import registry
 from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.urls import reverse
 from django.conf import settings
 
-from dbcleanup import utils, models, admin
+from dbcleanup import utils, models, admin, orphans
+from dbcleanup.management.commands.dbcleanup import Command
+from dbcleanup.progress import ProgressReporter
+from dbcleanup.report import Report
+from dbcleanup.throttle import Throttle
 
 
 @unittest.skipUnless(
-    settings.DATABASES['default']['ENGINE'] in ('django.db.backends.mysql', 'django.db.backends.postgresql_psycopg2'),
-    "only mysql and postgresql",
+    settings.DATABASES['default']['ENGINE']
+    in ('django.db.backends.mysql', 'django.db.backends.postgresql_psycopg2', 'django.db.backends.sqlite3'),
+    "only mysql, postgresql and sqlite",
 )
 class Test(TestCase):
     def setUp(self) -> None:
@@ -38,6 +45,11 @@ class Test(TestCase):
                 'auth_user',
                 'auth_user_groups',
                 'auth_user_user_permissions',
+                'dbcleanup_cleanuprun',
+                'dbcleanup_cleanuprunitem',
+                'dbcleanup_historyprogress',
+                'dbcleanup_tablesnapshot',
+                'dbcleanup_tablestats',
                 'django_admin_log',
                 'django_content_type',
                 'django_migrations',
@@ -46,6 +58,7 @@ class Test(TestCase):
                 'testapp_food',
                 'testapp_food_notes',
                 'testapp_foodmonster',
+                'testapp_log',
                 'testapp_note',
             ],
         )
@@ -61,6 +74,57 @@ class Test(TestCase):
             'food',
         )
 
+    def test_table_size(self):
+        table = models.Table.objects.get(name='testapp_log')
+        if connection.vendor == 'sqlite' and not models.has_dbstat():
+            self.skipTest('sqlite without dbstat')
+        self.assertGreater(table.size, 0)
+        self.assertGreater(table.data_length, 0)
+        self.assertIsNotNone(table.index_length)
+
+    def test_table_free(self):
+        # only estimated when asked for, it is not cheap
+        self.assertNotIn('free', models.Table.objects.all().query.annotations)
+        table = models.Table.objects.with_free().get(name='testapp_log')
+        if connection.vendor == 'sqlite' and not models.has_dbstat():
+            self.assertIsNone(table.free)
+        elif connection.vendor != 'postgresql':
+            # PostgreSQL: unknown (NULL) until the table is analyzed
+            self.assertIsNotNone(table.free)
+
+    def test_index_list(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('only mysql and postgresql')
+        indexes = {x.name: x for x in models.Index.objects.filter(table='testapp_log')}
+        self.assertTrue(indexes)
+        for index in indexes.values():
+            self.assertIsNotNone(index.size)
+        self.assertTrue(any(x.unique for x in indexes.values()), 'primary key')
+
+    @mock.patch('dbcleanup.models.connections')
+    def test_mysql_readable(self, connections):
+        cursor = connections.__getitem__.return_value.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = DatabaseError('SELECT command denied')
+        self.assertFalse(models.mysql_readable('performance_schema.denied_table', 'other'))
+        # checked once
+        self.assertFalse(models.mysql_readable('performance_schema.denied_table', 'other'))
+        cursor.execute.assert_called_once_with('SELECT 1 FROM performance_schema.denied_table LIMIT 0')
+
+    @mock.patch('dbcleanup.models.mysql_readable', return_value=False)
+    def test_index_list_denied(self, mysql_readable):
+        # least privileged user: no size nor usage instead of an error
+        sql = str(models.MySQLIndex.objects.all().query)
+        self.assertNotIn('innodb_index_stats', sql)
+        self.assertNotIn('performance_schema', sql)
+        self.assertEqual(
+            {x[0][0] for x in mysql_readable.call_args_list},
+            {'mysql.innodb_index_stats', 'performance_schema.table_io_waits_summary_by_index_usage'},
+        )
+        if connection.vendor == 'mysql':
+            self._login()
+            r = self.client.get(reverse('admin:dbcleanup_index_changelist'))
+            self.assertEqual(r.status_code, 200)
+
     def test_view(self):
         r = self.client.get(reverse('admin:dbcleanup_table_changelist'))
         self.assertEqual(r.status_code, 302)
@@ -84,3 +148,162 @@ class Test(TestCase):
                 {x.split(' ')[1] for x in out.getvalue().splitlines()} - baseline,
                 {'auth_user', 'auth_user_groups', 'auth_user_user_permissions'},
             )
+
+    @mock.patch('dbcleanup.reclaim.vacuum_sqlite', return_value=None)
+    def test_command_sqlite(self, vacuum_sqlite):
+        if connection.vendor != 'sqlite':
+            self.skipTest('only sqlite')
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE old_table (id integer)')
+        out = StringIO()
+        call_command('dbcleanup', stdout=out, just='tables', force=True)
+        self.assertIn('- old_table (', out.getvalue())
+        self.assertIn('Dropped old_table', out.getvalue())
+        self.assertIn('use --vacuum to release them', out.getvalue())
+        self.assertFalse(models.Table.objects.filter(name='old_table').exists())
+        vacuum_sqlite.assert_called_once_with('default', full=False)
+
+    @mock.patch('dbcleanup.reclaim.vacuum_sqlite', return_value=None)
+    def test_command_dependencies(self, vacuum_sqlite):
+        if connection.vendor != 'sqlite':
+            self.skipTest('only sqlite')
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE old_parent (id integer PRIMARY KEY)')
+            cursor.execute(
+                'CREATE TABLE old_child (id integer PRIMARY KEY, parent_id integer REFERENCES old_parent(id))'
+            )
+            cursor.execute('INSERT INTO old_parent VALUES (1)')
+            cursor.execute('INSERT INTO old_child VALUES (1, 1)')
+        self.assertEqual(
+            orphans.foreign_keys({'old_parent', 'old_child'}),
+            {'old_child': {'old_parent'}},
+        )
+        out = StringIO()
+        # a single run, the referencing table first
+        call_command('dbcleanup', stdout=out, just='tables', force=True)
+        dropped = [x for x in out.getvalue().splitlines() if x.startswith('Dropped old_')]
+        self.assertEqual(dropped, ['Dropped old_child', 'Dropped old_parent'])
+        self.assertFalse(models.Table.objects.filter(name__startswith='old_').exists())
+
+    @override_settings(DBCLEANUP_GENTLE_DROP_CHUNK=10)
+    @mock.patch('dbcleanup.reclaim.vacuum_sqlite', return_value=None)
+    def test_command_gentle(self, vacuum_sqlite):
+        if connection.vendor != 'sqlite' or not models.has_dbstat():
+            self.skipTest('only sqlite with dbstat (table sizes)')
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE old_big (id integer PRIMARY KEY, data text)')
+            cursor.execute('CREATE TABLE old_small (id integer PRIMARY KEY)')
+            # more than a page (the size of old_small)
+            cursor.executemany('INSERT INTO old_big VALUES (%s, %s)', [(x, 'x' * 1000) for x in range(25)])
+        size = models.Table.objects.get(name='old_big').size
+        out = StringIO()
+        call_command('dbcleanup', stdout=out, just='tables', force=True, gentle_drop_size=size)
+        lines = [x for x in out.getvalue().splitlines() if 'old_' in x and not x.startswith('- ')]
+        self.assertEqual(
+            lines,
+            [
+                f'Shrinking old_big ({size} bytes), 10 rows at a time',
+                'Deleted 25 rows from old_big',
+                'Dropped old_big',
+                'Dropped old_small',
+            ],
+        )
+        self.assertFalse(models.Table.objects.filter(name__startswith='old_').exists())
+
+    @override_settings(DBCLEANUP_GENTLE_DROP_CHUNK=10, DBCLEANUP_REQUIRED_TABLES={'live_table'})
+    @mock.patch('dbcleanup.reclaim.vacuum_sqlite', return_value=None)
+    def test_command_gentle_referenced(self, vacuum_sqlite):
+        if connection.vendor != 'sqlite':
+            self.skipTest('only sqlite')
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE old_big (id integer PRIMARY KEY)')
+            cursor.execute('CREATE TABLE live_table (id integer PRIMARY KEY, big_id integer REFERENCES old_big(id))')
+            cursor.executemany('INSERT INTO old_big VALUES (%s)', [(x,) for x in range(25)])
+            cursor.execute('INSERT INTO live_table VALUES (1, 1)')
+        out, err = StringIO(), StringIO()
+        call_command('dbcleanup', stdout=out, stderr=err, just='tables', force=True, gentle_drop_size=1)
+        self.assertIn('old_big is referenced by live_table, not shrinking it', err.getvalue())
+        self.assertIn('Failed to drop old_big', err.getvalue())
+        self.assertNotIn('Shrinking old_big', out.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM old_big')
+            self.assertEqual(cursor.fetchone()[0], 25, 'left intact')
+
+    @mock.patch('dbcleanup.orphans._references')
+    def test_referenced_from(self, references):
+        references.return_value = [('child', 'big'), ('old_child', 'big'), ('old_child', 'other'), ('big', 'parent')]
+        self.assertEqual(orphans.referenced_from({'big'}, {'big', 'old_child'}), {'big': {'child'}})
+        self.assertEqual(orphans.referenced_from({'other'}, {'other', 'old_child'}), {})
+
+
+class DropTest(TestCase):
+    def test_drop_batches(self):
+        references = {'child': {'parent'}, 'grandchild': {'child'}, 'a': {'b'}, 'b': {'a'}}
+        self.assertEqual(
+            orphans.drop_batches(['parent', 'child', 'grandchild', 'other', 'a', 'b'], references),
+            [['grandchild', 'other'], ['child'], ['parent'], ['a', 'b']],
+        )
+        self.assertEqual(
+            orphans.drop_batches(['parent', 'child', 'grandchild', 'other'], references, batch_size=1),
+            [['grandchild'], ['other'], ['child'], ['parent']],
+        )
+
+    @mock.patch('dbcleanup.orphans.connections')
+    def test_drop_tables(self, connections):
+        conn = connections.__getitem__.return_value
+        conn.ops.quote_name = lambda x: f'`{x}`'
+        cursor = conn.cursor.return_value.__enter__.return_value
+        statements = []
+
+        def execute(sql):
+            statements.append(sql)
+            if 'b' in sql:
+                raise DatabaseError('referenced')
+
+        cursor.execute.side_effect = execute
+        self.assertEqual(orphans.drop_tables(['a', 'b', 'c']), {'a': None, 'b': 'referenced', 'c': None})
+        self.assertEqual(
+            statements,
+            ['DROP TABLE `a`, `b`, `c`', 'DROP TABLE `a`', 'DROP TABLE `b`', 'DROP TABLE `c`'],
+            'one statement, then one by one if it fails',
+        )
+
+    @mock.patch('dbcleanup.orphans.connections')
+    def test_shrink_table(self, connections):
+        conn = connections.__getitem__.return_value
+        conn.ops.quote_name = lambda x: f'"{x}"'
+        cursor = conn.cursor.return_value.__enter__.return_value
+        for vendor, delete, after in (
+            ('postgresql', 'DELETE FROM "t" WHERE ctid = ANY(ARRAY(SELECT ctid FROM "t" LIMIT 10))', ['VACUUM "t"']),
+            ('sqlite', 'DELETE FROM "t" WHERE rowid IN (SELECT rowid FROM "t" LIMIT 10)', []),
+        ):
+            conn.vendor = vendor
+            cursor.reset_mock()
+            rowcounts = iter([10, 10, 5])
+            cursor.execute.side_effect = lambda sql: setattr(cursor, 'rowcount', next(rowcounts, 0))
+            self.assertEqual(orphans.shrink_table('t', chunk_size=10), 25)
+            self.assertEqual([x.args[0] for x in cursor.execute.call_args_list], [delete] * 3 + after)
+
+    @mock.patch('dbcleanup.orphans.drop_tables', side_effect=lambda tables, using: {x: None for x in tables})
+    @mock.patch('dbcleanup.orphans.foreign_keys', return_value={})
+    @mock.patch('dbcleanup.management.commands.dbcleanup.connections')
+    def test_gentle_vendors(self, connections, foreign_keys, drop_tables):
+        for vendor, shrunk in (('mysql', False), ('postgresql', True), ('sqlite', True)):
+            connections.__getitem__.return_value.vendor = vendor
+            out, err = StringIO(), StringIO()
+            command = Command(stdout=out, stderr=err)
+            command.report = Report()
+            command.progress = ProgressReporter(err, enabled=False)
+            command.throttle = Throttle()
+            with mock.patch('dbcleanup.orphans.referenced_from', return_value={}), mock.patch.object(
+                command, '_shrink_table', return_value=None
+            ) as shrink_table:
+                self.assertEqual(
+                    command._drop_tables([SimpleNamespace(name='old_big', size=100, rows=10)], gentle_size=50), 1
+                )
+            self.assertEqual(shrink_table.called, shrunk, vendor)
+            if not shrunk:
+                # InnoDB files are not shrunk by DELETE
+                self.assertIn(
+                    'Not shrinking old_big: deleting their rows would not shrink mysql table files', err.getvalue()
+                )
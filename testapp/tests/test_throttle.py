@@ -0,0 +1,132 @@
+from io import StringIO
+from unittest import mock
+
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.core.management import call_command, CommandError
+from django.core.management.base import OutputWrapper
+from django.db import DatabaseError
+
+from dbcleanup.throttle import Throttle, replica_lag
+from testapp.models import Log
+
+
+class Test(TestCase):
+    @mock.patch('dbcleanup.throttle.time.sleep')
+    def test_rate(self, sleep):
+        throttle = Throttle(rate=10)
+        throttle.wait(20)
+        self.assertEqual(sleep.call_count, 1)
+        # 20 rows at 10 rows/s: ~2 seconds (minus the time it took to get here)
+        self.assertAlmostEqual(sleep.call_args[0][0], 2, places=1)
+
+    @mock.patch('dbcleanup.throttle.time.sleep')
+    def test_sleep(self, sleep):
+        throttle = Throttle(sleep=0.5)
+        throttle.wait(20)
+        sleep.assert_called_once_with(0.5)
+        self.assertFalse(Throttle())
+
+    @mock.patch('dbcleanup.throttle.replica_lag', side_effect=[30, 12, 3])
+    @mock.patch('dbcleanup.throttle.time.sleep')
+    def test_replica_lag(self, sleep, replica_lag):
+        throttle = Throttle(max_lag=10)
+        throttle.wait(20)
+        # backs off until lag is below threshold
+        self.assertEqual(sleep.call_args_list, [mock.call(1), mock.call(2)])
+        self.assertEqual(replica_lag.call_count, 3)
+
+    def test_replica_lag_unsupported(self):
+        # sqlite (and any not replicating database) reports no lag
+        self.assertEqual(replica_lag('default'), 0)
+
+    @mock.patch('dbcleanup.throttle.connections')
+    def test_replica_lag_stopped(self, connections):
+        conn = connections.__getitem__.return_value
+        conn.vendor = 'mysql'
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.description = [('Replica_IO_Running',), ('Seconds_Behind_Source',)]
+        cursor.fetchone.return_value = ('Yes', 7)
+        self.assertEqual(replica_lag('replica'), 7)
+        # NULL while replication is stopped: never below --max-replica-lag
+        cursor.fetchone.return_value = ('No', None)
+        self.assertEqual(replica_lag('replica'), float('inf'))
+        # not a replica
+        cursor.fetchone.return_value = None
+        self.assertEqual(replica_lag('replica'), 0)
+
+    @mock.patch('dbcleanup.throttle.replica_lag', return_value=float('inf'))
+    @mock.patch('dbcleanup.throttle.time')
+    def test_replica_lag_deadline(self, time, replica_lag):
+        clock = [100]
+        time.monotonic.side_effect = lambda: clock[0]
+        time.sleep.side_effect = lambda x: clock.__setitem__(0, clock[0] + x)
+        err = StringIO()
+        throttle = Throttle(max_lag=10, stderr=OutputWrapper(err))
+        # stopped replication never catches up: gives up at the deadline
+        self.assertFalse(throttle.wait(deadline=110))
+        self.assertEqual(time.sleep.call_args_list, [mock.call(1), mock.call(2), mock.call(4), mock.call(3)])
+        self.assertEqual(clock, [110])
+        self.assertEqual(
+            err.getvalue(),
+            '''\
+Replication of default is stopped, pausing 1s
+Replication of default is stopped, pausing 2s
+Replication of default is stopped, pausing 4s
+Replication of default is stopped, pausing 3s
+''',
+        )
+
+    @mock.patch('dbcleanup.throttle.replica_lag', side_effect=[DatabaseError('denied'), 20, 0])
+    @mock.patch('dbcleanup.throttle.time.sleep')
+    def test_replica_lag_error(self, sleep, replica_lag):
+        err = StringIO()
+        throttle = Throttle(max_lag=10, stderr=OutputWrapper(err))
+        self.assertTrue(throttle.wait())
+        self.assertEqual(
+            err.getvalue(),
+            '''\
+Cannot check the replication lag of default: denied
+Replication of default is stopped, pausing 1s
+Replication lag of default is 20s (> 10s), pausing 2s
+''',
+        )
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    @mock.patch('dbcleanup.management.commands.dbcleanup.replica_lag', side_effect=DatabaseError('denied'))
+    def test_command_replica_lag_denied(self, replica_lag):
+        Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        with self.assertRaisesMessage(CommandError, '--max-replica-lag cannot be checked on default: denied'):
+            call_command('dbcleanup', just='history', force=True, batch_size=2, max_replica_lag=10)
+        self.assertEqual(Log.objects.count(), 1)
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    @mock.patch('dbcleanup.throttle.Throttle.wait', return_value=False)
+    def test_command_replica_lag_deadline(self, wait):
+        for _ in range(5):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+        out = StringIO()
+        call_command(
+            'dbcleanup', just='history', force=True, batch_size=2, max_replica_lag=10, max_duration=60, stdout=out
+        )
+        self.assertEqual(
+            out.getvalue(),
+            '''\
+testapp.Log cleanup deleted:
+ - testapp.Log: 2
+testapp.Log cleanup stopped as run limits were reached, next run will resume it
+''',
+        )
+        self.assertEqual(Log.objects.count(), 3)
+        self.assertIsNotNone(wait.call_args[1]['deadline'])
+
+    @override_settings(DBCLEANUP_HISTORY_MODELS=[('testapp.log', 365, 'time')])
+    @mock.patch('dbcleanup.throttle.time.sleep')
+    def test_command(self, sleep):
+        for _ in range(5):
+            Log.objects.create(message='Too old', time=timezone.now() - timezone.timedelta(days=390))
+
+        call_command('dbcleanup', just='history', force=True, batch_size=2, sleep=0.1, stdout=StringIO())
+        self.assertEqual(Log.objects.count(), 0)
+        # paced between the 3 batches
+        self.assertEqual(sleep.call_args_list, [mock.call(0.1), mock.call(0.1)])
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.apps import registry
+from django.test import TestCase
+
+from dbcleanup import utils
+from testapp.models import Bread, Food, Note
+
+
+class Test(TestCase):
+    def test_model_table_index(self):
+        index = utils.model_table_index()
+        self.assertIs(index.tables['testapp_food'], Food)
+        self.assertIs(index.tables['testapp_bread'], Bread)
+        # M2M table maps to the model with the field
+        self.assertIs(index.tables['testapp_food_notes'], Food)
+        self.assertIn('testapp_note', index.app_tables['testapp'])
+        self.assertEqual(index.label_tables['testapp.Food'], {'testapp_food', 'testapp_food_notes'})
+        # unmanaged and proxy models are not listed
+        self.assertNotIn('dbcleanup.Table', index.label_tables)
+        self.assertNotIn('dbcleanup.Partition', index.label_tables)
+        self.assertIn('dbcleanup.HistoryProgress', index.label_tables)
+        self.assertIs(utils.model_tables(), index.tables)
+
+    def test_model_table_index_registry(self):
+        index = utils.model_table_index()
+        # built once per registry state
+        self.assertIs(utils.model_table_index(), index)
+
+        app_models = [m for m in registry.apps.get_models() if m is not Note]
+        with mock.patch('django.apps.registry.apps.get_models', return_value=app_models):
+            self.assertNotIn('testapp_note', utils.model_tables())
+            self.assertIs(utils.model_table_index(), utils.model_table_index())
+        self.assertIn('testapp_note', utils.model_tables())
+
+        utils.model_tables.cache_clear()
+        self.assertIsNot(utils.model_table_index(), index)
+
+    @mock.patch('dbcleanup.utils.connections')
+    def test_run_parallel(self, connections):
+        # not a Mock call count, it is not thread-safe
+        closed = []
+        connections.__getitem__.return_value.close = lambda: closed.append(1)
+        done = []
+        utils.run_parallel(list(range(10)), 'default', 3, done.append)
+        self.assertEqual(sorted(done), list(range(10)))
+        # each thread closes its own connection
+        self.assertEqual(len(closed), 3)
+
+        done = []
+        utils.run_parallel(list(range(3)), 'default', 1, done.append)
+        # in order, in this thread
+        self.assertEqual(done, [0, 1, 2])
+        self.assertEqual(len(closed), 3)
+
+        def _fail(item):
+            if item == 2:
+                raise ValueError(item)
+            done.append(item)
+
+        done = []
+        with self.assertRaises(ValueError):
+            utils.run_parallel(list(range(6)), 'default', 2, _fail)
+        # the failing thread stopped (4 is not done), the other one went on
+        self.assertEqual(sorted(done), [0, 1, 3, 5])